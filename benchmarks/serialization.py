@@ -0,0 +1,95 @@
+"""Microbenchmark of the JSON serialization of recipe lists.
+
+Compares the default path of FastAPI (validate, convert to dicts,
+jsonable_encoder, json.dumps) with src.core.serialization.dump_json, for lists
+of recipes of different sizes.
+
+Usage:
+    python benchmarks/serialization.py [--sizes 10 100 1000 5000] [--ingredients 8]
+
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import json
+import os
+import sys
+import timeit
+import types
+from typing import Any
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import encoders  # noqa: E402
+
+from src.core import schemas, serialization  # noqa: E402
+
+
+def make_recipes(size: int, ingredients: int) -> list[Any]:
+    """Build objects that look like ORM recipes to the serializers."""
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    return [
+        types.SimpleNamespace(
+            id=recipe_id,
+            name=f"Recipe {recipe_id}",
+            category="Benchmark",
+            created_at=now,
+            updated_at=now,
+            ingredients=[
+                types.SimpleNamespace(
+                    id=recipe_id * ingredients + index,
+                    name=f"Product {index}",
+                    quantity=index + 1,
+                    recipe_id=recipe_id,
+                    product_id=f"s{index}",
+                    created_at=now,
+                    updated_at=now,
+                )
+                for index in range(ingredients)
+            ],
+        )
+        for recipe_id in range(size)
+    ]
+
+
+def fastapi_default(recipes: list[Any]) -> bytes:
+    """Mimics fastapi.routing.serialize_response followed by JSONResponse.render."""
+    adapter = serialization.get_adapter(list[schemas.RecipeOutputSchema])
+    value = adapter.validate_python(recipes, from_attributes=True)
+    content = encoders.jsonable_encoder(adapter.dump_python(value, mode="json"))
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def fast_path(recipes: list[Any]) -> bytes:
+    return serialization.dump_json(list[schemas.RecipeOutputSchema], recipes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000, 5000])
+    parser.add_argument("--ingredients", type=int, default=8)
+    args = parser.parse_args()
+
+    print(f"{'recipes':>8}{'default ms':>14}{'fast ms':>14}{'speedup':>10}")
+    for size in args.sizes:
+        recipes = make_recipes(size, args.ingredients)
+        assert json.loads(fastapi_default(recipes)) == json.loads(fast_path(recipes))
+        number = max(1, 2000 // size)
+        timings = {}
+        for name, function in (("default", fastapi_default), ("fast", fast_path)):
+            timings[name] = (
+                min(timeit.repeat(lambda: function(recipes), number=number, repeat=5))
+                / number
+            )
+        print(
+            f"{size:>8}{timings['default'] * 1000:>14.3f}"
+            f"{timings['fast'] * 1000:>14.3f}"
+            f"{timings['default'] / timings['fast']:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
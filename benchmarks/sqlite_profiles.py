@@ -0,0 +1,184 @@
+"""Benchmark concurrent GET /recipes under a POST /recipes write load.
+
+Compares the SQLite defaults against the tuned profile of
+src.database.session.get_sqlite_pragmas. Every profile runs in its own
+subprocess, because the settings and the engine are created at import time.
+
+Usage:
+    python benchmarks/sqlite_profiles.py [--readers 8] [--duration 10] [--seed 200]
+
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Iterator
+
+PROFILES = {"default": "false", "tuned": "true"}
+
+
+class FakePicnicAPI:
+    """Stands in for python_picnic_api.PicnicAPI with a fixed shopping cart."""
+
+    def __init__(self, cart_size: int = 10) -> None:
+        self.cart = {
+            "items": [
+                {
+                    "items": [
+                        {
+                            "id": f"s{index}",
+                            "name": f"Product {index}",
+                            "image_ids": [f"image{index}"],
+                            "decorators": [{"type": "QUANTITY", "quantity": 1}],
+                        }
+                    ]
+                }
+                for index in range(cart_size)
+            ]
+        }
+
+    def get_cart(self) -> dict:
+        return self.cart
+
+
+def _get_fake_picnic_client() -> Iterator[FakePicnicAPI]:
+    yield FakePicnicAPI()
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+def run_profile(readers: int, duration: float, seed: int, port: int) -> dict[str, Any]:
+    """Run the benchmark against the profile configured in the environment."""
+    import requests
+    import uvicorn
+
+    from src import main
+    from src.picnic import session as picnic_session
+
+    main.app.dependency_overrides[
+        picnic_session.get_picnic_client
+    ] = _get_fake_picnic_client
+    server = uvicorn.Server(
+        uvicorn.Config(main.app, port=port, log_level="warning", access_log=False)
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    url = f"http://127.0.0.1:{port}{main.ROOT_PATH}/recipes"
+    with requests.Session() as http:
+        for index in range(seed):
+            http.post(url, json={"name": f"Seed {index}", "category": "bench"})
+
+    stop = threading.Event()
+    read_latencies: list[float] = []
+    write_latencies: list[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def reader() -> None:
+        with requests.Session() as http:
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = http.get(url)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    read_latencies.append(elapsed)
+                    errors[0] += response.status_code != 200
+
+    def writer() -> None:
+        with requests.Session() as http:
+            index = 0
+            while not stop.is_set():
+                start = time.perf_counter()
+                response = http.post(
+                    url, json={"name": f"Write {index}", "category": "bench"}
+                )
+                elapsed = time.perf_counter() - start
+                with lock:
+                    write_latencies.append(elapsed)
+                    errors[0] += response.status_code != 201
+                index += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.should_exit = True
+
+    return {
+        "reads_per_s": len(read_latencies) / duration,
+        "read_p50_ms": statistics.median(read_latencies) * 1000,
+        "read_p95_ms": _percentile(read_latencies, 0.95) * 1000,
+        "writes_per_s": len(write_latencies) / duration,
+        "write_p50_ms": statistics.median(write_latencies) * 1000,
+        "write_p95_ms": _percentile(write_latencies, 0.95) * 1000,
+        "errors": errors[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--profile", choices=PROFILES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.profile:
+        result = run_profile(args.readers, args.duration, args.seed, args.port)
+        print(json.dumps(result))
+        return
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    for profile, tuning in PROFILES.items():
+        with tempfile.TemporaryDirectory() as directory:
+            env = dict(
+                os.environ,
+                PYTHONPATH=root,
+                DATABASE_TYPE="sqlite",
+                SQLITE_TUNING=tuning,
+                SQLITE_DATABASE=f"sqlite:///{directory}/bench.db",
+                LOGGING_REQUESTS_FILE=os.path.join(directory, "requests.txt"),
+                LOGGING_CONTROLLER_FILE=os.path.join(directory, "controller.txt"),
+            )
+            output = subprocess.run(
+                [sys.executable, __file__, "--profile", profile]
+                + [f"--readers={args.readers}", f"--duration={args.duration}"]
+                + [f"--seed={args.seed}", f"--port={args.port}"],
+                env=env,
+                cwd=root,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results[profile] = json.loads(output.strip().splitlines()[-1])
+
+    columns = list(results["default"])
+    print(f"{'profile':<10}" + "".join(f"{column:>14}" for column in columns))
+    for profile, result in results.items():
+        print(
+            f"{profile:<10}" + "".join(f"{result[column]:>14.1f}" for column in columns)
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Start-up time budget of the application.
+
+Measures, in fresh processes, how long importing src.main takes, and how long a
+uvicorn worker takes until /health/live and /health/ready answer with 200. The
+import is measured twice: in total, and on top of the frameworks it is built on
+(FastAPI, pydantic, SQLAlchemy and the Picnic API), which take most of it and
+are not ours to speed up. Exits with status 1 when the median import of the
+service itself is over --budget, or the time to live over --live-budget, so it
+can run in CI.
+
+Usage:
+    python benchmarks/startup.py [--runs 5] [--budget 0.3] [--live-budget 0.9]
+                                 [--port 8765]
+
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import src.main; "
+    "print(time.perf_counter() - start)"
+)
+OWN_IMPORT_SNIPPET = (
+    "import fastapi, pydantic, sqlalchemy, python_picnic_api; "
+    "import time; start = time.perf_counter(); import src.main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def get_environment(directory: str) -> dict[str, str]:
+    """An environment with a throwaway SQLite database and log files."""
+    return {
+        **os.environ,
+        "DATABASE_TYPE": "sqlite",
+        "SQLITE_DATABASE": f"sqlite:///{directory}/startup.db",
+        "LOGGING_REQUESTS_FILE": f"{directory}/requests.log",
+        "LOGGING_CONTROLLER_FILE": f"{directory}/controllers.log",
+    }
+
+
+def measure_import(environment: dict[str, str], snippet: str) -> float:
+    output = subprocess.run(
+        [sys.executable, "-c", snippet],
+        cwd=ROOT,
+        env=environment,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def wait_for(url: str, start: float, timeout: float = 30.0) -> float:
+    """Poll a URL until it answers with 200, and return the seconds since start."""
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - start
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} did not answer within {timeout} seconds.")
+
+
+def measure_server(environment: dict[str, str], port: int) -> tuple[float, float]:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "src.main:app",
+            "--port",
+            str(port),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=environment,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}/api/v1/health"
+        live = wait_for(f"{base_url}/live", start)
+        ready = wait_for(f"{base_url}/ready", start)
+    finally:
+        server.terminate()
+        server.wait()
+    return live, ready
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=0.3,
+        help="seconds for importing src.main on top of the frameworks",
+    )
+    parser.add_argument(
+        "--live-budget",
+        type=float,
+        default=0.9,
+        help="seconds from starting the process until it is live",
+    )
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    imports, own_imports, lives, readies = [], [], [], []
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as directory:
+            environment = get_environment(directory)
+            imports.append(measure_import(environment, IMPORT_SNIPPET))
+            own_imports.append(measure_import(environment, OWN_IMPORT_SNIPPET))
+            live, ready = measure_server(environment, args.port)
+            lives.append(live)
+            readies.append(ready)
+
+    results = {
+        "import src.main": statistics.median(imports),
+        "  of which own": statistics.median(own_imports),
+        "process to live": statistics.median(lives),
+        "process to ready": statistics.median(readies),
+    }
+    for name, seconds in results.items():
+        print(f"{name:<18}{seconds * 1000:>10.1f} ms")
+
+    budgets = {"  of which own": args.budget, "process to live": args.live_budget}
+    over_budget = [
+        f"{name.strip()} ({budget} s)"
+        for name, budget in budgets.items()
+        if results[name] > budget
+    ]
+    if over_budget:
+        print(f"Over the budget: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Response caching: caches of pre-serialized JSON bodies and conditional requests."""
+from __future__ import annotations
+
+import abc
+import collections
+import functools
+import logging
+import threading
+from typing import Callable, Iterable, Optional
+
+from src.core import config, metrics
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+def make_key(route: str, **params: object) -> str:
+    """Build a cache key from a route and its parameters.
+
+    Args:
+        route: The name of the route.
+        params: The parameters that influence the response. Parameters that are
+                None are left out.
+
+    Returns:
+        A key that is stable regardless of the order of the parameters.
+
+    """
+    query = "&".join(
+        f"{name}={value}" for name, value in sorted(params.items()) if value is not None
+    )
+    return f"{route}?{query}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check whether an If-None-Match header matches an ETag.
+
+    Args:
+        if_none_match: The value of the If-None-Match header, if any.
+        etag: The current ETag of the resource.
+
+    Returns:
+        True if the client already has the current representation.
+
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = {
+        candidate.strip().removeprefix("W/") for candidate in if_none_match.split(",")
+    }
+    return etag.removeprefix("W/") in candidates
+
+
+class ResponseCache(abc.ABC):
+    """Base class of the response caches. Entries are bytes tagged with the
+    resources they were built from, so a write can invalidate exactly the entries
+    that depend on it.
+
+    Attributes:
+        backend: The name of the backend, as in RESPONSE_CACHE_BACKEND.
+
+    """
+
+    backend = "none"
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Return the entry of a key, None if there is none."""
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        """Store an entry, tagged with the resources it was built from."""
+
+    @abc.abstractmethod
+    def invalidate(self, *tags: str) -> None:
+        """Drop the entries with any of the tags, and bump their counters."""
+
+    @abc.abstractmethod
+    def versions(self, tags: Iterable[str]) -> tuple[int, ...]:
+        """Return the invalidation counters of the tags."""
+
+    def get_or_set(
+        self, key: str, tags: Iterable[str], loader: Callable[[], bytes]
+    ) -> bytes:
+        """Read-through lookup of a key.
+
+        Args:
+            key: The cache key, see make_key.
+            tags: The tags of the entry.
+            loader: Builds the value on a cache miss.
+
+        Returns:
+            The cached or freshly loaded value.
+
+        Notes:
+            The value is only stored when none of the tags were invalidated while
+            it was loaded, otherwise a concurrent write could be hidden behind a
+            stale entry.
+
+        """
+        value = self.get(key)
+        if settings.METRICS_ENABLED:
+            metrics.CACHE_LOOKUPS.inc(self.backend, "miss" if value is None else "hit")
+        if value is not None:
+            return value
+
+        tags = tuple(tags)
+        versions = self.versions(tags)
+        value = loader()
+        if self.versions(tags) == versions:
+            self.set(key, value, tags)
+        return value
+
+
+class NullCache(ResponseCache):
+    """A cache that stores nothing, used when caching is disabled."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        return None
+
+    def invalidate(self, *tags: str) -> None:
+        return None
+
+    def versions(self, tags: Iterable[str]) -> tuple[int, ...]:
+        return ()
+
+
+class LRUCache(ResponseCache):
+    """An in-process cache bounded to a maximum number of entries.
+
+    Attributes:
+        max_entries: The number of entries after which the least recently used
+                     entry is evicted.
+
+    """
+
+    backend = "memory"
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[
+            str, tuple[bytes, tuple[str, ...]]
+        ] = collections.OrderedDict()
+        self._tags: dict[str, set[str]] = collections.defaultdict(set)
+        self._versions: dict[str, int] = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        tags = tuple(tags)
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str) -> None:
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] += 1
+                for key in list(self._tags.pop(tag, ())):
+                    self._discard(key)
+
+    def versions(self, tags: Iterable[str]) -> tuple[int, ...]:
+        with self._lock:
+            return tuple(self._versions.get(tag, 0) for tag in tags)
+
+    def _discard(self, key: str) -> None:
+        """Remove an entry and its tag references. The lock must be held."""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[1]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class RedisCache(ResponseCache):
+    """A cache shared by all workers, stored in Redis.
+
+    Attributes:
+        ttl: The number of seconds after which an entry expires.
+
+    Notes:
+        Requires the optional `redis` package, installed with the redis extra.
+
+    """
+
+    backend = "redis"
+    prefix = "fastnic:cache:"
+
+    def __init__(self, url: str, ttl: int) -> None:
+        import redis
+
+        self.ttl = ttl
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes, tags: Iterable[str]) -> None:
+        pipeline = self._client.pipeline()
+        pipeline.set(self.prefix + key, value, ex=self.ttl)
+        for tag in tags:
+            pipeline.sadd(f"{self.prefix}tag:{tag}", self.prefix + key)
+            pipeline.expire(f"{self.prefix}tag:{tag}", self.ttl)
+        pipeline.execute()
+
+    def invalidate(self, *tags: str) -> None:
+        for tag in tags:
+            tag_key = f"{self.prefix}tag:{tag}"
+            keys = self._client.smembers(tag_key)
+            pipeline = self._client.pipeline()
+            pipeline.incr(f"{self.prefix}version:{tag}")
+            if keys:
+                pipeline.delete(*keys)
+            pipeline.delete(tag_key)
+            pipeline.execute()
+
+    def versions(self, tags: Iterable[str]) -> tuple[int, ...]:
+        tags = tuple(tags)
+        if not tags:
+            return ()
+        values = self._client.mget([f"{self.prefix}version:{tag}" for tag in tags])
+        return tuple(int(value or 0) for value in values)
+
+
+@functools.lru_cache()
+def get_response_cache() -> ResponseCache:
+    """Cached call to the response cache configured in the settings.
+
+    Returns:
+        The response cache.
+
+    Raises:
+        ValueError: If the cache backend is invalid.
+
+    """
+    backend = settings.RESPONSE_CACHE_BACKEND
+    if backend == "memory":
+        logger.info("Using in-process response cache.")
+        return LRUCache(max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES)
+    elif backend == "redis":
+        logger.info("Using Redis response cache.")
+        return RedisCache(
+            url=settings.RESPONSE_CACHE_REDIS_URL, ttl=settings.RESPONSE_CACHE_TTL
+        )
+    elif backend == "none":
+        logger.info("Response cache disabled.")
+        return NullCache()
+    logger.error("Invalid response cache backend.")
+    raise ValueError("Invalid response cache backend.")
@@ -1,5 +1,7 @@
 """Contains the configurations of the API."""
 import functools
+from typing import Optional
+
 import dotenv
 
 import pydantic
@@ -24,6 +26,19 @@ class Settings(pydantic_settings.BaseSettings):
     LOGGER_CONTROLLERS_NAME: str = pydantic.Field(
         "Backend Controller Logger", alias="LOGGER_CONTROLLER_NAME"
     )
+    LOGGER_REQUESTS_LEVEL: str = pydantic.Field("INFO", alias="LOGGER_REQUESTS_LEVEL")
+    LOGGER_CONTROLLERS_LEVEL: str = pydantic.Field(
+        "INFO", alias="LOGGER_CONTROLLER_LEVEL"
+    )
+    LOGGING_FORMAT: str = pydantic.Field("text", alias="LOGGING_FORMAT")
+    LOGGING_MAX_BYTES: int = pydantic.Field(
+        10_485_760, unit="B", alias="LOGGING_MAX_BYTES"
+    )
+    LOGGING_BACKUP_COUNT: int = pydantic.Field(5, alias="LOGGING_BACKUP_COUNT")
+    # When set, e.g. to "midnight", the log files rotate on time instead of size.
+    LOGGING_ROTATE_WHEN: Optional[str] = pydantic.Field(
+        None, alias="LOGGING_ROTATE_WHEN"
+    )
     ROOT_PATH: str = pydantic.Field("/api/v1", alias="ROOT_PATH")
 
     SQLALCHEMY_DATABASE_TYPE: str = pydantic.Field("sqlite", alias="DATABASE_TYPE")
@@ -33,6 +48,68 @@ class Settings(pydantic_settings.BaseSettings):
     SQL_PORT: str = pydantic.Field("5432", alias="SQL_PORT")
     SQL_DATABASE: str = pydantic.Field("fastnic", alias="SQL_DATABASE")
 
+    SQLITE_TUNING: bool = pydantic.Field(True, alias="SQLITE_TUNING")
+    SQLITE_JOURNAL_MODE: str = pydantic.Field("WAL", alias="SQLITE_JOURNAL_MODE")
+    SQLITE_SYNCHRONOUS: str = pydantic.Field("NORMAL", alias="SQLITE_SYNCHRONOUS")
+    SQLITE_MMAP_SIZE: int = pydantic.Field(
+        268_435_456, unit="B", alias="SQLITE_MMAP_SIZE"
+    )
+    # Negative values are interpreted by SQLite as KiB, positive values as pages.
+    SQLITE_CACHE_SIZE: int = pydantic.Field(-64_000, alias="SQLITE_CACHE_SIZE")
+    SQLITE_BUSY_TIMEOUT: int = pydantic.Field(
+        5_000, unit="ms", alias="SQLITE_BUSY_TIMEOUT"
+    )
+    SQLITE_TEMP_STORE: str = pydantic.Field("MEMORY", alias="SQLITE_TEMP_STORE")
+
+    RESPONSE_CACHE_BACKEND: str = pydantic.Field(
+        "memory", alias="RESPONSE_CACHE_BACKEND"
+    )
+    RESPONSE_CACHE_MAX_ENTRIES: int = pydantic.Field(
+        1024, alias="RESPONSE_CACHE_MAX_ENTRIES"
+    )
+    RESPONSE_CACHE_TTL: int = pydantic.Field(300, unit="s", alias="RESPONSE_CACHE_TTL")
+    RESPONSE_CACHE_REDIS_URL: str = pydantic.Field(
+        "redis://127.0.0.1:6379/0", alias="RESPONSE_CACHE_REDIS_URL"
+    )
+
+    RECIPES_TRANSFER_BATCH_SIZE: int = pydantic.Field(
+        500, alias="RECIPES_TRANSFER_BATCH_SIZE"
+    )
+
+    METRICS_ENABLED: bool = pydantic.Field(True, alias="METRICS_ENABLED")
+
+    # Opt-in query instrumentation, see src/database/instrumentation.py.
+    QUERY_INSTRUMENTATION: bool = pydantic.Field(False, alias="QUERY_INSTRUMENTATION")
+    QUERY_SLOW_THRESHOLD: float = pydantic.Field(
+        100.0, unit="ms", alias="QUERY_SLOW_THRESHOLD"
+    )
+    QUERY_REPEAT_THRESHOLD: int = pydantic.Field(5, alias="QUERY_REPEAT_THRESHOLD")
+    # Requests that execute more statements raise QueryBudgetExceededError, which
+    # fails the request in tests. Unlimited when unset.
+    QUERY_BUDGET: Optional[int] = pydantic.Field(None, alias="QUERY_BUDGET")
+
+    # Opt-in profiling of single requests, see src/core/profiling.py. A request
+    # is profiled when it sends PROFILING_HEADER, or at PROFILING_SAMPLE_RATE.
+    PROFILING_ENABLED: bool = pydantic.Field(False, alias="PROFILING_ENABLED")
+    PROFILING_HEADER: str = pydantic.Field("X-Profile", alias="PROFILING_HEADER")
+    PROFILING_SAMPLE_RATE: float = pydantic.Field(0.0, alias="PROFILING_SAMPLE_RATE")
+    PROFILING_INTERVAL: float = pydantic.Field(
+        5.0, unit="ms", alias="PROFILING_INTERVAL"
+    )
+    PROFILING_DIRECTORY: str = pydantic.Field("profiles", alias="PROFILING_DIRECTORY")
+
+    # Tracing, see src/core/tracing.py. Spans are appended to TRACING_FILE, or
+    # posted to an OTLP/HTTP collector with TRACING_EXPORTER=otlp.
+    TRACING_ENABLED: bool = pydantic.Field(False, alias="TRACING_ENABLED")
+    TRACING_EXPORTER: str = pydantic.Field("file", alias="TRACING_EXPORTER")
+    TRACING_FILE: str = pydantic.Field("traces.jsonl", alias="TRACING_FILE")
+    TRACING_OTLP_ENDPOINT: str = pydantic.Field(
+        "http://127.0.0.1:4318/v1/traces", alias="TRACING_OTLP_ENDPOINT"
+    )
+    TRACING_SERVICE_NAME: str = pydantic.Field("fastnic", alias="TRACING_SERVICE_NAME")
+
+    SEARCH_FUZZY_THRESHOLD: float = pydantic.Field(0.5, alias="SEARCH_FUZZY_THRESHOLD")
+
     PICNIC_USERNAME: str = pydantic.Field("INSECURE_USERNAME", alias="PICNIC_USERNAME")
     PICNIC_PASSWORD: str = pydantic.Field("INSECURE_PASSWORD", alias="PICNIC_PASSWORD")
 
@@ -42,6 +119,83 @@ class Settings(pydantic_settings.BaseSettings):
     SERVICE_CONNECTION_RETRY_DELAY: int = pydantic.Field(
         5, unit="s", alias="SERVICE_RETRY_DELAY"
     )
+    # Background health probes, in seconds.
+    HEALTH_DATABASE_INTERVAL: float = pydantic.Field(
+        10.0, unit="s", alias="HEALTH_DATABASE_INTERVAL"
+    )
+    HEALTH_PICNIC_INTERVAL: float = pydantic.Field(
+        60.0, unit="s", alias="HEALTH_PICNIC_INTERVAL"
+    )
+    HEALTH_PROBE_TIMEOUT: float = pydantic.Field(
+        5.0, unit="s", alias="HEALTH_PROBE_TIMEOUT"
+    )
+    # How long a request waits for the database to be set up at start-up.
+    STARTUP_READY_TIMEOUT: float = pydantic.Field(
+        10.0, unit="s", alias="STARTUP_READY_TIMEOUT"
+    )
+    # Background jobs, see src/core/jobs.py.
+    JOBS_WORKERS: int = pydantic.Field(4, alias="JOBS_WORKERS")
+    JOBS_QUEUE_SIZE: int = pydantic.Field(100, alias="JOBS_QUEUE_SIZE")
+    JOBS_PROGRESS_INTERVAL: float = pydantic.Field(
+        0.5, unit="s", alias="JOBS_PROGRESS_INTERVAL"
+    )
+    JOBS_RETENTION: float = pydantic.Field(7.0, unit="d", alias="JOBS_RETENTION")
+    JOBS_HEARTBEAT_INTERVAL: float = pydantic.Field(
+        10.0, unit="s", alias="JOBS_HEARTBEAT_INTERVAL"
+    )
+    JOBS_STALE_TIMEOUT: float = pydantic.Field(
+        60.0, unit="s", alias="JOBS_STALE_TIMEOUT"
+    )
+    # Server-sent events, see src/core/streaming.py.
+    SSE_BUFFER_SIZE: int = pydantic.Field(100, alias="SSE_BUFFER_SIZE")
+    SSE_KEEPALIVE_INTERVAL: float = pydantic.Field(
+        15.0, unit="s", alias="SSE_KEEPALIVE_INTERVAL"
+    )
+    # Idempotency keys, see src/core/idempotency.py.
+    IDEMPOTENCY_TTL: float = pydantic.Field(86400.0, unit="s", alias="IDEMPOTENCY_TTL")
+    IDEMPOTENCY_WAIT_TIMEOUT: float = pydantic.Field(
+        60.0, unit="s", alias="IDEMPOTENCY_WAIT_TIMEOUT"
+    )
+    IDEMPOTENCY_LEASE: float = pydantic.Field(30.0, unit="s", alias="IDEMPOTENCY_LEASE")
+    IDEMPOTENCY_MAX_BODY_SIZE: int = pydantic.Field(
+        1_048_576, unit="B", alias="IDEMPOTENCY_MAX_BODY_SIZE"
+    )
+    # Locks on the shopping cart, see src/picnic/cart_lock.py.
+    CART_LOCK_TIMEOUT: float = pydantic.Field(60.0, unit="s", alias="CART_LOCK_TIMEOUT")
+    CART_LOCK_LEASE: float = pydantic.Field(600.0, unit="s", alias="CART_LOCK_LEASE")
+    # Pool of logged-in Picnic clients, see src/picnic/pool.py.
+    PICNIC_POOL_SIZE: int = pydantic.Field(32, alias="PICNIC_POOL_SIZE")
+    PICNIC_POOL_IDLE_TIMEOUT: float = pydantic.Field(
+        900.0, unit="s", alias="PICNIC_POOL_IDLE_TIMEOUT"
+    )
+    PICNIC_ACCOUNT_CONCURRENCY: int = pydantic.Field(
+        4, alias="PICNIC_ACCOUNT_CONCURRENCY"
+    )
+    PICNIC_ACCOUNT_WAIT_TIMEOUT: float = pydantic.Field(
+        30.0, unit="s", alias="PICNIC_ACCOUNT_WAIT_TIMEOUT"
+    )
+    # Picnic accounts, see src/core/credentials.py: the Fernet key the passwords
+    # are encrypted with, and the key to manage the accounts with. Without them,
+    # accounts can not be added or managed.
+    PICNIC_ACCOUNTS_KEY: Optional[str] = pydantic.Field(
+        None, alias="PICNIC_ACCOUNTS_KEY"
+    )
+    ACCOUNTS_ADMIN_KEY: Optional[str] = pydantic.Field(None, alias="ACCOUNTS_ADMIN_KEY")
+    # Journal of changes to the shopping cart, see src/picnic/journal.py.
+    JOURNAL_FLUSH_INTERVAL: float = pydantic.Field(
+        1.0, unit="s", alias="JOURNAL_FLUSH_INTERVAL"
+    )
+    JOURNAL_BATCH_SIZE: int = pydantic.Field(100, alias="JOURNAL_BATCH_SIZE")
+    JOURNAL_MAX_ATTEMPTS: int = pydantic.Field(5, alias="JOURNAL_MAX_ATTEMPTS")
+    JOURNAL_RETRY_DELAY: float = pydantic.Field(
+        5.0, unit="s", alias="JOURNAL_RETRY_DELAY"
+    )
+    JOURNAL_RETENTION: float = pydantic.Field(7.0, unit="d", alias="JOURNAL_RETENTION")
+    # Local mirror of the Picnic catalog, see src/picnic/catalog.py.
+    CATALOG_MAX_AGE: float = pydantic.Field(86400.0, unit="s", alias="CATALOG_MAX_AGE")
+    CATALOG_SYNC_BATCH: int = pydantic.Field(200, alias="CATALOG_SYNC_BATCH")
+    CATALOG_SEARCH_LIMIT: int = pydantic.Field(50, alias="CATALOG_SEARCH_LIMIT")
+    CATALOG_RETENTION: float = pydantic.Field(30.0, unit="d", alias="CATALOG_RETENTION")
 
 
 @functools.lru_cache()
@@ -0,0 +1,119 @@
+"""Encryption of the credentials of the Picnic accounts, so the database never
+holds their passwords in plain text."""
+from __future__ import annotations
+
+import functools
+import logging
+import secrets
+from typing import TYPE_CHECKING, Optional
+
+import fastapi
+from fastapi import status
+
+from src.core import config
+
+if TYPE_CHECKING:
+    from cryptography import fernet
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+@functools.lru_cache()
+def _get_fernet() -> fernet.Fernet:
+    """Cached call to the cipher of the passwords.
+
+    Returns:
+        The cipher, with PICNIC_ACCOUNTS_KEY as its key.
+
+    Raises:
+        503: If PICNIC_ACCOUNTS_KEY is not set.
+
+    """
+    if not settings.PICNIC_ACCOUNTS_KEY:
+        logger.error("PICNIC_ACCOUNTS_KEY is not set.")
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Picnic accounts are not configured on this service.",
+        )
+    # Imported here, as only the accounts other than the default one need it.
+    from cryptography import fernet
+
+    return fernet.Fernet(settings.PICNIC_ACCOUNTS_KEY)
+
+
+def encrypt(password: str) -> str:
+    """Encrypt a password.
+
+    Args:
+        password: The password.
+
+    Returns:
+        The encrypted password, as a Fernet token.
+
+    Raises:
+        503: If PICNIC_ACCOUNTS_KEY is not set.
+
+    """
+    return _get_fernet().encrypt(password.encode()).decode()
+
+
+def decrypt(token: str) -> str:
+    """Decrypt a password.
+
+    Args:
+        token: The encrypted password.
+
+    Returns:
+        The password.
+
+    Raises:
+        503: If PICNIC_ACCOUNTS_KEY is not set.
+        500: If the password was encrypted with another key.
+
+    """
+    from cryptography import fernet
+
+    try:
+        return _get_fernet().decrypt(token.encode()).decode()
+    except fernet.InvalidToken:
+        logger.error("Could not decrypt a Picnic password, was the key changed?")
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="The credentials of the Picnic account can not be decrypted.",
+        ) from None
+
+
+def require_admin_key(
+    x_admin_key: Optional[str] = fastapi.Header(
+        None,
+        alias="X-Admin-Key",
+        description="The key to manage the Picnic accounts with, ACCOUNTS_ADMIN_KEY.",
+    ),
+) -> None:
+    """Dependency that only lets requests with the admin key through.
+
+    Args:
+        x_admin_key: The value of the X-Admin-Key header.
+
+    Returns:
+        None.
+
+    Raises:
+        401: If the header is missing or wrong.
+        403: If ACCOUNTS_ADMIN_KEY is not set, so the accounts can not be managed.
+
+    """
+    if not settings.ACCOUNTS_ADMIN_KEY:
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Managing the Picnic accounts is disabled on this service.",
+        )
+    if x_admin_key is None or not secrets.compare_digest(
+        x_admin_key.encode(), settings.ACCOUNTS_ADMIN_KEY.encode()
+    ):
+        logger.warning("Rejected a request without a valid admin key.")
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="A valid X-Admin-Key header is required.",
+        )
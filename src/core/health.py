@@ -0,0 +1,160 @@
+"""Background health probing of the dependencies of the service."""
+import asyncio
+import datetime
+import functools
+import logging
+import time
+from typing import Callable, Optional
+
+from starlette import concurrency
+
+from src.core import config
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+class CheckResult:
+    """The outcome of the last probe of a dependency.
+
+    Attributes:
+        healthy: Whether the dependency answered correctly, None if it was not
+                 probed yet.
+        latency: The number of seconds the probe took.
+        checked_at: When the probe finished.
+        detail: Why the dependency is not healthy, if it is not.
+
+    """
+
+    __slots__ = ("healthy", "latency", "checked_at", "detail")
+
+    def __init__(
+        self,
+        healthy: Optional[bool] = None,
+        latency: Optional[float] = None,
+        checked_at: Optional[datetime.datetime] = None,
+        detail: Optional[str] = None,
+    ) -> None:
+        self.healthy = healthy
+        self.latency = latency
+        self.checked_at = checked_at
+        self.detail = detail
+
+
+class HealthProber:
+    """Probes every dependency at its own interval in the background and caches
+    the results, so health checks are answered without touching the
+    dependencies.
+
+    Notes:
+        The probes run in the threadpool. A probe that takes longer than
+        HEALTH_PROBE_TIMEOUT is reported as unhealthy right away; the probe
+        itself keeps running in its thread until it returns, as a thread can
+        not be stopped. Until then no new probe of that dependency is started,
+        so a hanging dependency holds at most one thread.
+
+    """
+
+    def __init__(self) -> None:
+        self._results: dict[str, CheckResult] = {}
+        self._intervals: dict[str, float] = {}
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self, checks: dict[str, tuple[Callable[[], None], float]]) -> None:
+        """Start probing, from the event loop.
+
+        Args:
+            checks: Per dependency, a function that raises if the dependency is
+                    not healthy, and the number of seconds between two probes.
+
+        Returns:
+            None.
+
+        """
+        for name, (check, interval) in checks.items():
+            self._results[name] = CheckResult()
+            self._intervals[name] = interval
+            self._tasks.append(asyncio.create_task(self._probe(name, check, interval)))
+
+    def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+
+    async def _probe(
+        self, name: str, check: Callable[[], None], interval: float
+    ) -> None:
+        running: Optional[asyncio.Future] = None
+        while True:
+            start = time.perf_counter()
+            if running is not None and not running.done():
+                healthy, detail = False, "The previous probe is still running."
+            else:
+                running = asyncio.ensure_future(concurrency.run_in_threadpool(check))
+                try:
+                    # Shielded, so a timeout leaves the probe to finish in its
+                    # thread, and the next round can tell it is still running.
+                    await asyncio.wait_for(
+                        asyncio.shield(running), timeout=settings.HEALTH_PROBE_TIMEOUT
+                    )
+                except asyncio.TimeoutError:
+                    healthy, detail = False, "The probe timed out."
+                    # Retrieve its outcome when it finishes, so it is not logged
+                    # as never retrieved.
+                    running.add_done_callback(
+                        lambda future: future.cancelled() or future.exception()
+                    )
+                except Exception as error:
+                    healthy, detail = False, f"{type(error).__name__}: {error}"
+                else:
+                    healthy, detail = True, None
+
+            if not healthy and self._results[name].healthy is not False:
+                logger.warning("Dependency %s is not healthy: %s", name, detail)
+            elif healthy and self._results[name].healthy is False:
+                logger.info("Dependency %s is healthy again.", name)
+            self._results[name] = CheckResult(
+                healthy=healthy,
+                latency=time.perf_counter() - start,
+                checked_at=datetime.datetime.now(tz=datetime.timezone.utc),
+                detail=detail,
+            )
+            await asyncio.sleep(interval)
+
+    def get_result(self, name: str) -> CheckResult:
+        """Get the last result of a dependency.
+
+        Args:
+            name: The name of the dependency.
+
+        Returns:
+            The result. Not healthy when it is older than three intervals, as the
+            prober is then stuck.
+
+        """
+        result = self._results.get(name, CheckResult())
+        if result.checked_at is None or not result.healthy:
+            return result
+        age = datetime.datetime.now(tz=datetime.timezone.utc) - result.checked_at
+        if age.total_seconds() > 3 * self._intervals[name]:
+            return CheckResult(
+                healthy=False,
+                latency=result.latency,
+                checked_at=result.checked_at,
+                detail="The last probe is outdated.",
+            )
+        return result
+
+    def get_results(self) -> dict[str, CheckResult]:
+        return {name: self.get_result(name) for name in self._results}
+
+
+@functools.lru_cache()
+def get_health_prober() -> HealthProber:
+    """Cached call to the health prober of the service.
+
+    Returns:
+        The health prober.
+
+    """
+    return HealthProber()
@@ -0,0 +1,205 @@
+"""Idempotency keys: the responses to mutating requests, stored so a retried
+request is answered with the first response rather than executed again."""
+import datetime
+import hashlib
+import json
+import logging
+from typing import NamedTuple, Optional
+
+import sqlalchemy
+from sqlalchemy import exc
+
+from src.core import config, models
+from src.database import crud as database_crud
+from src.database import session as database_session
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+class StoredResponse(NamedTuple):
+    """The response to a request, as sent by the application."""
+
+    status_code: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+
+class Record(NamedTuple):
+    """A key that is claimed by a request.
+
+    Attributes:
+        fingerprint: The fingerprint of the request that claimed the key.
+        response: Its response, None while the request is in flight.
+
+    """
+
+    fingerprint: str
+    response: Optional[StoredResponse]
+
+
+def get_hash(value: bytes) -> str:
+    """Returns the SHA-256 hash of a value, as 64 hex characters."""
+    return hashlib.sha256(value).hexdigest()
+
+
+def claim(key: str, fingerprint: str) -> Optional[Record]:
+    """Claim a key for a request, unless another request claimed it already.
+
+    Args:
+        key: The hash of the Idempotency-Key header.
+        fingerprint: The hash of the request.
+
+    Returns:
+        None if the key is claimed, and the request should be executed.
+        Otherwise the record of the request that claimed it first.
+
+    Notes:
+        The key is claimed by inserting it, so only one request can claim it,
+        also across processes. Expired keys are deleted first, as are the keys
+        of requests in flight whose lease ran out: their worker died, so they
+        are released.
+
+    """
+    while True:
+        now = models.utcnow()
+        with database_session.SessionLocal() as db_session:
+            database_crud.bulk_delete(
+                models.IdempotencyKey,
+                db_session,
+                [
+                    sqlalchemy.or_(
+                        models.IdempotencyKey.expires_at < now,
+                        sqlalchemy.and_(
+                            models.IdempotencyKey.status_code.is_(None),
+                            models.IdempotencyKey.locked_until < now,
+                        ),
+                    )
+                ],
+            )
+            db_session.add(
+                models.IdempotencyKey(
+                    key=key,
+                    fingerprint=fingerprint,
+                    locked_until=now
+                    + datetime.timedelta(seconds=settings.IDEMPOTENCY_LEASE),
+                    expires_at=now
+                    + datetime.timedelta(seconds=settings.IDEMPOTENCY_TTL),
+                )
+            )
+            try:
+                db_session.commit()
+            except exc.IntegrityError:
+                db_session.rollback()
+            else:
+                return None
+
+        record = read(key)
+        if record is not None:
+            return record
+        # The first request failed and released the key in the meantime.
+
+
+def read(key: str) -> Optional[Record]:
+    """Read the record of a key.
+
+    Args:
+        key: The hash of the Idempotency-Key header.
+
+    Returns:
+        The record, or None if the key is not claimed.
+
+    """
+    with database_session.SessionLocal() as db_session:
+        found = database_crud.read(
+            models.IdempotencyKey, db_session, [models.IdempotencyKey.key == key]
+        )
+        if not found:
+            return None
+        row = found[0]
+        response = None
+        if row.status_code is not None:
+            response = StoredResponse(
+                status_code=row.status_code,
+                headers=[
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in json.loads(row.headers)
+                ],
+                body=row.body,
+            )
+        return Record(fingerprint=row.fingerprint, response=response)
+
+
+def renew(key: str) -> None:
+    """Renew the lease of the request in flight that claimed a key.
+
+    Args:
+        key: The hash of the Idempotency-Key header.
+
+    Returns:
+        None.
+
+    """
+    with database_session.SessionLocal() as db_session:
+        database_crud.bulk_update(
+            models.IdempotencyKey,
+            [
+                {
+                    "key": key,
+                    "locked_until": models.utcnow()
+                    + datetime.timedelta(seconds=settings.IDEMPOTENCY_LEASE),
+                }
+            ],
+            db_session,
+        )
+        db_session.commit()
+
+
+def complete(key: str, response: StoredResponse) -> None:
+    """Store the response to the request that claimed a key.
+
+    Args:
+        key: The hash of the Idempotency-Key header.
+        response: The response.
+
+    Returns:
+        None.
+
+    """
+    with database_session.SessionLocal() as db_session:
+        database_crud.bulk_update(
+            models.IdempotencyKey,
+            [
+                {
+                    "key": key,
+                    "status_code": response.status_code,
+                    "headers": json.dumps(
+                        [
+                            (name.decode("latin-1"), value.decode("latin-1"))
+                            for name, value in response.headers
+                        ]
+                    ),
+                    "body": response.body,
+                    "locked_until": None,
+                }
+            ],
+            db_session,
+        )
+        db_session.commit()
+
+
+def release(key: str) -> None:
+    """Release a key, so the request can be retried.
+
+    Args:
+        key: The hash of the Idempotency-Key header.
+
+    Returns:
+        None.
+
+    """
+    with database_session.SessionLocal() as db_session:
+        database_crud.bulk_delete(
+            models.IdempotencyKey, db_session, [models.IdempotencyKey.key == key]
+        )
+        db_session.commit()
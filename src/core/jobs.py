@@ -0,0 +1,442 @@
+"""Background jobs: long-running operations that are persisted in the database and
+executed by a bounded pool of workers, so the request that starts them returns
+right away."""
+import concurrent.futures
+import contextvars
+import datetime
+import enum
+import functools
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Callable, Optional
+
+import fastapi
+from fastapi import status
+import sqlalchemy
+from sqlalchemy import orm
+import python_picnic_api
+
+from src.core import config, lifecycle, models, tracing
+from src.core import logging as core_logging
+from src.database import crud as database_crud
+from src.database import session as database_session
+from src.picnic import session as picnic_session
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+# Called by the controllers after every step, with at least the number of steps
+# that are done and the total number of steps.
+ProgressCallback = Callable[[dict[str, Any]], None]
+# Executes a job: its payload, a database session, a Picnic client and the
+# progress callback in, its result as JSON out.
+Handler = Callable[
+    [dict, orm.Session, python_picnic_api.PicnicAPI, ProgressCallback],
+    Optional[bytes],
+]
+
+
+class Status(str, enum.Enum):
+    """The states of a job.
+
+    QUEUED: Waiting for a worker.
+    RUNNING: Being executed by a worker.
+    SUCCEEDED: Done, with a result.
+    FAILED: Stopped, with an error.
+
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+_handlers: dict[str, Handler] = {}
+
+
+def register(kind: str) -> Callable[[Handler], Handler]:
+    """Decorator that registers the handler of a kind of job.
+
+    Args:
+        kind: The kind of job, e.g. "order".
+
+    Returns:
+        The decorator, which returns the handler itself.
+
+    """
+
+    def decorator(handler: Handler) -> Handler:
+        _handlers[kind] = handler
+        return handler
+
+    return decorator
+
+
+def run(
+    kind: str, payload: dict, account: str, on_progress: ProgressCallback
+) -> Optional[bytes]:
+    """Execute a job in the calling thread rather than by the workers, e.g. to
+    stream its progress.
+
+    Args:
+        kind: The kind of job, see register.
+        payload: The input of the job.
+        account: The name of the Picnic account the job uses.
+        on_progress: The progress callback of the handler.
+
+    Returns:
+        The result of the handler.
+
+    Notes:
+        The handler gets a database session and the client of the account from
+        the client pool of its own, not those of the request, as it may run on
+        after the response is sent and the request has released them.
+
+    """
+    database = database_session.get_database()
+    db_session = next(database)
+    try:
+        with picnic_session.get_client_pool().client(account) as pc_session:
+            return _handlers[kind](payload, db_session, pc_session, on_progress)
+    finally:
+        database.close()
+
+
+class _ProgressRecorder:
+    """Keeps the progress of a running job, and writes it to the database at most
+    once every JOBS_PROGRESS_INTERVAL seconds.
+
+    Notes:
+        The progress is written with its own session, so the session of the
+        handler is never committed halfway.
+
+    """
+
+    def __init__(self, job_id: str) -> None:
+        self.job_id = job_id
+        self.done = 0
+        self.total: Optional[int] = None
+        self._written_at = time.monotonic()
+
+    def __call__(self, event: dict[str, Any]) -> None:
+        self.done = event.get("done", self.done)
+        self.total = event.get("total", self.total)
+        if time.monotonic() - self._written_at >= settings.JOBS_PROGRESS_INTERVAL:
+            self._write()
+
+    def _write(self) -> None:
+        self._written_at = time.monotonic()
+        try:
+            with database_session.SessionLocal() as db_session:
+                database_crud.bulk_update(
+                    models.Job,
+                    [{"id": self.job_id, "done": self.done, "total": self.total}],
+                    db_session,
+                )
+                db_session.commit()
+        except Exception as error:
+            # The progress is informative only, it must not fail the job.
+            logger.warning(
+                "Could not write the progress of job %s: %s", self.job_id, error
+            )
+
+
+class JobRunner:
+    """Executes the jobs with a pool of JOBS_WORKERS threads.
+
+    Attributes:
+        owner: The identifier of the runner, with which it claims jobs.
+
+    Notes:
+        At most JOBS_QUEUE_SIZE jobs are queued or running at a time; more are
+        rejected with 503, so a burst of requests can not pile up work without
+        bound. Every job gets the client of its account from the client pool
+        when it runs, as the request that queued it has returned by then.
+
+        Every worker process, and every replica, has a runner of its own. A job
+        is claimed by moving it from queued to running in a single statement,
+        so it runs once even when several runners pick it up. The runner that
+        claimed a job reports it as running every JOBS_HEARTBEAT_INTERVAL
+        seconds; a running job without a heartbeat for JOBS_STALE_TIMEOUT
+        seconds belonged to a runner that died, and is marked as failed.
+
+    """
+
+    def __init__(self) -> None:
+        self.owner = uuid.uuid4().hex
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start the workers. Jobs are only executed once recover is called."""
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=settings.JOBS_WORKERS, thread_name_prefix="job-worker"
+        )
+        self._stopped.clear()
+        self._heartbeat = threading.Thread(
+            target=self._run_heartbeat, name="job-heartbeat", daemon=True
+        )
+        self._heartbeat.start()
+
+    def stop(self) -> None:
+        """Stop the workers. Running jobs are finished, queued jobs stay queued
+        in the database and are executed after the next start."""
+        self._stopped.set()
+        self._heartbeat = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _run_heartbeat(self) -> None:
+        while not self._stopped.wait(settings.JOBS_HEARTBEAT_INTERVAL):
+            if not lifecycle.get_lifecycle().is_ready:
+                continue
+            try:
+                with database_session.SessionLocal() as db_session:
+                    db_session.execute(
+                        sqlalchemy.update(models.Job)
+                        .where(
+                            models.Job.owner == self.owner,
+                            models.Job.status == Status.RUNNING,
+                        )
+                        .values(heartbeat_at=models.utcnow())
+                    )
+                    db_session.commit()
+                self._fail_stale()
+            except Exception:
+                logger.exception("Could not report the running jobs.")
+
+    def _fail_stale(self) -> None:
+        """Mark the running jobs without a heartbeat for JOBS_STALE_TIMEOUT
+        seconds as failed, as they may have changed the shopping cart halfway
+        and can not be repeated safely."""
+        now = models.utcnow()
+        stale = [
+            models.Job.status == Status.RUNNING,
+            sqlalchemy.or_(
+                models.Job.heartbeat_at.is_(None),
+                models.Job.heartbeat_at
+                < now - datetime.timedelta(seconds=settings.JOBS_STALE_TIMEOUT),
+            ),
+        ]
+        with database_session.SessionLocal() as db_session:
+            for row in database_crud.read_columns([models.Job.id], db_session, stale):
+                logger.warning("Job %s was interrupted, its runner stopped.", row.id)
+            db_session.execute(
+                sqlalchemy.update(models.Job)
+                .where(*stale)
+                .values(
+                    status=Status.FAILED,
+                    error="Interrupted by a restart of the service.",
+                    finished_at=now,
+                )
+            )
+            db_session.commit()
+
+    def recover(self) -> None:
+        """Pick up the jobs of a previous run, once the database is set up.
+
+        Jobs that were running without a heartbeat for JOBS_STALE_TIMEOUT
+        seconds are marked as failed. Jobs that are queued are executed, unless
+        another runner claims them first. Finished jobs older than
+        JOBS_RETENTION days are deleted.
+
+        Returns:
+            None.
+
+        """
+        self._fail_stale()
+        now = models.utcnow()
+        with database_session.SessionLocal() as db_session:
+            database_crud.bulk_delete(
+                models.Job,
+                db_session,
+                [
+                    models.Job.status.in_([Status.SUCCEEDED, Status.FAILED]),
+                    models.Job.finished_at
+                    < now - datetime.timedelta(days=settings.JOBS_RETENTION),
+                ],
+            )
+            queued = [
+                job.id
+                for job in sorted(
+                    database_crud.read(
+                        models.Job, db_session, [models.Job.status == Status.QUEUED]
+                    ),
+                    key=lambda job: job.created_at,
+                )
+            ]
+            db_session.commit()
+
+        for job_id in queued:
+            logger.info("Resuming queued job %s.", job_id)
+            with self._lock:
+                self._pending += 1
+            self._submit(job_id)
+
+    def enqueue(
+        self,
+        kind: str,
+        payload: dict,
+        db_session: orm.Session,
+        account: str = picnic_session.DEFAULT_ACCOUNT,
+    ) -> models.Job:
+        """Persist a job and queue it for the workers.
+
+        Args:
+            kind: The kind of job, see register.
+            payload: The input of the job, which must be JSON serializable.
+            db_session: The database session.
+            account: The name of the Picnic account the job uses.
+
+        Returns:
+            The queued job.
+
+        Raises:
+            ValueError: If no handler is registered for the kind.
+            503: If the workers are not started, or too many jobs are pending.
+
+        """
+        if kind not in _handlers:
+            raise ValueError(f"Unknown kind of job {kind}.")
+        with self._lock:
+            if self._executor is None or self._pending >= settings.JOBS_QUEUE_SIZE:
+                logger.error("Not accepting a %s job, the queue is full.", kind)
+                raise fastapi.HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many jobs are pending, try again later.",
+                    headers={
+                        "Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)
+                    },
+                )
+            self._pending += 1
+
+        try:
+            job = database_crud.create(
+                models.Job(
+                    id=uuid.uuid4().hex,
+                    kind=kind,
+                    account=account,
+                    status=Status.QUEUED,
+                    payload=json.dumps(payload),
+                    done=0,
+                ),
+                db_session,
+            )
+            db_session.commit()
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        logger.info("Queued %s job %s.", kind, job.id)
+        self._submit(job.id)
+        return job
+
+    def _submit(self, job_id: str) -> None:
+        # A fresh context, so the job does not count towards the query budget or
+        # trace of the request; only the request id is carried over for the logs.
+        executor = self._executor
+        try:
+            if executor is None:
+                raise RuntimeError("The workers are stopped.")
+            context = contextvars.Context()
+            run = functools.partial(self._run, job_id, core_logging.request_id.get())
+            future = executor.submit(lambda: context.run(run))
+        except RuntimeError:
+            # Stopped in the meantime; the job stays queued for the next start.
+            with self._lock:
+                self._pending -= 1
+            return
+        future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: concurrent.futures.Future) -> None:
+        # A job that ran counts itself out in _run; one cancelled by stop never
+        # runs.
+        if future.cancelled():
+            with self._lock:
+                self._pending -= 1
+
+    def _run(self, job_id: str, request_id: Optional[str]) -> None:
+        core_logging.request_id.set(request_id)
+        try:
+            with tracing.span("jobs.run", job_id=job_id):
+                self._execute(job_id)
+        except Exception:
+            logger.exception("Could not execute job %s.", job_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def _execute(self, job_id: str) -> None:
+        with database_session.SessionLocal() as db_session:
+            now = models.utcnow()
+            claimed = db_session.execute(
+                sqlalchemy.update(models.Job)
+                .where(models.Job.id == job_id, models.Job.status == Status.QUEUED)
+                .values(
+                    status=Status.RUNNING,
+                    owner=self.owner,
+                    started_at=now,
+                    heartbeat_at=now,
+                )
+            ).rowcount
+            db_session.commit()
+            if not claimed:
+                logger.info("Job %s was claimed by another runner.", job_id)
+                return
+            job = database_crud.read(
+                models.Job, db_session, [models.Job.id == job_id], expected_count=1
+            )[0]
+            kind, account, payload = job.kind, job.account, json.loads(job.payload)
+            logger.info("Running %s job %s.", kind, job_id)
+
+            progress = _ProgressRecorder(job_id)
+            result, error = None, None
+            try:
+                with picnic_session.get_client_pool().client(account) as pc_session:
+                    result = _handlers[kind](payload, db_session, pc_session, progress)
+            except fastapi.HTTPException as http_error:
+                error = str(http_error.detail)
+            except Exception as other_error:
+                logger.exception("Job %s failed.", job_id)
+                error = f"{type(other_error).__name__}: {other_error}"
+            db_session.rollback()
+
+            database_crud.bulk_update(
+                models.Job,
+                [
+                    {
+                        "id": job_id,
+                        "status": Status.FAILED if error else Status.SUCCEEDED,
+                        "done": progress.done,
+                        "total": progress.total,
+                        "result": result.decode() if result is not None else None,
+                        "error": error,
+                        "finished_at": models.utcnow(),
+                    }
+                ],
+                db_session,
+            )
+            db_session.commit()
+            if error:
+                logger.error("Job %s failed: %s", job_id, error)
+            else:
+                logger.info("Job %s succeeded.", job_id)
+
+
+@functools.lru_cache()
+def get_job_runner() -> JobRunner:
+    """Cached call to the job runner of the service.
+
+    Returns:
+        The job runner.
+
+    """
+    return JobRunner()
@@ -0,0 +1,92 @@
+"""The lifecycle of the application: liveness and readiness."""
+import enum
+import functools
+import threading
+from typing import Optional
+
+
+class State(str, enum.Enum):
+    """The states of the application.
+
+    STARTING: Serving, but the database is not set up yet.
+    READY: Serving, with the database set up.
+    FAILED: Serving, but the database could not be set up.
+    STOPPING: Shutting down.
+
+    """
+
+    STARTING = "starting"
+    READY = "ready"
+    FAILED = "failed"
+    STOPPING = "stopping"
+
+
+class Lifecycle:
+    """Tracks the state of the application.
+
+    Attributes:
+        state: The current state.
+        error: Why the start-up failed, if it did.
+
+    Notes:
+        The application is live as soon as it serves requests, and ready once the
+        database is set up. The state is set from the event loop and read from
+        the threadpool, hence the event, which is set once the start-up is over:
+        ready, failed or stopping, so nothing waits on a start-up that failed.
+
+    """
+
+    def __init__(self) -> None:
+        self.state = State.STARTING
+        self.error: Optional[str] = None
+        self._started = threading.Event()
+
+    @property
+    def is_live(self) -> bool:
+        return self.state != State.STOPPING
+
+    @property
+    def is_ready(self) -> bool:
+        return self.state == State.READY
+
+    def set_starting(self) -> None:
+        self.state = State.STARTING
+        self.error = None
+        self._started.clear()
+
+    def set_ready(self) -> None:
+        self.state = State.READY
+        self._started.set()
+
+    def set_failed(self, error: str) -> None:
+        self.state = State.FAILED
+        self.error = error
+        self._started.set()
+
+    def set_stopping(self) -> None:
+        self.state = State.STOPPING
+        self._started.set()
+
+    def wait_until_ready(self, timeout: float) -> bool:
+        """Wait until the application is ready.
+
+        Args:
+            timeout: The maximum number of seconds to wait.
+
+        Returns:
+            True if the application is ready, False otherwise; right away when
+            the start-up failed or the application is stopping.
+
+        """
+        return self._started.wait(timeout) and self.is_ready
+
+
+@functools.lru_cache()
+def get_lifecycle() -> Lifecycle:
+    """Cached call to the lifecycle of the application.
+
+    Returns:
+        The lifecycle.
+
+    """
+    return Lifecycle()
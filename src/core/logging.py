@@ -1,32 +1,159 @@
 """Centralized logging for the application."""
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import queue
+from logging import handlers
+from typing import Any, Optional
 
+from src.core import tracing
 
-def setup_logging(logger_settings: dict[str, str]) -> None:
-    """A function to set up the logging. This is centralized to ensure that the logging is easily swappable and consistent across the application.
+request_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "request_id", default=None
+)
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds the id of the current request and trace to the log records.
+
+    Notes:
+        Must run in the thread that created the record, so it is attached to the
+        queue handlers rather than to the file handlers.
+
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get() or "-"
+        record.trace_id = tracing.get_trace_id() or "-"
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats log records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _QueueHandler(handlers.QueueHandler):
+    """A queue handler that leaves the formatting to the listener thread.
+
+    Notes:
+        The standard QueueHandler formats the whole record before enqueueing it,
+        so it can be pickled. This queue stays in-process, so only the message
+        arguments are merged here, which keeps the record independent of objects
+        that may change later. Timestamps, layout and tracebacks are formatted
+        by the listener.
+
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def _get_file_handler(
+    filename: str, logger_settings: dict[str, Any]
+) -> logging.Handler:
+    """Returns a file handler that rotates on time if LOGGING_ROTATE_WHEN is set, and
+    on size otherwise.
 
     Args:
+        filename: The log file.
         logger_settings: A dictionary containing the logger settings.
 
     Returns:
-        None.
+        The file handler.
+
     """
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    if logger_settings["LOGGING_ROTATE_WHEN"]:
+        return handlers.TimedRotatingFileHandler(
+            filename,
+            when=logger_settings["LOGGING_ROTATE_WHEN"],
+            backupCount=logger_settings["LOGGING_BACKUP_COUNT"],
+            delay=True,
+        )
+    return handlers.RotatingFileHandler(
+        filename,
+        maxBytes=logger_settings["LOGGING_MAX_BYTES"],
+        backupCount=logger_settings["LOGGING_BACKUP_COUNT"],
+        delay=True,
     )
+
+
+_listener: Optional[handlers.QueueListener] = None
+
+
+def setup_logging(logger_settings: dict[str, Any]) -> handlers.QueueListener:
+    """A function to set up the logging. This is centralized to ensure that the logging is easily swappable and consistent across the application.
+
+    The loggers only put records on a queue; a single background thread formats
+    them and writes them to rotating files, so request threads never wait on disk.
+
+    Args:
+        logger_settings: A dictionary containing the logger settings.
+
+    Returns:
+        The started listener that writes the queued records. It is stopped, and
+        the queue flushed, when the interpreter exits. Later calls return the
+        same listener, e.g. when the application is started again in tests.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if logger_settings["LOGGING_FORMAT"] == "json":
+        formatter: logging.Formatter = JSONFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - "
+            "%(trace_id)s - %(message)s"
+        )
     loggers = [
         (
             logger_settings["LOGGING_REQUESTS_FILE"],
             logger_settings["LOGGER_REQUESTS_NAME"],
+            logger_settings["LOGGER_REQUESTS_LEVEL"],
         ),
         (
             logger_settings["LOGGING_CONTROLLERS_FILE"],
             logger_settings["LOGGER_CONTROLLERS_NAME"],
+            logger_settings["LOGGER_CONTROLLERS_LEVEL"],
         ),
     ]
-    for filename, logger_name in loggers:
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    file_handlers = []
+    for filename, logger_name, level in loggers:
+        file_handler = _get_file_handler(filename, logger_settings)
+        file_handler.setFormatter(formatter)
+        # Records are routed to the file of their own logger by name.
+        file_handler.addFilter(logging.Filter(logger_name))
+        file_handlers.append(file_handler)
+
+        queue_handler = _QueueHandler(log_queue)
+        queue_handler.addFilter(RequestIdFilter())
         logger = logging.getLogger(logger_name)
-        logger.setLevel(logging.DEBUG)
-        handler = logging.FileHandler(filename)
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+
+    listener = handlers.QueueListener(
+        log_queue, *file_handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    _listener = listener
+    return listener
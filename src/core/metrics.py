@@ -0,0 +1,368 @@
+"""In-process metrics, exposed in the Prometheus text format."""
+import bisect
+import functools
+import re
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+from anyio import to_thread
+
+T = TypeVar("T")
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    """Format a label set, e.g. {method="GET",route="/recipes"}."""
+    if not names:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Base class of the metrics. A metric holds one series per label set.
+
+    Notes:
+        Every metric has its own lock, which is only held to update a few numbers,
+        so recording stays cheap even when many threads record at once.
+
+    """
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        """Yields (suffix, formatted labels, value) per sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up, e.g. the number of requests."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def items(self) -> list[tuple[tuple[str, ...], float]]:
+        """Returns a snapshot of the value per label set."""
+        with self._lock:
+            return list(self._values.items())
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for label_values, value in sorted(self.items()):
+            yield "", _format_labels(self.labels, label_values), value
+
+
+class Histogram(Metric):
+    """Counts observations, e.g. latencies, in cumulative buckets."""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Iterable[str] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: the count of every bucket plus +Inf, and the sum.
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(label_values)
+            if series is None:
+                series = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[label_values] = series
+            series[0][index] += 1
+            series[1][0] += value
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        with self._lock:
+            values = [
+                (label_values, list(counts), total[0])
+                for label_values, (counts, total) in self._values.items()
+            ]
+        for label_values, counts, total in sorted(values):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                yield "_bucket", _format_labels(
+                    (*self.labels, "le"), (*label_values, _format_value(bound))
+                ), cumulative
+            labels = _format_labels(self.labels, label_values)
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Gauge(Metric):
+    """A value that is read when the metrics are collected.
+
+    Args:
+        collect: Returns the current value per label set.
+
+    """
+
+    type_name = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        collect: Callable[[], dict[tuple[str, ...], float]],
+        labels: Iterable[str] = (),
+    ):
+        super().__init__(name, documentation, labels)
+        self._collect = collect
+
+    def samples(self) -> Iterator[tuple[str, str, float]]:
+        for label_values, value in sorted(self._collect().items()):
+            yield "", _format_labels(self.labels, label_values), value
+
+
+class Registry:
+    """The metrics of the application, rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered.")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._metrics.pop(name, None)
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = Counter(
+    "fastnic_http_requests_total",
+    "HTTP requests handled, per route and status code.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "fastnic_http_request_duration_seconds",
+    "Latency of the HTTP requests, per route.",
+    ("method", "route"),
+)
+DB_QUERIES = Counter(
+    "fastnic_db_queries_total",
+    "Database statements executed, per operation and table.",
+    ("operation", "table"),
+)
+DB_QUERY_DURATION = Histogram(
+    "fastnic_db_query_duration_seconds",
+    "Latency of the database statements, per operation and table.",
+    ("operation", "table"),
+)
+PICNIC_CALLS = Counter(
+    "fastnic_picnic_calls_total",
+    "Calls to the Picnic API, per method.",
+    ("method",),
+)
+PICNIC_CALL_ERRORS = Counter(
+    "fastnic_picnic_call_errors_total",
+    "Calls to the Picnic API that raised an error, per method.",
+    ("method",),
+)
+PICNIC_CALL_DURATION = Histogram(
+    "fastnic_picnic_call_duration_seconds",
+    "Latency of the calls to the Picnic API, per method.",
+    ("method",),
+)
+CACHE_LOOKUPS = Counter(
+    "fastnic_cache_lookups_total",
+    "Response cache lookups, per backend and result (hit or miss).",
+    ("backend", "result"),
+)
+for _metric in (
+    HTTP_REQUESTS,
+    HTTP_REQUEST_DURATION,
+    DB_QUERIES,
+    DB_QUERY_DURATION,
+    PICNIC_CALLS,
+    PICNIC_CALL_ERRORS,
+    PICNIC_CALL_DURATION,
+    CACHE_LOOKUPS,
+):
+    REGISTRY.register(_metric)
+
+_STATEMENT_PATTERN = re.compile(
+    r"^\s*(?:(UPDATE)\s+|(\w+)\b.*?\b(?:FROM|INTO|TABLE|INDEX|TRIGGER)\s+"
+    r"(?:IF\s+(?:NOT\s+)?EXISTS\s+)?)[\"`]?(\w+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def describe_statement(statement: str) -> tuple[str, str]:
+    """Get the operation and the main table of an SQL statement, as metric labels.
+
+    Args:
+        statement: The SQL statement.
+
+    Returns:
+        The operation, e.g. "SELECT", and the first table it reads from or writes
+        to, or "-" when there is none.
+
+    Notes:
+        SQLAlchemy reuses the compiled statement strings, so the cache is hit
+        on almost every call.
+
+    """
+    match = _STATEMENT_PATTERN.match(statement)
+    if match is None:
+        operation = statement.split(None, 1)[0] if statement.strip() else "-"
+        return operation.upper(), "-"
+    return (match.group(1) or match.group(2)).upper(), match.group(3).lower()
+
+
+def timed_picnic_call(method: str, function: Callable[..., T]) -> Callable[..., T]:
+    """Wraps a Picnic API method so its calls, errors and latency are recorded.
+
+    Args:
+        method: The name of the method, used as label.
+        function: The bound method.
+
+    Returns:
+        The wrapped method.
+
+    """
+
+    @functools.wraps(function)
+    def wrapper(*args: Any, **kwargs: Any) -> T:
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            PICNIC_CALL_ERRORS.inc(method)
+            raise
+        finally:
+            PICNIC_CALLS.inc(method)
+            PICNIC_CALL_DURATION.observe(time.perf_counter() - start, method)
+
+    return wrapper
+
+
+def get_threadpool_statistics() -> dict[tuple[str, ...], float]:
+    """Get the usage of the threadpool that runs the sync routes and dependencies.
+
+    Returns:
+        The busy and total threads, and the tasks waiting for a thread. Empty
+        when called outside of the event loop.
+
+    """
+    try:
+        statistics = to_thread.current_default_thread_limiter().statistics()
+    except RuntimeError:
+        return {}
+    return {
+        ("busy",): float(statistics.borrowed_tokens),
+        ("total",): float(statistics.total_tokens),
+        ("waiting",): float(statistics.tasks_waiting),
+    }
+
+
+def get_cache_hit_ratios() -> dict[tuple[str, ...], float]:
+    """Get the share of the response cache lookups that were hits, per backend.
+
+    Returns:
+        The hit ratio per backend that has been used.
+
+    """
+    hits: dict[str, float] = {}
+    totals: dict[str, float] = {}
+    for (backend, result), value in CACHE_LOOKUPS.items():
+        totals[backend] = totals.get(backend, 0.0) + value
+        if result == "hit":
+            hits[backend] = value
+    return {
+        (backend,): hits.get(backend, 0.0) / total
+        for backend, total in totals.items()
+        if total
+    }
+
+
+REGISTRY.register(
+    Gauge(
+        "fastnic_threadpool_threads",
+        "Threads of the worker threadpool that are busy, in total, and the tasks "
+        "waiting for one.",
+        get_threadpool_statistics,
+        ("state",),
+    )
+)
+REGISTRY.register(
+    Gauge(
+        "fastnic_cache_hit_ratio",
+        "Share of the response cache lookups that were hits, per backend.",
+        get_cache_hit_ratios,
+        ("backend",),
+    )
+)
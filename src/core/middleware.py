@@ -0,0 +1,529 @@
+"""ASGI middleware of the application."""
+import asyncio
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, Union
+
+from starlette import concurrency, responses, types
+
+from src.core import config, idempotency, lifecycle, metrics, profiling, tracing
+from src.core import logging as core_logging
+from src.database import instrumentation
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_REQUESTS_NAME)
+
+MAX_REQUEST_ID_LENGTH = 64
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+IDEMPOTENCY_POLL_INTERVAL = 0.1
+MUTATING_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+# Responses that say "try again later", e.g. a locked cart or too many requests
+# for an account: storing them would replay them to the retry.
+TRANSIENT_STATUS_CODES = frozenset({408, 409, 423, 425, 429})
+
+
+_route_paths: dict[Any, str] = {}
+
+
+def _get_route(scope: types.Scope) -> str:
+    """Get the path template of the route that handled a request.
+
+    Args:
+        scope: The scope of the request, after it was handled.
+
+    Returns:
+        The path template, e.g. /api/v1/recipes/{recipe_id}, or "unmatched".
+
+    """
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    if endpoint not in _route_paths:
+        _route_paths.update(
+            (route.endpoint, route.path)
+            for route in scope["app"].routes
+            if hasattr(route, "endpoint")
+        )
+    return _route_paths.get(endpoint, "unmatched")
+
+
+class RequestContextMiddleware:
+    """Gives every request an id and logs it once it is handled.
+
+    The id is taken from the X-Request-ID header if the client sent one, and is
+    returned in the X-Request-ID header of the response. Log records created while
+    handling the request carry the id.
+
+    """
+
+    def __init__(self, app: types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        current_id = ""
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                current_id = value.decode("latin-1")[:MAX_REQUEST_ID_LENGTH]
+        current_id = current_id or uuid.uuid4().hex
+        token = core_logging.request_id.set(current_id)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_request_id(message: types.Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"x-request-id", current_id.encode("latin-1")),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            logger.info(
+                "%s %s %s %.1fms",
+                scope["method"],
+                scope["path"],
+                status_code,
+                (time.perf_counter() - start) * 1000,
+            )
+            core_logging.request_id.reset(token)
+
+
+class MetricsMiddleware:
+    """Records the count and latency of the requests per route.
+
+    Notes:
+        Requests are labelled with the path template of their route, e.g.
+        /api/v1/recipes/{recipe_id}, so the number of series stays bounded.
+        Requests that match no route are labelled "unmatched".
+
+    """
+
+    def __init__(self, app: types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message: types.Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = _get_route(scope)
+            metrics.HTTP_REQUESTS.inc(scope["method"], route, str(status_code))
+            metrics.HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - start, scope["method"], route
+            )
+
+
+class QueryTrackingMiddleware:
+    """Tracks the statements every request executes, to detect N+1 queries and to
+    enforce the query budget.
+
+    Notes:
+        Only added when QUERY_INSTRUMENTATION is enabled. Going over QUERY_BUDGET
+        raises once the response is sent, so the test client fails the request.
+
+    """
+
+    def __init__(self, app: types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with instrumentation.track_queries(
+            f"{scope['method']} {scope['path']}", budget=settings.QUERY_BUDGET
+        ):
+            await self.app(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """Profiles the requests that ask for it, or a random sample of the requests.
+
+    A request asks for a profile by sending the PROFILING_HEADER header with a
+    value of 1 or true. The name of the profile file is returned in the
+    X-Profile-File header.
+
+    Notes:
+        Only added when PROFILING_ENABLED is set; requests that are not profiled
+        only cost a header lookup.
+
+    """
+
+    def __init__(self, app: types.ASGIApp) -> None:
+        self.app = app
+        self._header = settings.PROFILING_HEADER.lower().encode("latin-1")
+        self._sample_rate = settings.PROFILING_SAMPLE_RATE
+
+    def _is_requested(self, scope: types.Scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == self._header:
+                return value.lower() in (b"1", b"true")
+        return self._sample_rate > 0 and random.random() < self._sample_rate
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if scope["type"] != "http" or not self._is_requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        # The request id comes from the client; start_profiler cleans the name
+        # up before it is used as a file name.
+        path = scope["path"].strip("/")
+        profiler = profiling.start_profiler(
+            f"{scope['method']}-{path}-{core_logging.request_id.get() or 'request'}"
+        )
+        if profiler is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_profile(message: types.Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (
+                        b"x-profile-file",
+                        os.path.basename(profiler.filename).encode("latin-1"),
+                    ),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            profiler.stop()
+
+
+class TracingMiddleware:
+    """Traces every request as the root span of its trace.
+
+    Notes:
+        A W3C traceparent header continues the trace of the caller. The span is
+        renamed to the route once the request is handled, e.g.
+        "GET /api/v1/recipes/{recipe_id}", and the trace id is returned in the
+        X-Trace-ID header.
+
+    """
+
+    def __init__(self, app: types.ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+
+        with tracing.span(
+            f"{scope['method']} {scope['path']}",
+            traceparent=traceparent,
+            **{"http.method": scope["method"], "http.target": scope["path"]},
+        ) as current:
+            assert current is not None
+
+            async def send_with_trace_id(message: types.Message) -> None:
+                if message["type"] == "http.response.start":
+                    current.attributes["http.status_code"] = message["status"]
+                    message["headers"] = [
+                        *message.get("headers", []),
+                        (b"x-trace-id", current.trace_id.encode("latin-1")),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_trace_id)
+            finally:
+                current.name = f"{scope['method']} {_get_route(scope)}"
+
+
+class IdempotencyMiddleware:
+    """Answers a mutating request that is retried with the same Idempotency-Key
+    header with the response to the first request, rather than executing it
+    again, so a retried order does not add its ingredients to the cart twice.
+
+    Attributes:
+        prefixes: The paths the header is honoured on.
+
+    Notes:
+        A retry that arrives while the first request is in flight waits for it,
+        for at most IDEMPOTENCY_WAIT_TIMEOUT seconds, and gets its response. The
+        key is claimed in the database, so this holds across processes as well;
+        within a process the retry is woken up when the first request is done,
+        otherwise it polls.
+
+        Responses with a status code below 500 are stored for IDEMPOTENCY_TTL
+        seconds. A server error or a transient error, like 409 or 429 with a
+        Retry-After, releases the key, so the request can be retried.
+        Reusing a key for another request is answered with 422.
+
+        The request in flight renews the lease on its key every third of
+        IDEMPOTENCY_LEASE seconds. When its worker dies, the lease runs out and
+        the next retry claims the key again, rather than waiting for it.
+
+        Only bodies up to IDEMPOTENCY_MAX_BODY_SIZE bytes are kept in memory, so
+        streamed imports and server-sent events stay bounded. A larger request
+        with a key is answered with 413. Event streams and larger responses are
+        sent as they are produced but not stored; the key is released when they
+        end, like for a transient error.
+
+    """
+
+    def __init__(self, app: types.ASGIApp, prefixes: tuple[str, ...]) -> None:
+        self.app = app
+        self.prefixes = prefixes
+        # The event is only awaited from its own event loop.
+        self._in_flight: dict[str, tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+
+    async def __call__(
+        self, scope: types.Scope, receive: types.Receive, send: types.Send
+    ) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in MUTATING_METHODS
+            or not scope["path"].startswith(self.prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+        header = next(
+            (value for name, value in scope["headers"] if name == b"idempotency-key"),
+            None,
+        )
+        if header is None:
+            await self.app(scope, receive, send)
+            return
+        if not header or len(header) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            response = responses.JSONResponse(
+                {"detail": "The Idempotency-Key header must be 1 to 255 characters."},
+                status_code=400,
+            )
+            await response(scope, receive, send)
+            return
+
+        parts = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] != "http.request":
+                return
+            parts.append(message.get("body", b""))
+            size += len(parts[-1])
+            if size > settings.IDEMPOTENCY_MAX_BODY_SIZE:
+                response = responses.JSONResponse(
+                    {
+                        "detail": "The Idempotency-Key header is not supported for "
+                        "bodies over "
+                        f"{settings.IDEMPOTENCY_MAX_BODY_SIZE} bytes."
+                    },
+                    status_code=413,
+                )
+                await response(scope, receive, send)
+                return
+            if not message.get("more_body", False):
+                break
+        body = b"".join(parts)
+        # Keys are scoped to the Picnic account, so two accounts can not replay
+        # each other's responses.
+        account = next(
+            (value for name, value in scope["headers"] if name == b"x-picnic-account"),
+            b"",
+        )
+        key = idempotency.get_hash(b"%s\n%s" % (account, header))
+        fingerprint = idempotency.get_hash(
+            b"%s %s?%s\n%s"
+            % (
+                scope["method"].encode(),
+                scope["path"].encode(),
+                scope["query_string"],
+                body,
+            )
+        )
+
+        replay = await self._wait_for_claim(key, fingerprint)
+        if isinstance(replay, responses.Response):
+            await replay(scope, receive, send)
+            return
+        if replay is not None:
+            logger.info("Replaying the response for idempotency key %s.", key[:12])
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": replay.status_code,
+                    "headers": [*replay.headers, (b"idempotent-replayed", b"true")],
+                }
+            )
+            await send({"type": "http.response.body", "body": replay.body})
+            return
+
+        await self._execute(key, scope, body, receive, send)
+
+    async def _wait_for_claim(
+        self, key: str, fingerprint: str
+    ) -> Union[idempotency.StoredResponse, responses.Response, None]:
+        """Claim the key, or wait until the request that claimed it is done.
+
+        Returns:
+            None if the key is claimed, the stored response of the first request,
+            or an error response.
+
+        """
+        is_ready = await concurrency.run_in_threadpool(
+            lifecycle.get_lifecycle().wait_until_ready, settings.STARTUP_READY_TIMEOUT
+        )
+        if not is_ready:
+            return responses.JSONResponse(
+                {"detail": "The database is not ready yet."},
+                status_code=503,
+                headers={"Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)},
+            )
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+        while True:
+            record = await concurrency.run_in_threadpool(
+                idempotency.claim, key, fingerprint
+            )
+            if record is None:
+                return None
+            if record.fingerprint != fingerprint:
+                return responses.JSONResponse(
+                    {"detail": "The Idempotency-Key was used for another request."},
+                    status_code=422,
+                )
+            if record.response is not None:
+                return record.response
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return responses.JSONResponse(
+                    {"detail": "A request with this Idempotency-Key is in flight."},
+                    status_code=409,
+                    headers={
+                        "Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)
+                    },
+                )
+            loop, in_flight = self._in_flight.get(key, (None, None))
+            try:
+                await asyncio.wait_for(
+                    in_flight.wait()
+                    if in_flight is not None and loop is asyncio.get_running_loop()
+                    else asyncio.sleep(IDEMPOTENCY_POLL_INTERVAL),
+                    timeout=remaining,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _renew(key: str) -> None:
+        """Renew the lease on a key until cancelled."""
+        while True:
+            await asyncio.sleep(settings.IDEMPOTENCY_LEASE / 3)
+            try:
+                await concurrency.run_in_threadpool(idempotency.renew, key)
+            except Exception as error:
+                logger.warning(
+                    "Could not renew idempotency key %s: %s", key[:12], error
+                )
+
+    async def _execute(
+        self,
+        key: str,
+        scope: types.Scope,
+        body: bytes,
+        receive: types.Receive,
+        send: types.Send,
+    ) -> None:
+        """Handle the request that claimed the key, and store its response."""
+        self._in_flight[key] = (asyncio.get_running_loop(), asyncio.Event())
+        body_sent = False
+        status_code = 500
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        size = 0
+        is_stored = True
+
+        async def receive_body() -> types.Message:
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send_and_record(message: types.Message) -> None:
+            nonlocal status_code, size, is_stored
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers.extend(message.get("headers", []))
+                is_stored = not any(
+                    name.lower() == b"content-type"
+                    and value.startswith(b"text/event-stream")
+                    for name, value in headers
+                )
+            elif message["type"] == "http.response.body" and is_stored:
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > settings.IDEMPOTENCY_MAX_BODY_SIZE:
+                    is_stored = False
+            if not is_stored:
+                chunks.clear()
+            await send(message)
+
+        renewer = asyncio.create_task(self._renew(key))
+        try:
+            await self.app(scope, receive_body, send_and_record)
+        except BaseException:
+            status_code = 500
+            raise
+        finally:
+            renewer.cancel()
+            try:
+                if (
+                    not is_stored
+                    or status_code >= 500
+                    or status_code in TRANSIENT_STATUS_CODES
+                ):
+                    await concurrency.run_in_threadpool(idempotency.release, key)
+                else:
+                    await concurrency.run_in_threadpool(
+                        idempotency.complete,
+                        key,
+                        idempotency.StoredResponse(
+                            status_code, headers, b"".join(chunks)
+                        ),
+                    )
+            finally:
+                self._in_flight.pop(key)[1].set()
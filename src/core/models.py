@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime, timezone
+from typing import Optional
 
 import sqlalchemy
 from sqlalchemy import orm
@@ -11,6 +12,11 @@ settings = config.get_settings()
 logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
 
 
+def utcnow() -> datetime:
+    """Returns the current time in UTC, used as default for the timestamps."""
+    return datetime.now(tz=timezone.utc)
+
+
 class GlobalModel(database_session.Base):
     """Global model inherited by all other models.
 
@@ -22,15 +28,15 @@ class GlobalModel(database_session.Base):
 
     __abstract__ = True
 
-    created_at = sqlalchemy.Column(
+    created_at: orm.Mapped[datetime] = orm.mapped_column(
         sqlalchemy.DateTime(),
-        default=datetime.now(tz=timezone.utc),
+        default=utcnow,
         nullable=False,
     )
-    updated_at = sqlalchemy.Column(
+    updated_at: orm.Mapped[datetime] = orm.mapped_column(
         sqlalchemy.DateTime(),
-        default=datetime.now(tz=timezone.utc),
-        onupdate=datetime.now(tz=timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
         nullable=False,
     )
 
@@ -50,9 +56,15 @@ class Recipe(GlobalModel):
 
     __tablename__ = "recipes"
 
-    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
-    name = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
-    category = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
+    id: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, primary_key=True, autoincrement=True
+    )
+    name: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(128), nullable=False, index=True
+    )
+    category: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(128), nullable=False
+    )
 
     ingredients: orm.Mapped[list["Ingredient"]] = orm.relationship(
         back_populates="recipe", cascade="save-update"
@@ -74,9 +86,11 @@ class Product(GlobalModel):
 
     __tablename__ = "products"
 
-    id = sqlalchemy.Column(sqlalchemy.String(50), primary_key=True)
-    name = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
-    image_uri = sqlalchemy.Column(sqlalchemy.String(255), nullable=True)
+    id: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(50), primary_key=True)
+    name: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(255), nullable=False)
+    image_uri: orm.Mapped[Optional[str]] = orm.mapped_column(
+        sqlalchemy.String(255), nullable=True
+    )
 
     ingredients: orm.Mapped[list["Ingredient"]] = orm.relationship(
         back_populates="product", cascade="all, delete"
@@ -101,15 +115,20 @@ class Ingredient(GlobalModel):
 
     __tablename__ = "ingredients"
 
-    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
-    name = sqlalchemy.Column(sqlalchemy.String(128), nullable=False)
-    quantity = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=1)
-    recipe_id = sqlalchemy.Column(
+    id: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, primary_key=True, autoincrement=True
+    )
+    name: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(128), nullable=False)
+    quantity: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=False, default=1
+    )
+    recipe_id: orm.Mapped[Optional[int]] = orm.mapped_column(
         sqlalchemy.Integer,
         sqlalchemy.ForeignKey("recipes.id"),
         nullable=True,
+        index=True,
     )
-    product_id = sqlalchemy.Column(
+    product_id: orm.Mapped[Optional[str]] = orm.mapped_column(
         sqlalchemy.String(50),
         sqlalchemy.ForeignKey("products.id"),
         nullable=True,
@@ -121,3 +140,277 @@ class Ingredient(GlobalModel):
     product: orm.Mapped["Product"] = orm.relationship(
         back_populates="ingredients", cascade="save-update"
     )
+
+
+class CollectionVersion(GlobalModel):
+    """Definition of the CollectionVersion model. The version of a collection is
+    incremented on every write to it, so it can be used as a cheap ETag.
+
+    Attributes:
+        name: The name of the collection.
+        version: The number of writes to the collection.
+
+    """
+
+    __tablename__ = "collection_versions"
+
+    name: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(64), primary_key=True)
+    version: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=False, default=0
+    )
+
+
+class Job(GlobalModel):
+    """Definition of the Job model, a long-running operation executed in the
+    background by the job runner.
+
+    Attributes:
+        id: The unique identifier of the job, a random hex string.
+        kind: The kind of job, e.g. "order".
+        account: The name of the Picnic account the job uses.
+        status: queued, running, succeeded or failed.
+        payload: The input of the job, as JSON.
+        done: The number of steps that are done.
+        total: The total number of steps, once known.
+        result: The output of the job, as JSON, once it succeeded.
+        error: Why the job failed, if it did.
+        owner: The job runner that claimed the job, one per process.
+        started_at: When a worker picked up the job.
+        heartbeat_at: When the runner last reported the job as running.
+        finished_at: When the job succeeded or failed.
+
+    """
+
+    __tablename__ = "jobs"
+
+    id: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(32), primary_key=True)
+    kind: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(32), nullable=False)
+    account: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(64), nullable=False)
+    status: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(16), nullable=False, index=True
+    )
+    payload: orm.Mapped[str] = orm.mapped_column(sqlalchemy.Text, nullable=False)
+    done: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=False, default=0
+    )
+    total: orm.Mapped[Optional[int]] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=True
+    )
+    result: orm.Mapped[Optional[str]] = orm.mapped_column(
+        sqlalchemy.Text, nullable=True
+    )
+    error: orm.Mapped[Optional[str]] = orm.mapped_column(sqlalchemy.Text, nullable=True)
+    owner: orm.Mapped[Optional[str]] = orm.mapped_column(
+        sqlalchemy.String(32), nullable=True
+    )
+    started_at: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=True
+    )
+    heartbeat_at: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=True
+    )
+    finished_at: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=True
+    )
+
+
+class IdempotencyKey(GlobalModel):
+    """Definition of the IdempotencyKey model, the response to a request that was
+    sent with an Idempotency-Key header, replayed when the request is retried.
+
+    Attributes:
+        key: The SHA-256 hash of the Idempotency-Key header.
+        fingerprint: The SHA-256 hash of the method, path and body of the request,
+                     so a key can not be reused for another request.
+        status_code: The status code of the response, None while the request is
+                     in flight.
+        headers: The headers of the response, as JSON.
+        body: The body of the response.
+        locked_until: While the request is in flight, when the key is released
+                      unless the request renews it, in case its worker died.
+        expires_at: When the key may be used again for another request.
+
+    """
+
+    __tablename__ = "idempotency_keys"
+
+    key: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(64), primary_key=True)
+    fingerprint: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(64), nullable=False
+    )
+    status_code: orm.Mapped[Optional[int]] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=True
+    )
+    headers: orm.Mapped[Optional[str]] = orm.mapped_column(
+        sqlalchemy.Text, nullable=True
+    )
+    body: orm.Mapped[Optional[bytes]] = orm.mapped_column(
+        sqlalchemy.LargeBinary, nullable=True
+    )
+    locked_until: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=True
+    )
+    expires_at: orm.Mapped[datetime] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=False, index=True
+    )
+
+
+class CartLock(GlobalModel):
+    """Definition of the CartLock model, the lock on the shopping cart of a Picnic
+    account across processes, on databases without advisory locks.
+
+    Attributes:
+        account: The Picnic account whose cart is locked.
+        owner: A random identifier of the holder of the lock.
+        expires_at: When the lock is released anyway, in case its holder died.
+
+    """
+
+    __tablename__ = "cart_locks"
+
+    account: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(128), primary_key=True
+    )
+    owner: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(32), nullable=False)
+    expires_at: orm.Mapped[datetime] = orm.mapped_column(
+        sqlalchemy.DateTime(), nullable=False
+    )
+
+
+class PicnicAccount(GlobalModel):
+    """Definition of the PicnicAccount model, the credentials of a Picnic account
+    that requests can select with the X-Picnic-Account header.
+
+    Attributes:
+        id: The unique identifier of the account.
+        name: The name requests select the account by.
+        username: The username to log in to Picnic with.
+        password: The password to log in to Picnic with, encrypted with
+                  PICNIC_ACCOUNTS_KEY, see src/core/credentials.py.
+        country_code: The country of the account, e.g. "NL".
+
+    """
+
+    __tablename__ = "picnic_accounts"
+
+    id: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, primary_key=True, autoincrement=True
+    )
+    name: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(64), nullable=False, unique=True
+    )
+    username: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(128), nullable=False
+    )
+    password: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(512), nullable=False
+    )
+    country_code: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(2), nullable=False, default="NL"
+    )
+
+
+class CartMutation(GlobalModel):
+    """Definition of the CartMutation model, an entry in the journal of changes to
+    the shopping cart that are yet to be applied to Picnic.
+
+    Attributes:
+        id: The unique identifier of the entry, in the order it is applied.
+        batch: The identifier of the request that wrote the entry.
+        account: The name of the Picnic account of the cart.
+        action: Whether the product is added or removed.
+        product_id: The id of the product in Picnic.
+        quantity: The number of products to add or remove.
+        status: Pending, applied or failed.
+        attempts: The number of times applying the entry failed.
+        error: The last error, if any.
+        next_attempt_at: When a failed entry is retried.
+        applied_at: When the entry was applied.
+
+    """
+
+    __tablename__ = "cart_mutations"
+
+    id: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, primary_key=True, autoincrement=True
+    )
+    batch: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(32), nullable=False, index=True
+    )
+    account: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(64), nullable=False)
+    action: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(16), nullable=False)
+    product_id: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(50), nullable=False
+    )
+    quantity: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=False, default=1
+    )
+    status: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(16), nullable=False, index=True
+    )
+    attempts: orm.Mapped[int] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=False, default=0
+    )
+    error: orm.Mapped[Optional[str]] = orm.mapped_column(sqlalchemy.Text, nullable=True)
+    next_attempt_at: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime, nullable=True
+    )
+    applied_at: orm.Mapped[Optional[datetime]] = orm.mapped_column(
+        sqlalchemy.DateTime, nullable=True
+    )
+
+
+class CatalogProduct(GlobalModel):
+    """Definition of the CatalogProduct model, a product in the local mirror of
+    the Picnic catalog.
+
+    Attributes:
+        id: The id of the product in Picnic.
+        name: The name of the product.
+        type: The type of the search result, e.g. "SINGLE_ARTICLE".
+        unit_quantity: The size of the product, e.g. "6 x 330 ml".
+        display_price: The price in cents, if known.
+        decorators: The decorators of the product as JSON, e.g. its promos.
+        image_id: The id of the image of the product.
+        last_seen_at: When the product was last returned by a Picnic search.
+
+    """
+
+    __tablename__ = "catalog_products"
+
+    id: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(50), primary_key=True)
+    name: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(255), nullable=False)
+    type: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(32), nullable=False)
+    unit_quantity: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.String(64), nullable=False, default=""
+    )
+    display_price: orm.Mapped[Optional[int]] = orm.mapped_column(
+        sqlalchemy.Integer, nullable=True
+    )
+    decorators: orm.Mapped[str] = orm.mapped_column(
+        sqlalchemy.Text, nullable=False, default="[]"
+    )
+    image_id: orm.Mapped[Optional[str]] = orm.mapped_column(
+        sqlalchemy.String(128), nullable=True
+    )
+    last_seen_at: orm.Mapped[datetime] = orm.mapped_column(
+        sqlalchemy.DateTime, nullable=False, index=True
+    )
+
+
+class CatalogTerm(GlobalModel):
+    """Definition of the CatalogTerm model, a search term whose results are in
+    the catalog.
+
+    Attributes:
+        term: The search term.
+        synced_at: When the results of the term were last fetched from Picnic.
+
+    """
+
+    __tablename__ = "catalog_terms"
+
+    term: orm.Mapped[str] = orm.mapped_column(sqlalchemy.String(255), primary_key=True)
+    synced_at: orm.Mapped[datetime] = orm.mapped_column(
+        sqlalchemy.DateTime, nullable=False, index=True
+    )
@@ -10,10 +10,29 @@ class Descriptions(str, enum.Enum):
     dummy = "This is a dummy description."
 
     recipe_id = "The identifier of the recipe."
+    recipe_ids = "Comma-separated identifiers of the recipes."
+    recipe_view = "Whether to return the full recipes or only their summary."
+    recipe_fields = "Comma-separated fields of the recipes to return."
+    search_query = "The terms to search recipes by."
+    search_limit = "The maximum number of results."
+    min_coverage = "The minimum fraction of the products of a recipe in the cart."
+    skip_cart = "Only update the recipe details, without reading the shopping cart."
+    if_none_match = "The ETag of the representation the client already has."
+    background = "Queue the work as a job and return its id right away."
+    job_id = "The identifier of the job."
+    batch_id = "The identifier of the batch of changes to the cart."
+    catalog_query = "The words that must all occur in the name of the product."
+    catalog_sync_payload = "The search terms to refresh."
+    picnic_account = (
+        "The name of the Picnic account to use, the default account if empty."
+    )
+    account_name = "The name of the Picnic account."
 
     recipe_payload = "The payload of the recipe."
+    recipes_payload = "The payload of the recipes, with their ingredients."
     order_payload = "The payload of the order."
     promo_payload = "The payload of the promo."
+    account_payload = "The payload of the Picnic account."
 
 
 def get_openapi_tags_metadata() -> list[dict[str, str]]:
@@ -40,4 +59,21 @@ def get_openapi_tags_metadata() -> list[dict[str, str]]:
             "name": "Dealicious",
             "description": "CRUD operations to manage discounts.",
         },
+        {
+            "name": "Catalog",
+            "description": "Operations on the local mirror of the Picnic catalog.",
+        },
+        {
+            "name": "Accounts",
+            "description": "Operations to manage the Picnic accounts.",
+        },
+        {
+            "name": "Jobs",
+            "description": "Operations to follow the jobs running in the background.",
+        },
+        {
+            "name": "Journal",
+            "description": "Operations to follow the changes to the cart that are "
+            "applied in the background.",
+        },
     ]
@@ -0,0 +1,142 @@
+"""On-demand sampling profiler for single requests."""
+import collections
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import types
+from typing import Optional
+
+from src.core import config
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+# Innermost functions of threads that are waiting for work rather than doing it,
+# e.g. an idle event loop, worker of the threadpool or log writer.
+IDLE_FUNCTIONS = frozenset(
+    {
+        ("selectors.py", "select"),
+        ("threading.py", "wait"),
+        ("queue.py", "get"),
+        ("handlers.py", "dequeue"),
+    }
+)
+
+# Only one request is profiled at a time, as every profile samples all threads.
+_profiling = threading.Lock()
+
+
+class SamplingProfiler(threading.Thread):
+    """Samples the stacks of all busy threads at a fixed interval, and writes them
+    as folded stacks once stopped.
+
+    Attributes:
+        filename: The file the profile is written to.
+        interval: The number of seconds between two samples.
+
+    Notes:
+        The folded format has one line per distinct stack, with the frames from
+        the thread name down to the innermost function separated by semicolons
+        and followed by the number of samples. It is read by flamegraph.pl,
+        inferno and speedscope.
+
+        Sampling measures wall time, so time spent waiting on Picnic or the
+        database shows up as well. Sync routes run in the threadpool, so all
+        threads are sampled; other requests handled at the same time show up in
+        the profile too.
+
+    """
+
+    def __init__(self, filename: str, interval: float) -> None:
+        super().__init__(name="request-profiler", daemon=True)
+        self.filename = filename
+        self.interval = interval
+        self._stopped = threading.Event()
+        self._stacks: collections.Counter[str] = collections.Counter()
+        self._samples = 0
+
+    def _sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == self.ident:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FUNCTIONS:
+                continue
+            stack = []
+            current: Optional[types.FrameType] = frame
+            while current is not None:
+                code = current.f_code
+                stack.append(
+                    f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                    f":{current.f_lineno})"
+                )
+                current = current.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            self._stacks[";".join(reversed(stack))] += 1
+
+    def run(self) -> None:
+        start = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            self._sample()
+            self._samples += 1
+        try:
+            self._write()
+        finally:
+            _profiling.release()
+        logger.info(
+            "Wrote profile of %s samples over %.3f s to %s.",
+            self._samples,
+            time.perf_counter() - start,
+            self.filename,
+        )
+
+    def _write(self) -> None:
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        with open(self.filename, "w", encoding="utf-8") as profile:
+            for stack, count in self._stacks.most_common():
+                profile.write(f"{stack} {count}\n")
+
+    def stop(self) -> None:
+        """Stops sampling. The profile is written by the profiler thread, so the
+        caller does not wait on the disk."""
+        self._stopped.set()
+
+
+def start_profiler(name: str) -> Optional[SamplingProfiler]:
+    """Start profiling, unless another request is being profiled already.
+
+    Args:
+        name: The name of the profile, used in its file name.
+
+    Returns:
+        The started profiler, or None if another profile is running.
+
+    Raises:
+        ValueError: If the file name would be outside PROFILING_DIRECTORY.
+
+    Notes:
+        The name may contain parts of the request, such as its id, so any
+        character other than letters, digits, "_", "." and "-" is replaced.
+
+    """
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+    directory = os.path.realpath(settings.PROFILING_DIRECTORY)
+    filename = os.path.realpath(
+        os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{name}.folded")
+    )
+    if os.path.dirname(filename) != directory:
+        raise ValueError(f"Profile {name} is outside of the profiling directory.")
+    if not _profiling.acquire(blocking=False):
+        logger.info("Not profiling %s, another profile is running.", name)
+        return None
+    profiler = SamplingProfiler(filename, settings.PROFILING_INTERVAL / 1000)
+    try:
+        profiler.start()
+    except Exception:
+        _profiling.release()
+        raise
+    return profiler
@@ -0,0 +1,236 @@
+"""An in-memory inverted index of the ingredients of the recipes, to find the
+recipes that can be cooked from a set of products without loading every recipe."""
+import functools
+import logging
+import threading
+from typing import Iterable, NamedTuple, Optional
+
+import sqlalchemy
+from sqlalchemy import orm
+
+from src.core import config, models, tracing
+from src.database import crud as database_crud
+from src.database import session as database_session
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+RECIPES_COLLECTION = "recipes"
+
+
+class Match(NamedTuple):
+    """A recipe that shares products with the products searched for."""
+
+    recipe_id: int
+    matched: int
+    total: int
+    missing: list[str]
+
+    @property
+    def coverage(self) -> float:
+        """The fraction of the products of the recipe that are searched for."""
+        return self.matched / self.total
+
+
+class RecipeIndex:
+    """Maps every product to the recipes that use it, and every recipe to the set
+    of its products.
+
+    Notes:
+        Every product gets a bit the first time it is seen, and the products of
+        a recipe are stored as an integer with the bits of its products set. The
+        coverage of a recipe is then the number of bits in the intersection with
+        the bits of the products searched for; only the recipes that share a
+        product with them are looked at, found through the postings.
+
+        The index knows the version of the recipes collection it reflects. The
+        writes of this process are applied incrementally; when another process
+        wrote to the recipes, the versions differ and the index is rebuilt on
+        the next search.
+
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._bits: dict[str, int] = {}
+        self._products: list[str] = []
+        self._masks: dict[int, int] = {}
+        self._postings: dict[str, set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._masks)
+
+    def _get_bit(self, product_id: str) -> int:
+        bit = self._bits.get(product_id)
+        if bit is None:
+            bit = self._bits[product_id] = len(self._products)
+            self._products.append(product_id)
+        return bit
+
+    def _get_mask(self, product_ids: Iterable[str]) -> int:
+        mask = 0
+        for product_id in product_ids:
+            bit = self._bits.get(product_id)
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def _get_product_ids(self, mask: int) -> list[str]:
+        product_ids = []
+        while mask:
+            low = mask & -mask
+            product_ids.append(self._products[low.bit_length() - 1])
+            mask ^= low
+        return product_ids
+
+    def _remove(self, recipe_id: int) -> None:
+        mask = self._masks.pop(recipe_id, 0)
+        for product_id in self._get_product_ids(mask):
+            postings = self._postings[product_id]
+            postings.discard(recipe_id)
+            if not postings:
+                del self._postings[product_id]
+
+    def _add(self, recipe_id: int, product_ids: Iterable[str]) -> None:
+        mask = 0
+        for product_id in product_ids:
+            mask |= 1 << self._get_bit(product_id)
+            self._postings.setdefault(product_id, set()).add(recipe_id)
+        if mask:
+            self._masks[recipe_id] = mask
+
+    def _read_ingredients(
+        self, db_session: orm.Session, recipe_ids: Optional[Iterable[int]] = None
+    ) -> dict[int, set[str]]:
+        """Read the product ids of the ingredients per recipe, of all recipes or
+        of the given ones, in a single query."""
+        query = sqlalchemy.select(
+            models.Ingredient.recipe_id, models.Ingredient.product_id
+        ).where(models.Ingredient.product_id.is_not(None))
+        if recipe_ids is not None:
+            query = query.where(models.Ingredient.recipe_id.in_(recipe_ids))
+        ingredients: dict[int, set[str]] = {}
+        for recipe_id, product_id in db_session.execute(query):
+            ingredients.setdefault(recipe_id, set()).add(product_id)
+        return ingredients
+
+    def _build(self, db_session: orm.Session) -> None:
+        """Build the index from the ingredients table. Must be called with the
+        lock held."""
+        # The version is read first: a write in between makes the index newer
+        # than its version, which only causes another rebuild.
+        version = database_crud.read_collection_version(RECIPES_COLLECTION, db_session)
+        ingredients = self._read_ingredients(db_session)
+        self._bits, self._products, self._masks, self._postings = {}, [], {}, {}
+        for recipe_id, product_ids in ingredients.items():
+            self._add(recipe_id, product_ids)
+        self._version = version
+        logger.info(
+            "Indexed %s recipes with %s products at version %s.",
+            len(self._masks),
+            len(self._products),
+            version,
+        )
+
+    @tracing.traced()
+    def build(self) -> None:
+        """Build the index from the ingredients table.
+
+        Returns:
+            None.
+
+        """
+        with database_session.SessionLocal() as db_session, self._lock:
+            self._build(db_session)
+
+    @tracing.traced()
+    def update(self, recipe_ids: Iterable[int]) -> None:
+        """Update the index after a committed write to recipes.
+
+        Args:
+            recipe_ids: The ids of the created, changed or deleted recipes.
+
+        Returns:
+            None.
+
+        Notes:
+            When the write was not the only one since the index was built or
+            updated, the index is rebuilt instead.
+
+        """
+        recipe_ids = set(recipe_ids)
+        with database_session.SessionLocal() as db_session, self._lock:
+            version = database_crud.read_collection_version(
+                RECIPES_COLLECTION, db_session
+            )
+            if self._version is None or version != self._version + 1:
+                self._build(db_session)
+                return
+            ingredients = self._read_ingredients(db_session, recipe_ids)
+            for recipe_id in recipe_ids:
+                self._remove(recipe_id)
+                self._add(recipe_id, ingredients.get(recipe_id, ()))
+            self._version = version
+        logger.debug("Updated %s recipes in the index.", len(recipe_ids))
+
+    @tracing.traced()
+    def match(
+        self,
+        product_ids: Iterable[str],
+        min_coverage: float,
+        limit: int,
+        db_session: orm.Session,
+    ) -> list[Match]:
+        """Find the recipes whose products are covered by a set of products.
+
+        Args:
+            product_ids: The products, e.g. those in the shopping cart.
+            min_coverage: The minimum fraction of the products of a recipe that
+                          are covered, between 0 and 1.
+            limit: The maximum number of recipes.
+            db_session: The database session, to check the index is current.
+
+        Returns:
+            The recipes that share at least one product, the best covered
+            first, then those covering the most products.
+
+        """
+        product_ids = set(product_ids)
+        version = database_crud.read_collection_version(RECIPES_COLLECTION, db_session)
+        with self._lock:
+            if version != self._version:
+                self._build(db_session)
+            mask = self._get_mask(product_ids)
+            candidates: set[int] = set()
+            for product_id in product_ids:
+                candidates |= self._postings.get(product_id, set())
+
+            scores = []
+            for recipe_id in candidates:
+                recipe_mask = self._masks[recipe_id]
+                matched = (recipe_mask & mask).bit_count()
+                total = recipe_mask.bit_count()
+                if matched >= min_coverage * total:
+                    scores.append((matched / total, matched, recipe_id, total))
+            scores.sort(key=lambda score: (-score[0], -score[1], score[2]))
+            return [
+                Match(
+                    recipe_id=recipe_id,
+                    matched=matched,
+                    total=total,
+                    missing=self._get_product_ids(self._masks[recipe_id] & ~mask),
+                )
+                for _, matched, recipe_id, total in scores[:limit]
+            ]
+
+
+@functools.lru_cache()
+def get_recipe_index() -> RecipeIndex:
+    """Cached call to the recipe index of the service.
+
+    Returns:
+        The index.
+
+    """
+    return RecipeIndex()
@@ -1,4 +1,5 @@
 """Schemas for input and output at the endpoints."""
+import functools
 import logging
 import datetime
 from typing import Optional, Type
@@ -109,7 +110,16 @@ class OrderInputSchema(pydantic.BaseModel):
 
 
 class RecipeUpdateSchema(RecipeInputSchema):
-    __annotations__ = make_all_fields_optional(RecipeInputSchema)
+    name: Optional[str] = pydantic.Field(  # type: ignore
+        None,
+        title="Name",
+        description="The name of the recipe.",
+    )
+    category: Optional[str] = pydantic.Field(  # type: ignore
+        None,
+        title="Category",
+        description="The category of the recipe.",
+    )
 
 
 class ProductUpdateSchema(ProductInputSchema):
@@ -133,6 +143,37 @@ class IngredientOutputSchema(BaseOutputModel, IngredientInputSchema):
     )
 
 
+class RecipeSummaryOutputSchema(RecipeInputSchema):
+    id: int = pydantic.Field(
+        ...,
+        title="ID",
+        description="The internal primary key of the model.",
+    )
+
+
+class RecipeMatchOutputSchema(RecipeSummaryOutputSchema):
+    coverage: float = pydantic.Field(
+        ...,
+        title="Coverage",
+        description="The fraction of the products of the recipe in the cart.",
+    )
+    matched: int = pydantic.Field(
+        ...,
+        title="Matched",
+        description="The number of products of the recipe in the cart.",
+    )
+    total: int = pydantic.Field(
+        ...,
+        title="Total",
+        description="The number of products of the recipe.",
+    )
+    missing: list[str] = pydantic.Field(
+        ...,
+        title="Missing",
+        description="The ids of the products of the recipe not in the cart.",
+    )
+
+
 class RecipeOutputSchema(BaseOutputModel, RecipeInputSchema):
     ingredients: list[IngredientOutputSchema] = pydantic.Field(
         ...,
@@ -141,9 +182,477 @@ class RecipeOutputSchema(BaseOutputModel, RecipeInputSchema):
     )
 
 
+@functools.lru_cache()
+def get_recipe_projection_schema(fields: tuple[str, ...]) -> Type[pydantic.BaseModel]:
+    """Returns a schema with a subset of the fields of RecipeOutputSchema.
+
+    Args:
+        fields: The names of the fields to keep.
+
+    Returns:
+        RecipeSummaryOutputSchema if it has exactly these fields, otherwise a new
+        schema with these fields.
+
+    """
+    if set(fields) == set(RecipeSummaryOutputSchema.model_fields):
+        return RecipeSummaryOutputSchema
+    return pydantic.create_model(  # type: ignore
+        "RecipeProjectionOutputSchema",
+        **{
+            name: (field.annotation, field)
+            for name, field in RecipeOutputSchema.model_fields.items()
+            if name in fields
+        },
+    )
+
+
 class ProductOutputSchema(ProductInputSchema):
     ingredients: list[IngredientOutputSchema] = pydantic.Field(
         ...,
         title="Ingredients",
         description="The ingredients of the product.",
     )
+
+
+class IngredientTransferSchema(pydantic.BaseModel):
+    name: str = pydantic.Field(
+        ...,
+        title="Name",
+        description="The name of the ingredient.",
+    )
+    quantity: int = pydantic.Field(
+        ...,
+        title="Quantity",
+        description="The quantity of the ingredient.",
+    )
+    product_id: str = pydantic.Field(
+        ...,
+        title="Product ID",
+        description="The ID of the Picnic product of the ingredient.",
+    )
+    image_uri: Optional[str] = pydantic.Field(
+        None,
+        title="Image URI",
+        description="The URI of the image of the product.",
+    )
+
+
+class RecipeTransferSchema(RecipeInputSchema):
+    ingredients: list[IngredientTransferSchema] = pydantic.Field(
+        [],
+        title="Ingredients",
+        description="The ingredients of the recipe.",
+    )
+
+
+class ImportErrorSchema(pydantic.BaseModel):
+    line: int = pydantic.Field(
+        ...,
+        title="Line",
+        description="The line number of the rejected row.",
+    )
+    detail: str = pydantic.Field(
+        ...,
+        title="Detail",
+        description="Why the row was rejected.",
+    )
+
+
+class ImportReportSchema(pydantic.BaseModel):
+    imported: int = pydantic.Field(
+        0,
+        title="Imported",
+        description="The number of imported rows.",
+    )
+    failed: int = pydantic.Field(
+        0,
+        title="Failed",
+        description="The number of rejected rows.",
+    )
+    errors: list[ImportErrorSchema] = pydantic.Field(
+        [],
+        title="Errors",
+        description="The first rejected rows and why they were rejected.",
+    )
+
+
+class RecipeBatchResultSchema(pydantic.BaseModel):
+    index: int = pydantic.Field(
+        ...,
+        title="Index",
+        description="The position of the recipe in the batch.",
+    )
+    id: Optional[int] = pydantic.Field(
+        None,
+        title="ID",
+        description="The ID of the created recipe, if it was created.",
+    )
+    detail: Optional[str] = pydantic.Field(
+        None,
+        title="Detail",
+        description="Why the recipe was not created, if it was not.",
+    )
+
+
+class DependencyHealthSchema(pydantic.BaseModel):
+    healthy: Optional[bool] = pydantic.Field(
+        None,
+        title="Healthy",
+        description="Whether the last probe succeeded, null if it was not probed yet.",
+    )
+    latency_ms: Optional[float] = pydantic.Field(
+        None,
+        title="Latency",
+        description="How long the last probe took, in milliseconds.",
+    )
+    checked_at: Optional[datetime.datetime] = pydantic.Field(
+        None,
+        title="Checked at",
+        description="When the last probe finished.",
+    )
+    detail: Optional[str] = pydantic.Field(
+        None,
+        title="Detail",
+        description="Why the dependency is not healthy, if it is not.",
+    )
+
+
+class HealthStatusSchema(pydantic.BaseModel):
+    status: str = pydantic.Field(
+        ...,
+        title="Status",
+        description="The state of the service: starting, ready, failed or stopping.",
+    )
+    detail: Optional[str] = pydantic.Field(
+        None,
+        title="Detail",
+        description="Why the service is not ready, if it is not.",
+    )
+    dependencies: dict[str, DependencyHealthSchema] = pydantic.Field(
+        {},
+        title="Dependencies",
+        description="The result of the last background probe per dependency.",
+    )
+
+
+class JobOutputSchema(pydantic.BaseModel):
+    id: str = pydantic.Field(
+        ...,
+        title="ID",
+        description="The identifier of the job.",
+    )
+    kind: str = pydantic.Field(
+        ...,
+        title="Kind",
+        description="The kind of job: order, combine, promo or catalog.",
+    )
+    account: str = pydantic.Field(
+        ...,
+        title="Account",
+        description="The name of the Picnic account the job uses.",
+    )
+    status: str = pydantic.Field(
+        ...,
+        title="Status",
+        description="The state of the job: queued, running, succeeded or failed.",
+    )
+    done: int = pydantic.Field(
+        ...,
+        title="Done",
+        description="The number of steps that are done.",
+    )
+    total: Optional[int] = pydantic.Field(
+        None,
+        title="Total",
+        description="The total number of steps, null until it is known.",
+    )
+    result: Optional[pydantic.Json] = pydantic.Field(
+        None,
+        title="Result",
+        description="The result of the job, once it succeeded.",
+    )
+    error: Optional[str] = pydantic.Field(
+        None,
+        title="Error",
+        description="Why the job failed, if it did.",
+    )
+    created_at: datetime.datetime = pydantic.Field(
+        ...,
+        title="Created At",
+        description="The time the job was queued.",
+    )
+    started_at: Optional[datetime.datetime] = pydantic.Field(
+        None,
+        title="Started At",
+        description="The time a worker picked up the job.",
+    )
+    finished_at: Optional[datetime.datetime] = pydantic.Field(
+        None,
+        title="Finished At",
+        description="The time the job succeeded or failed.",
+    )
+
+
+class AccountInputSchema(pydantic.BaseModel):
+    name: str = pydantic.Field(
+        ...,
+        title="Name",
+        description="The name requests select the account by.",
+        min_length=1,
+        max_length=64,
+    )
+    username: str = pydantic.Field(
+        ...,
+        title="Username",
+        description="The username to log in to Picnic with.",
+    )
+    password: str = pydantic.Field(
+        ...,
+        title="Password",
+        description="The password to log in to Picnic with.",
+    )
+    country_code: str = pydantic.Field(
+        "NL",
+        title="Country code",
+        description="The country of the account.",
+        min_length=2,
+        max_length=2,
+    )
+
+
+class AccountOutputSchema(BaseOutputModel):
+    name: str = pydantic.Field(
+        ...,
+        title="Name",
+        description="The name requests select the account by.",
+    )
+    username: str = pydantic.Field(
+        ...,
+        title="Username",
+        description="The username to log in to Picnic with.",
+    )
+    country_code: str = pydantic.Field(
+        ...,
+        title="Country code",
+        description="The country of the account.",
+    )
+
+
+class CartMutationOutputSchema(BaseOutputModel):
+    action: str = pydantic.Field(
+        ...,
+        title="Action",
+        description="Whether the product is added to or removed from the cart.",
+    )
+    product_id: str = pydantic.Field(
+        ...,
+        title="Product ID",
+        description="The id of the product in Picnic.",
+    )
+    quantity: int = pydantic.Field(
+        ...,
+        title="Quantity",
+        description="The number of products to add or remove.",
+    )
+    status: str = pydantic.Field(
+        ...,
+        title="Status",
+        description="The state of the change: pending, applied or failed.",
+    )
+    attempts: int = pydantic.Field(
+        ...,
+        title="Attempts",
+        description="The number of times applying the change failed.",
+    )
+    error: Optional[str] = pydantic.Field(
+        None,
+        title="Error",
+        description="The last error, if any.",
+    )
+    next_attempt_at: Optional[datetime.datetime] = pydantic.Field(
+        None,
+        title="Next Attempt At",
+        description="The time a failed change is retried.",
+    )
+    applied_at: Optional[datetime.datetime] = pydantic.Field(
+        None,
+        title="Applied At",
+        description="The time the change was applied to the cart.",
+    )
+
+
+class JournalBatchOutputSchema(pydantic.BaseModel):
+    id: str = pydantic.Field(
+        ...,
+        title="ID",
+        description="The identifier of the batch of changes.",
+    )
+    account: str = pydantic.Field(
+        ...,
+        title="Account",
+        description="The name of the Picnic account of the cart.",
+    )
+    status: str = pydantic.Field(
+        ...,
+        title="Status",
+        description="Pending while any change is, failed if any change failed, "
+        "applied otherwise.",
+    )
+    entries: list[CartMutationOutputSchema] = pydantic.Field(
+        ...,
+        title="Entries",
+        description="The changes to the cart, in the order they are applied.",
+    )
+
+
+class CatalogProductOutputSchema(pydantic.BaseModel):
+    id: str = pydantic.Field(
+        ...,
+        title="ID",
+        description="The id of the product in Picnic.",
+    )
+    name: str = pydantic.Field(
+        ...,
+        title="Name",
+        description="The name of the product.",
+    )
+    type: str = pydantic.Field(
+        ...,
+        title="Type",
+        description="The type of the search result, e.g. SINGLE_ARTICLE.",
+    )
+    unit_quantity: str = pydantic.Field(
+        ...,
+        title="Unit Quantity",
+        description="The size of the product.",
+    )
+    display_price: Optional[int] = pydantic.Field(
+        None,
+        title="Display Price",
+        description="The price of the product in cents.",
+    )
+    decorators: pydantic.Json[list[dict]] = pydantic.Field(
+        ...,
+        title="Decorators",
+        description="The decorators of the product, e.g. its promos.",
+    )
+    image_id: Optional[str] = pydantic.Field(
+        None,
+        title="Image ID",
+        description="The id of the image of the product.",
+    )
+    last_seen_at: datetime.datetime = pydantic.Field(
+        ...,
+        title="Last Seen At",
+        description="The time the product was last found in Picnic.",
+    )
+
+
+class CatalogSyncInputSchema(pydantic.BaseModel):
+    terms: Optional[list[str]] = pydantic.Field(
+        None,
+        title="Terms",
+        description="The search terms to refresh; the stale terms if empty.",
+    )
+
+
+class EstimateLineSchema(pydantic.BaseModel):
+    product_id: str = pydantic.Field(
+        ...,
+        title="Product ID",
+        description="The id of the product in Picnic.",
+    )
+    name: Optional[str] = pydantic.Field(
+        None,
+        title="Name",
+        description="The name of the product.",
+    )
+    quantity: int = pydantic.Field(
+        ...,
+        title="Quantity",
+        description="The number of products across all recipes.",
+    )
+    unit_price: Optional[int] = pydantic.Field(
+        None,
+        title="Unit Price",
+        description="The cached price of the product in cents, null if unknown.",
+    )
+    promo_text: Optional[str] = pydantic.Field(
+        None,
+        title="Promo Text",
+        description="The promo of the product, if any.",
+    )
+    cost: Optional[int] = pydantic.Field(
+        None,
+        title="Cost",
+        description="The cost in cents without the promo, null if the price is "
+        "unknown.",
+    )
+    discount: int = pydantic.Field(
+        0,
+        title="Discount",
+        description="The discount of the promo in cents, 0 if the promo is unknown.",
+    )
+
+
+class RecipeEstimateSchema(pydantic.BaseModel):
+    recipe_id: int = pydantic.Field(
+        ...,
+        title="Recipe ID",
+        description="The id of the recipe.",
+    )
+    name: str = pydantic.Field(
+        ...,
+        title="Name",
+        description="The name of the recipe.",
+    )
+    count: int = pydantic.Field(
+        ...,
+        title="Count",
+        description="The number of times the recipe is ordered.",
+    )
+    cost: int = pydantic.Field(
+        ...,
+        title="Cost",
+        description="The cost of the products with a known price in cents, "
+        "without promos.",
+    )
+    missing: int = pydantic.Field(
+        ...,
+        title="Missing",
+        description="The number of products without a cached price.",
+    )
+
+
+class OrderEstimateOutputSchema(pydantic.BaseModel):
+    subtotal: int = pydantic.Field(
+        ...,
+        title="Subtotal",
+        description="The cost of the products with a known price in cents, "
+        "without promos.",
+    )
+    discount: int = pydantic.Field(
+        ...,
+        title="Discount",
+        description="The estimated discount of the promos in cents.",
+    )
+    total: int = pydantic.Field(
+        ...,
+        title="Total",
+        description="The estimated cost in cents.",
+    )
+    complete: bool = pydantic.Field(
+        ...,
+        title="Complete",
+        description="Whether the price of every product is known.",
+    )
+    products: list[EstimateLineSchema] = pydantic.Field(
+        ...,
+        title="Products",
+        description="The products of all recipes together.",
+    )
+    recipes: list[RecipeEstimateSchema] = pydantic.Field(
+        ...,
+        title="Recipes",
+        description="The cost per recipe, in the order requested.",
+    )
@@ -0,0 +1,50 @@
+"""Fast serialization of response models straight to JSON bytes."""
+import functools
+from typing import Any
+
+import fastapi
+import pydantic
+
+
+class JSONBytesResponse(fastapi.Response):
+    """A response whose content is JSON that was already serialized to bytes."""
+
+    media_type = "application/json"
+
+
+@functools.lru_cache(maxsize=None)
+def get_adapter(schema: Any) -> pydantic.TypeAdapter:
+    """Cached call to the type adapter of a schema, so its validator and
+    serializer are only built once.
+
+    Args:
+        schema: The schema, e.g. schemas.RecipeOutputSchema or
+                list[schemas.RecipeOutputSchema].
+
+    Returns:
+        The type adapter.
+
+    """
+    return pydantic.TypeAdapter(schema)
+
+
+def dump_json(schema: Any, value: Any) -> bytes:
+    """Serialize a value to JSON according to a schema.
+
+    Args:
+        schema: The schema of the response, as used for response_model.
+        value: The value to serialize. ORM objects are read through their
+               attributes.
+
+    Returns:
+        The JSON, as bytes.
+
+    Notes:
+        This replaces the default path of FastAPI, which builds the models,
+        converts them to dicts, runs them through jsonable_encoder and encodes
+        them with the json module. Here pydantic-core encodes the models in a
+        single pass.
+
+    """
+    adapter = get_adapter(schema)
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
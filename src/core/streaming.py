@@ -0,0 +1,180 @@
+"""Server-sent events: streams the progress of a long-running operation to the
+client while it runs."""
+import asyncio
+import collections
+import json
+import logging
+import threading
+from typing import Any, AsyncIterator, Callable, Optional
+
+import fastapi
+from fastapi import responses
+from starlette import concurrency
+
+from src.core import config, jobs
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+# The work to stream: called with the progress callback, returns its result as
+# JSON, like the handlers of the jobs.
+Work = Callable[[jobs.ProgressCallback], Optional[bytes]]
+
+
+class EventStream:
+    """A bounded buffer of server-sent events, filled from the threadpool and
+    drained from the event loop.
+
+    Attributes:
+        dropped: The number of events that were dropped because the client did
+                 not keep up.
+
+    Notes:
+        At most SSE_BUFFER_SIZE events are buffered. When the client reads
+        slower than the events come in, the oldest events are dropped rather
+        than blocking the work, which would leave the shopping cart half done.
+        Every event carries running totals, so the newest events are enough to
+        follow the progress; the gaps in the event ids show what was dropped.
+
+    """
+
+    def __init__(self) -> None:
+        self.dropped = 0
+        self._events: collections.deque[bytes] = collections.deque(
+            maxlen=settings.SSE_BUFFER_SIZE
+        )
+        self._lock = threading.Lock()
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._count = 0
+        self._finished = False
+
+    def put(self, event: dict[str, Any]) -> None:
+        """Add an event, from any thread.
+
+        Args:
+            event: The data of the event, with its type under "event".
+
+        Returns:
+            None.
+
+        """
+        event = dict(event)
+        name = event.pop("event", "progress")
+        self._append(name, json.dumps(event, default=str).encode())
+
+    def _append(self, name: str, data: bytes) -> None:
+        with self._lock:
+            self._count += 1
+            if len(self._events) == self._events.maxlen:
+                self.dropped += 1
+            self._events.append(
+                b"id: %d\nevent: %s\ndata: %s\n\n" % (self._count, name.encode(), data)
+            )
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    def finish(self, task: "asyncio.Future[Optional[bytes]]") -> None:
+        """Add the final event, with the result or error of the work.
+
+        Args:
+            task: The finished work.
+
+        Returns:
+            None.
+
+        """
+        error = None if task.cancelled() else task.exception()
+        if task.cancelled():
+            self.put({"event": "error", "status_code": 500, "detail": "Cancelled."})
+        elif isinstance(error, fastapi.HTTPException):
+            self.put(
+                {
+                    "event": "error",
+                    "status_code": error.status_code,
+                    "detail": error.detail,
+                }
+            )
+        elif error is not None:
+            logger.error("Streamed work failed.", exc_info=error)
+            self.put(
+                {
+                    "event": "error",
+                    "status_code": 500,
+                    "detail": "Internal Server Error",
+                }
+            )
+        else:
+            self._append("done", task.result() or b"null")
+        if self.dropped:
+            logger.warning("Dropped %s events for a slow client.", self.dropped)
+        self._finished = True
+
+    async def wait(self) -> None:
+        """Wait until there is an event."""
+        await self._ready.wait()
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    async def iterate(self) -> AsyncIterator[bytes]:
+        """Yield the events until the final one, with a comment every
+        SSE_KEEPALIVE_INTERVAL seconds without events, so proxies keep the
+        connection open."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._ready.wait(), timeout=settings.SSE_KEEPALIVE_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            self._ready.clear()
+            with self._lock:
+                events = list(self._events)
+                self._events.clear()
+                finished = self._finished
+            for event in events:
+                yield event
+            if finished:
+                return
+
+
+async def stream_progress(work: Work) -> responses.StreamingResponse:
+    """Run work in the threadpool and stream its progress as server-sent events.
+
+    Args:
+        work: The work, which calls the progress callback after every step.
+
+    Returns:
+        The streaming response. Every progress event is followed by a final
+        "done" event with the result, or an "error" event with the status code
+        and detail.
+
+    Raises:
+        HTTPException: If the work raises one before its first progress event,
+                       e.g. a 404 for an unknown recipe, so it is answered with
+                       a proper status code.
+
+    Notes:
+        The work runs to the end even when the client disconnects, as does the
+        non-streaming variant. It must therefore not use the database session or
+        Picnic client of the request, which are released when the response is
+        done; see jobs.run.
+
+    """
+    stream = EventStream()
+    task = asyncio.ensure_future(concurrency.run_in_threadpool(work, stream.put))
+    task.add_done_callback(stream.finish)
+    await stream.wait()
+
+    if task.done() and stream.count == 1 and not task.cancelled():
+        error = task.exception()
+        if isinstance(error, fastapi.HTTPException):
+            raise error
+
+    return responses.StreamingResponse(
+        stream.iterate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
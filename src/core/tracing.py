@@ -0,0 +1,281 @@
+"""Lightweight tracing: spans around views, controllers, CRUD and Picnic calls,
+exported to a local file or an OTLP/HTTP collector."""
+import atexit
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from src.core import config
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 1.0
+EXPORT_TIMEOUT = 10.0
+_TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    """A timed operation within a trace.
+
+    Attributes:
+        name: The name of the operation, e.g. "crud.read".
+        trace_id: The id of the trace, 32 hex characters.
+        span_id: The id of the span, 16 hex characters.
+        parent_id: The id of the parent span, None for the root span.
+        attributes: Details of the operation, e.g. the model that is read.
+        error: The error the operation raised, if any.
+
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "attributes",
+        "error",
+        "start_time",
+        "end_time",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        attributes: dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.start_time = time.time_ns()
+        self.end_time = 0
+
+    def to_otlp(self) -> dict[str, Any]:
+        """Returns the span in the JSON encoding of OTLP."""
+        span: dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_time),
+            "endTimeUnixNano": str(self.end_time),
+            "attributes": [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in self.attributes.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+def get_trace_id() -> Optional[str]:
+    """Get the id of the current trace, None outside of a span."""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+class SpanExporter(threading.Thread):
+    """Exports finished spans in batches from a background thread, so the request
+    threads only put them on a queue.
+
+    Attributes:
+        exporter: "file" to append the spans to TRACING_FILE as JSON lines, or
+                  "otlp" to post them to TRACING_OTLP_ENDPOINT.
+
+    """
+
+    def __init__(self, exporter: str) -> None:
+        super().__init__(name="span-exporter", daemon=True)
+        if exporter not in ("file", "otlp"):
+            raise ValueError(f"Unknown tracing exporter {exporter}.")
+        self.exporter = exporter
+        self._queue: queue.SimpleQueue[Optional[Span]] = queue.SimpleQueue()
+
+    def put(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def close(self) -> None:
+        """Exports the remaining spans and stops the thread."""
+        self._queue.put(None)
+        self.join(timeout=5)
+
+    def run(self) -> None:
+        stopped = False
+        while not stopped:
+            batch: list[Span] = []
+            deadline = time.monotonic() + EXPORT_INTERVAL
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    span = self._queue.get(
+                        timeout=max(deadline - time.monotonic(), 0.001)
+                    )
+                except queue.Empty:
+                    break
+                if span is None:
+                    stopped = True
+                    break
+                batch.append(span)
+            if batch:
+                try:
+                    self._export(batch)
+                except Exception as error:
+                    logger.error("Could not export %s spans: %s", len(batch), error)
+
+    def _export(self, spans: list[Span]) -> None:
+        if self.exporter == "file":
+            with open(settings.TRACING_FILE, "a", encoding="utf-8") as trace_file:
+                for span in spans:
+                    trace_file.write(json.dumps(span.to_otlp()) + "\n")
+            return
+
+        # Only needed for this exporter, so not imported at start-up.
+        import requests
+
+        payload = {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": settings.TRACING_SERVICE_NAME},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": __name__},
+                            "spans": [span.to_otlp() for span in spans],
+                        }
+                    ],
+                }
+            ]
+        }
+        response = requests.post(
+            settings.TRACING_OTLP_ENDPOINT,
+            json=payload,
+            timeout=EXPORT_TIMEOUT,
+        )
+        response.raise_for_status()
+
+
+@functools.lru_cache(maxsize=None)
+def get_exporter() -> SpanExporter:
+    """Cached call to the span exporter, which is started on first use."""
+    exporter = SpanExporter(settings.TRACING_EXPORTER)
+    exporter.start()
+    atexit.register(exporter.close)
+    return exporter
+
+
+@contextlib.contextmanager
+def span(
+    name: str, traceparent: Optional[str] = None, **attributes: Any
+) -> Iterator[Optional[Span]]:
+    """Trace a block of code as a span, a child of the current span.
+
+    Args:
+        name: The name of the operation.
+        traceparent: A W3C traceparent header, to continue the trace of the
+                     caller. Only used for a root span.
+        attributes: Details of the operation.
+
+    Yields:
+        The span, or None when tracing is disabled.
+
+    Notes:
+        The current span is kept in a context variable, so it follows the
+        request into the threadpool and across awaits.
+
+    """
+    if not settings.TRACING_ENABLED:
+        yield None
+        return
+
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        match = _TRACEPARENT.match(traceparent or "")
+        if match is not None:
+            trace_id, parent_id = match.group(1), match.group(2)
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+
+    current = Span(name, trace_id, parent_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as error:
+        current.error = f"{type(error).__name__}: {error}"
+        raise
+    finally:
+        current.end_time = time.time_ns()
+        _current_span.reset(token)
+        get_exporter().put(current)
+
+
+def traced(name: Optional[str] = None) -> Callable[[F], F]:
+    """Decorator that traces every call of a function as a span.
+
+    Args:
+        name: The name of the span, the module and name of the function by
+              default, e.g. "recipes.controller.post_recipe".
+
+    Returns:
+        The decorator. When tracing is disabled it returns the function itself,
+        so there is no overhead at all.
+
+    """
+
+    def decorator(function: F) -> F:
+        if not settings.TRACING_ENABLED:
+            return function
+        if inspect.isgeneratorfunction(function):
+            raise TypeError("Generators can not be traced, their span would end early.")
+        span_name = name or (
+            f"{function.__module__.rsplit('.', 2)[-2]}."
+            f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"
+        )
+
+        if inspect.iscoroutinefunction(function):
+
+            @functools.wraps(function)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(span_name):
+                    return await function(*args, **kwargs)
+
+            return async_wrapper  # type: ignore
+
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(span_name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    return decorator
@@ -1,16 +1,19 @@
 """CRUD operations."""
 from __future__ import annotations
 
+import functools
 import logging
 import time
-from typing import Any, Callable, Iterable, Type, Union
+from typing import Any, Callable, Iterable, Optional
 
 import fastapi
 from fastapi import status
+import sqlalchemy
 from sqlalchemy import exc, orm
-from sqlalchemy.sql import elements, operators
+from sqlalchemy.sql import elements
 
-from src.core import config, models
+from src.core import config, models, tracing
+from src.database import search as database_search
 from src.database import session as database_session
 
 settings = config.get_settings()
@@ -36,21 +39,23 @@ def _retry_sql_alchemy_error(
         This decorator will retry the function if it raises an SQLAlchemy error.
     """
 
+    @functools.wraps(function)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
         try:
             return function(*args, **kwargs)
         except exc.SQLAlchemyError as error:
-            logger.error(f"SQLAlchemy error: {error}")
+            logger.error("SQLAlchemy error: %s", error)
             time.sleep(0.5)
             return function(*args, **kwargs)
 
     return wrapper
 
 
+@tracing.traced()
 def read_or_create(
     new_model: models.GlobalModel,
     session: orm.Session,
-    query: Iterable[elements.BinaryExpression],
+    query: Iterable[elements.ColumnElement[bool]],
 ) -> models.GlobalModel:
     """Get a model if it exists, otherwise create it.
 
@@ -76,14 +81,14 @@ def read_or_create(
         return create(new_model, session)
 
 
+@tracing.traced()
 @_retry_sql_alchemy_error
 def read(
     model: type[models.GlobalModel],
     session: orm.Session,
-    query: Iterable[
-        Union[Type[elements.BinaryExpression], Type[operators.ColumnOperators]]
-    ],
+    query: Iterable[elements.ColumnElement[bool]],
     expected_count: int | None = None,
+    options: Iterable[Any] = (),
 ) -> list[models.GlobalModel]:
     """Get a model if it exists.
 
@@ -93,6 +98,7 @@ def read(
         query: The arguments to filter by.
         expected_count: The expected number of results. If None, any number of results
                         is allowed.
+        options: Loader options, e.g. to eagerly load relationships.
 
     Returns:
         List of instances of the queried model.
@@ -103,13 +109,15 @@ def read(
         500: If the connection to the database fails.
 
     """
-    logger.info(f"Querying for {model.__name__}")
-    results = session.query(model).filter(*query).all()  # type: ignore
+    logger.info("Querying for %s", model.__name__)
+    results = session.query(model).options(*options).filter(*query).all()  # type: ignore
 
     if expected_count is None or len(results) == expected_count:
         return results
 
-    logger.error(f"Expected {expected_count} {model.__name__} but found {len(results)}")
+    logger.error(
+        "Expected %s %s but found %s", expected_count, model.__name__, len(results)
+    )
     if len(results) < expected_count:
         raise fastapi.HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -122,6 +130,7 @@ def read(
         )
 
 
+@tracing.traced()
 @_retry_sql_alchemy_error
 def create(new_model: models.GlobalModel, session: orm.Session) -> models.GlobalModel:
     """Create a model.
@@ -137,7 +146,7 @@ def create(new_model: models.GlobalModel, session: orm.Session) -> models.Global
         500 If the connection to the database fails.
 
     """
-    logger.info(f"Creating {new_model.__class__.__name__}")
+    logger.info("Creating %s", new_model.__class__.__name__)
     session.add(new_model)
     session.flush()
     session.refresh(new_model)
@@ -145,11 +154,12 @@ def create(new_model: models.GlobalModel, session: orm.Session) -> models.Global
     return new_model
 
 
+@tracing.traced()
 def update(
     params: dict,
     model: type[models.GlobalModel],
     session: orm.Session,
-    query: Iterable[elements.BinaryExpression],
+    query: Iterable[elements.ColumnElement[bool]],
 ) -> models.GlobalModel:
     """Update a model.
 
@@ -170,23 +180,24 @@ def update(
     target_model = read(model, session, query, expected_count=1)[0]
 
     if any([not hasattr(target_model, key) for key in params]):
-        logging.error("one or more parameters are not valid to update model.")
+        logger.error("one or more parameters are not valid to update model.")
         raise fastapi.HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="One or more parameters are not valid.",
         )
 
-    logger.info(f"Updating {target_model.__class__.__name__} with {params}")
+    logger.info("Updating %s with %s", target_model.__class__.__name__, params)
     for key, value in params.items():
         setattr(target_model, key, value)
     return target_model
 
 
+@tracing.traced()
 @_retry_sql_alchemy_error
 def delete(
     model: type[models.GlobalModel],
     session: orm.Session,
-    query: Iterable[elements.BinaryExpression],
+    query: Iterable[elements.ColumnElement[bool]],
 ) -> str:
     """Delete a model.
 
@@ -202,13 +213,236 @@ def delete(
         HTTPException: 500 If the connection to the database fails.
 
     """
-    logging.info(f"Deleting model:{model.__name__} ")
+    logger.info("Deleting model:%s ", model.__name__)
     target_model = read(model, session, query, expected_count=1)[0]
     session.delete(target_model)
 
     return "ok"
 
 
+@tracing.traced()
+def bulk_create(
+    model: type[models.GlobalModel], rows: list[dict], session: orm.Session
+) -> list[Any]:
+    """Create many models with a single executemany statement.
+
+    Args:
+        model: The model class.
+        rows: The column values of the models to create.
+        session: The database session.
+
+    Returns:
+        The primary keys of the created models, in the order of the rows.
+
+    """
+    if not rows:
+        return []
+    logger.info("Bulk creating %s %s", len(rows), model.__name__)
+    primary_key = sqlalchemy.inspect(model).primary_key[0]
+    statement = sqlalchemy.insert(model).returning(
+        primary_key, sort_by_parameter_order=True
+    )
+    return list(session.scalars(statement, rows))
+
+
+@tracing.traced()
+def bulk_upsert(
+    model: type[models.GlobalModel],
+    rows: list[dict],
+    session: orm.Session,
+    index_elements: list[str],
+    keep_existing: Optional[list[str]] = None,
+    increment: Optional[list[str]] = None,
+) -> None:
+    """Create many models, updating the models that already exist.
+
+    Args:
+        model: The model class.
+        rows: The column values of the models. All rows must have the same keys.
+        session: The database session.
+        index_elements: The columns that identify an existing model.
+        keep_existing: The columns whose stored value is kept when the row has
+                       None for them.
+        increment: The columns whose stored value is incremented by the value
+                   of the row, rather than replaced.
+
+    Returns:
+        None.
+
+    Raises:
+        ValueError: If the database dialect has no upsert statement.
+
+    """
+    if not rows:
+        return
+    dialect = session.get_bind().dialect.name
+    insert: Callable[..., Any]
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        logger.error("Invalid database type for upserts.")
+        raise ValueError("Invalid database type for upserts.")
+
+    logger.info("Bulk upserting %s %s", len(rows), model.__name__)
+    statement = insert(model)
+    updates = {
+        column: statement.excluded[column]
+        for column in rows[0]
+        if column not in index_elements
+    }
+    for column in keep_existing or []:
+        updates[column] = sqlalchemy.func.coalesce(
+            statement.excluded[column], model.__table__.c[column]
+        )
+    for column in increment or []:
+        updates[column] = model.__table__.c[column] + statement.excluded[column]
+    updates["updated_at"] = models.utcnow()
+    session.execute(
+        statement.on_conflict_do_update(index_elements=index_elements, set_=updates),
+        rows,
+    )
+
+
+@tracing.traced()
+def bulk_update(
+    model: type[models.GlobalModel], rows: list[dict], session: orm.Session
+) -> None:
+    """Update many models by primary key with a single executemany statement.
+
+    Args:
+        model: The model class.
+        rows: The primary key and the new column values of every model.
+        session: The database session.
+
+    Returns:
+        None.
+
+    """
+    if not rows:
+        return
+    logger.info("Bulk updating %s %s", len(rows), model.__name__)
+    session.execute(
+        sqlalchemy.update(model),
+        [dict(row, updated_at=models.utcnow()) for row in rows],
+    )
+
+
+@tracing.traced()
+def bulk_delete(
+    model: type[models.GlobalModel],
+    session: orm.Session,
+    query: Iterable[elements.ColumnElement[bool]],
+) -> int:
+    """Delete all matching models with a single statement.
+
+    Args:
+        model: The model class.
+        session: The database session.
+        query: The arguments to filter by.
+
+    Returns:
+        The number of deleted models.
+
+    """
+    logger.info("Bulk deleting %s", model.__name__)
+    result = session.execute(
+        sqlalchemy.delete(model)
+        .where(*query)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+@tracing.traced()
+@_retry_sql_alchemy_error
+def read_columns(
+    columns: Iterable[Any],
+    session: orm.Session,
+    query: Iterable[elements.ColumnElement[bool]],
+) -> list[Any]:
+    """Get only some columns of the matching rows, without loading the models.
+
+    Args:
+        columns: The columns to select.
+        session: The database session.
+        query: The arguments to filter by.
+
+    Returns:
+        The rows, whose values can be accessed as attributes named after the
+        columns.
+
+    """
+    return list(session.execute(sqlalchemy.select(*columns).where(*query)).all())
+
+
+@tracing.traced()
+@_retry_sql_alchemy_error
+def read_scalar(
+    column: Any,
+    session: orm.Session,
+    query: Iterable[elements.ColumnElement[bool]],
+) -> Any:
+    """Get a single column of the first matching row, without loading the model.
+
+    Args:
+        column: The column to select.
+        session: The database session.
+        query: The arguments to filter by.
+
+    Returns:
+        The value of the column, None if no row matches.
+
+    """
+    return session.execute(sqlalchemy.select(column).where(*query).limit(1)).scalar()
+
+
+@tracing.traced()
+def read_collection_version(name: str, session: orm.Session) -> int:
+    """Get the version of a collection.
+
+    Args:
+        name: The name of the collection.
+        session: The database session.
+
+    Returns:
+        The version of the collection, 0 if it was never written to.
+
+    """
+    version = read_scalar(
+        models.CollectionVersion.version,
+        session,
+        [models.CollectionVersion.name == name],
+    )
+    return version or 0
+
+
+@tracing.traced()
+def bump_collection_version(name: str, session: orm.Session) -> None:
+    """Increment the version of a collection. Should be called in the same
+    transaction as the write to the collection.
+
+    Args:
+        name: The name of the collection.
+        session: The database session.
+
+    Returns:
+        None.
+
+    """
+    logger.debug("Bumping version of collection %s.", name)
+    # A single upsert, so concurrent first writes to a collection do not both
+    # try to insert its row.
+    bulk_upsert(
+        models.CollectionVersion,
+        [{"name": name, "version": 1}],
+        session,
+        index_elements=["name"],
+        increment=["version"],
+    )
+
+
 def create_metadata() -> None:
     """Create the database metadata. Includes a timeout and retry delay to allow the
     database to start up after the API.
@@ -220,11 +454,13 @@ def create_metadata() -> None:
         try:
             logger.info("Creating metadata table")
             database_session.Base.metadata.create_all(bind=database_session.engine)
+            database_search.create_search_index(database_session.engine)
             return None
         except exc.OperationalError as exception_info:
             if "psycopg2.OperationalError" in exception_info.args[0]:
                 logger.info(
-                    f"Could not connect to database. Retrying in {SERVICE_CONNECTION_RETRY_DELAY} seconds..."
+                    "Could not connect to database. Retrying in %s seconds...",
+                    SERVICE_CONNECTION_RETRY_DELAY,
                 )
                 time.sleep(SERVICE_CONNECTION_RETRY_DELAY)
             else:
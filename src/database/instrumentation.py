@@ -0,0 +1,202 @@
+"""Opt-in per-request query instrumentation: query counts, N+1 detection and a
+slow-query log."""
+import collections
+import contextlib
+import contextvars
+import logging
+import os
+import threading
+import time
+import traceback
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import engine, event
+
+from src.core import config
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+# The call site of a query is the first frame in the application that is not in
+# the database layer, usually a controller.
+_DATABASE_PATH = os.path.dirname(os.path.abspath(__file__))
+_PROJECT_PATH = os.path.dirname(_DATABASE_PATH)
+
+
+class QueryBudgetExceededError(Exception):
+    """Raised when a request executed more statements than the query budget."""
+
+
+class QueryLog:
+    """The statements executed within one request or tracking block.
+
+    Attributes:
+        label: What is tracked, e.g. "GET /api/v1/recipes".
+        count: The number of statements executed.
+        statements: The number of executions per statement text. Statements that
+                    only differ in their parameters share the same text.
+        repeated: The call site of every statement that was flagged as a
+                  possible N+1 query.
+
+    """
+
+    def __init__(self, label: str) -> None:
+        self.label = label
+        self.count = 0
+        self.statements: collections.Counter[str] = collections.Counter()
+        self.repeated: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str) -> int:
+        """Counts an execution of a statement.
+
+        Returns:
+            The number of times the statement was executed so far.
+
+        """
+        with self._lock:
+            self.count += 1
+            self.statements[statement] += 1
+            return self.statements[statement]
+
+
+_current_log: contextvars.ContextVar[Optional[QueryLog]] = contextvars.ContextVar(
+    "query_log", default=None
+)
+
+
+def get_call_site() -> str:
+    """Get the first frame of the application outside of the database layer.
+
+    Returns:
+        The call site as "path:line in function", or "unknown".
+
+    """
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_PROJECT_PATH) and not filename.startswith(
+            _DATABASE_PATH
+        ):
+            return (
+                f"{os.path.relpath(filename, os.path.dirname(_PROJECT_PATH))}:"
+                f"{frame.lineno} in {frame.name}"
+            )
+    return "unknown"
+
+
+@contextlib.contextmanager
+def track_queries(label: str, budget: Optional[int] = None) -> Iterator[QueryLog]:
+    """Track the statements executed in a block, e.g. to assert a query budget in a
+    test.
+
+    Args:
+        label: What is tracked, used in the log messages.
+        budget: The maximum number of statements, no maximum when None.
+
+    Yields:
+        The query log of the block.
+
+    Raises:
+        QueryBudgetExceededError: If the block executed more statements than the
+                                  budget.
+
+    Notes:
+        Statements are only seen when the engine is instrumented, see
+        instrument_engine. Work that is handed to the threadpool inherits the
+        tracking through the context.
+
+    """
+    query_log = QueryLog(label)
+    token = _current_log.set(query_log)
+    try:
+        yield query_log
+    finally:
+        _current_log.reset(token)
+
+    logger.debug("%s executed %s statements.", label, query_log.count)
+    if budget is not None and query_log.count > budget:
+        logger.warning(
+            "%s executed %s statements, over the budget of %s.",
+            label,
+            query_log.count,
+            budget,
+        )
+        raise QueryBudgetExceededError(
+            f"{label} executed {query_log.count} statements, "
+            f"over the budget of {budget}."
+        )
+
+
+def instrument_engine(local_engine: engine.Engine) -> None:
+    """Register listeners that feed the query log of the current request, flag
+    repeated statements and log slow ones.
+
+    Args:
+        local_engine: The engine to instrument.
+
+    Returns:
+        None.
+
+    Notes:
+        A statement is flagged as a possible N+1 query once it was executed
+        QUERY_REPEAT_THRESHOLD times within one request. Its call site is only
+        looked up when a statement is flagged or slow, so the overhead of the
+        other statements is a counter update.
+
+    """
+    repeat_threshold = settings.QUERY_REPEAT_THRESHOLD
+    slow_threshold = settings.QUERY_SLOW_THRESHOLD / 1000
+
+    @event.listens_for(local_engine, "before_cursor_execute")
+    def start_timer(
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        connection.info.setdefault("instrumentation_start_times", []).append(
+            time.perf_counter()
+        )
+
+    @event.listens_for(local_engine, "after_cursor_execute")
+    def inspect_query(
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        start = connection.info["instrumentation_start_times"].pop()
+        duration = time.perf_counter() - start
+        if duration >= slow_threshold:
+            logger.warning(
+                "Slow query (%.1f ms) at %s: %s",
+                duration * 1000,
+                get_call_site(),
+                statement,
+            )
+
+        query_log = _current_log.get()
+        if query_log is None:
+            return
+        if query_log.record(statement) == repeat_threshold:
+            call_site = get_call_site()
+            query_log.repeated[statement] = call_site
+            logger.warning(
+                "Possible N+1 query in %s, executed %s times at %s: %s",
+                query_log.label,
+                repeat_threshold,
+                call_site,
+                statement,
+            )
+
+    @event.listens_for(local_engine, "handle_error")
+    def discard_timer(exception_context: Any) -> None:
+        connection = exception_context.connection
+        if connection is not None and connection.info.get(
+            "instrumentation_start_times"
+        ):
+            connection.info["instrumentation_start_times"].pop()
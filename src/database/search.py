@@ -0,0 +1,550 @@
+"""Full-text and fuzzy search over the recipes and the product catalog.
+
+The search index is a separate table, recipe_search, with one row per recipe
+holding its name, category and ingredient names. Database triggers keep it in
+sync with the recipes and ingredients tables, so every writer updates it,
+including bulk statements that bypass the ORM.
+
+On SQLite the index is an FTS5 table with the trigram tokenizer. On PostgreSQL
+it is a weighted tsvector column for full-text matching plus a pg_trgm index
+for fuzzy matching.
+
+The product catalog is searched on the names of the products: on SQLite with an
+FTS5 trigram table, catalog_search, kept in sync by triggers as well, and on
+PostgreSQL with a pg_trgm index on the name column itself.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+import fastapi
+import sqlalchemy
+from fastapi import status
+from sqlalchemy import engine, orm
+
+from src.core import config, models, tracing
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+SEARCH_TABLE = "recipe_search"
+
+_SQLITE_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE}
+    USING fts5(name, category, ingredients, tokenize='trigram')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_recipe_insert
+    AFTER INSERT ON recipes BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, name, category, ingredients)
+        VALUES (NEW.id, NEW.name, NEW.category, '');
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_recipe_update
+    AFTER UPDATE OF name, category ON recipes BEGIN
+        UPDATE {SEARCH_TABLE} SET name = NEW.name, category = NEW.category
+        WHERE rowid = NEW.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_recipe_delete
+    AFTER DELETE ON recipes BEGIN
+        DELETE FROM {SEARCH_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ingredient_insert
+    AFTER INSERT ON ingredients WHEN NEW.recipe_id IS NOT NULL BEGIN
+        UPDATE {SEARCH_TABLE} SET ingredients = (
+            SELECT group_concat(name, ' ') FROM ingredients
+            WHERE recipe_id = NEW.recipe_id
+        ) WHERE rowid = NEW.recipe_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ingredient_update
+    AFTER UPDATE OF name, recipe_id ON ingredients BEGIN
+        UPDATE {SEARCH_TABLE} SET ingredients = coalesce((
+            SELECT group_concat(name, ' ') FROM ingredients
+            WHERE recipe_id = OLD.recipe_id
+        ), '') WHERE rowid = OLD.recipe_id;
+        UPDATE {SEARCH_TABLE} SET ingredients = coalesce((
+            SELECT group_concat(name, ' ') FROM ingredients
+            WHERE recipe_id = NEW.recipe_id
+        ), '') WHERE rowid = NEW.recipe_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_ingredient_delete
+    AFTER DELETE ON ingredients WHEN OLD.recipe_id IS NOT NULL BEGIN
+        UPDATE {SEARCH_TABLE} SET ingredients = coalesce((
+            SELECT group_concat(name, ' ') FROM ingredients
+            WHERE recipe_id = OLD.recipe_id
+        ), '') WHERE rowid = OLD.recipe_id;
+    END
+    """,
+]
+
+_SQLITE_BACKFILL = f"""
+    INSERT INTO {SEARCH_TABLE} (rowid, name, category, ingredients)
+    SELECT recipes.id, recipes.name, recipes.category,
+           coalesce(group_concat(ingredients.name, ' '), '')
+    FROM recipes LEFT JOIN ingredients ON ingredients.recipe_id = recipes.id
+    GROUP BY recipes.id
+"""
+
+_POSTGRESQL_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"""
+    CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} (
+        recipe_id integer PRIMARY KEY,
+        name text NOT NULL,
+        category text NOT NULL,
+        ingredients text NOT NULL DEFAULT '',
+        document tsvector GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', name), 'A')
+            || setweight(to_tsvector('simple', category), 'B')
+            || setweight(to_tsvector('simple', ingredients), 'C')
+        ) STORED
+    )
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document
+    ON {SEARCH_TABLE} USING gin (document)
+    """,
+    f"""
+    CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_trigram
+    ON {SEARCH_TABLE} USING gin (
+        (name || ' ' || category || ' ' || ingredients) gin_trgm_ops
+    )
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_sync_recipe() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO {SEARCH_TABLE} (recipe_id, name, category)
+            VALUES (NEW.id, NEW.name, NEW.category);
+        ELSIF TG_OP = 'UPDATE' THEN
+            UPDATE {SEARCH_TABLE} SET name = NEW.name, category = NEW.category
+            WHERE recipe_id = NEW.id;
+        ELSE
+            DELETE FROM {SEARCH_TABLE} WHERE recipe_id = OLD.id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION {SEARCH_TABLE}_sync_ingredients() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'INSERT' AND OLD.recipe_id IS NOT NULL THEN
+            UPDATE {SEARCH_TABLE} SET ingredients = coalesce((
+                SELECT string_agg(name, ' ') FROM ingredients
+                WHERE recipe_id = OLD.recipe_id
+            ), '') WHERE recipe_id = OLD.recipe_id;
+        END IF;
+        IF TG_OP <> 'DELETE' AND NEW.recipe_id IS NOT NULL THEN
+            UPDATE {SEARCH_TABLE} SET ingredients = coalesce((
+                SELECT string_agg(name, ' ') FROM ingredients
+                WHERE recipe_id = NEW.recipe_id
+            ), '') WHERE recipe_id = NEW.recipe_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_recipes ON recipes",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_recipes
+    AFTER INSERT OR UPDATE OF name, category OR DELETE ON recipes
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_sync_recipe()
+    """,
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_ingredients ON ingredients",
+    f"""
+    CREATE TRIGGER {SEARCH_TABLE}_ingredients
+    AFTER INSERT OR UPDATE OF name, recipe_id OR DELETE ON ingredients
+    FOR EACH ROW EXECUTE FUNCTION {SEARCH_TABLE}_sync_ingredients()
+    """,
+]
+
+_POSTGRESQL_BACKFILL = f"""
+    INSERT INTO {SEARCH_TABLE} (recipe_id, name, category, ingredients)
+    SELECT recipes.id, recipes.name, recipes.category,
+           coalesce(string_agg(ingredients.name, ' '), '')
+    FROM recipes LEFT JOIN ingredients ON ingredients.recipe_id = recipes.id
+    GROUP BY recipes.id
+    ON CONFLICT (recipe_id) DO NOTHING
+"""
+
+_POSTGRESQL_SEARCH = f"""
+    SELECT recipe_id, name, category,
+           ts_rank(document, websearch_to_tsquery('simple', :query))
+           + word_similarity(:query, name || ' ' || category || ' ' || ingredients)
+           AS score
+    FROM {SEARCH_TABLE}
+    WHERE document @@ websearch_to_tsquery('simple', :query)
+       OR :query <% (name || ' ' || category || ' ' || ingredients)
+    ORDER BY score DESC
+    LIMIT :limit
+"""
+
+_SQLITE_SEARCH = f"""
+    SELECT rowid, name, category
+    FROM {SEARCH_TABLE}
+    WHERE {SEARCH_TABLE} MATCH :match {{short_terms}}
+    ORDER BY bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0)
+    LIMIT :limit
+"""
+
+_SQLITE_SHORT_SEARCH = f"""
+    SELECT rowid, name, category
+    FROM {SEARCH_TABLE}
+    WHERE 1 = 1 {{short_terms}}
+    ORDER BY lower(name) = lower(:query) DESC, name
+    LIMIT :limit
+"""
+
+
+CATALOG_SEARCH_TABLE = "catalog_search"
+
+_SQLITE_CATALOG_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {CATALOG_SEARCH_TABLE}
+    USING fts5(name, tokenize='trigram')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CATALOG_SEARCH_TABLE}_insert
+    AFTER INSERT ON catalog_products BEGIN
+        INSERT INTO {CATALOG_SEARCH_TABLE} (rowid, name)
+        VALUES (NEW.rowid, NEW.name);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CATALOG_SEARCH_TABLE}_update
+    AFTER UPDATE OF name ON catalog_products BEGIN
+        UPDATE {CATALOG_SEARCH_TABLE} SET name = NEW.name WHERE rowid = NEW.rowid;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {CATALOG_SEARCH_TABLE}_delete
+    AFTER DELETE ON catalog_products BEGIN
+        DELETE FROM {CATALOG_SEARCH_TABLE} WHERE rowid = OLD.rowid;
+    END
+    """,
+]
+
+_SQLITE_CATALOG_BACKFILL = f"""
+    INSERT INTO {CATALOG_SEARCH_TABLE} (rowid, name)
+    SELECT rowid, name FROM catalog_products
+"""
+
+_POSTGRESQL_CATALOG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE INDEX IF NOT EXISTS ix_catalog_products_name_trigram
+    ON catalog_products USING gin (name gin_trgm_ops)
+    """,
+]
+
+_SQLITE_CATALOG_SEARCH = f"""
+    SELECT catalog_products.id
+    FROM {CATALOG_SEARCH_TABLE}
+    JOIN catalog_products ON catalog_products.rowid = {CATALOG_SEARCH_TABLE}.rowid
+    WHERE {CATALOG_SEARCH_TABLE} MATCH :match {{short_terms}}
+    ORDER BY lower(catalog_products.name) = lower(:query) DESC,
+             bm25({CATALOG_SEARCH_TABLE})
+    LIMIT :limit
+"""
+
+_POSTGRESQL_CATALOG_SEARCH = """
+    SELECT id
+    FROM catalog_products
+    WHERE name ILIKE ALL(:patterns)
+    ORDER BY lower(name) = lower(:query) DESC, similarity(name, :query) DESC
+    LIMIT :limit
+"""
+
+
+def _create_index(
+    bind: engine.Engine, table: str, statements: list[str], backfill: Optional[str]
+) -> None:
+    is_new = not sqlalchemy.inspect(bind).has_table(table)
+    logger.info("Creating the search index %s.", table)
+    with bind.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+        if is_new and backfill is not None:
+            logger.info("Filling the search index %s.", table)
+            connection.exec_driver_sql(backfill)
+
+
+def create_search_index(bind: engine.Engine) -> None:
+    """Create the search indexes and their triggers, and fill them if they are
+    new.
+
+    Args:
+        bind: The database engine.
+
+    Returns:
+        None.
+
+    Raises:
+        ValueError: If the database dialect is not supported.
+
+    """
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        _create_index(bind, SEARCH_TABLE, _SQLITE_DDL, _SQLITE_BACKFILL)
+        _create_index(
+            bind, CATALOG_SEARCH_TABLE, _SQLITE_CATALOG_DDL, _SQLITE_CATALOG_BACKFILL
+        )
+    elif dialect == "postgresql":
+        _create_index(bind, SEARCH_TABLE, _POSTGRESQL_DDL, _POSTGRESQL_BACKFILL)
+        # The index is on catalog_products itself, so there is nothing to fill.
+        _create_index(bind, "catalog_products", _POSTGRESQL_CATALOG_DDL, None)
+    else:
+        logger.error("Invalid database type for the search index.")
+        raise ValueError("Invalid database type for the search index.")
+
+
+def _trigrams(text: str, padded: bool = False) -> set[str]:
+    """Split a text into the trigrams of its words.
+
+    Args:
+        text: The text to split.
+        padded: Whether to pad the words like pg_trgm does, so the start and the
+                end of a word weigh more in the similarity.
+
+    Returns:
+        The lowercase trigrams.
+
+    """
+    trigrams: set[str] = set()
+    for word in text.lower().split():
+        if padded:
+            word = f"  {word} "
+        trigrams.update(word[index : index + 3] for index in range(len(word) - 2))
+    return trigrams
+
+
+def similarity(left: str, right: str) -> float:
+    """The trigram similarity of two texts, between 0 and 1.
+
+    Args:
+        left: The first text.
+        right: The second text.
+
+    Returns:
+        The number of shared trigrams divided by the number of distinct trigrams.
+
+    """
+    left_trigrams = _trigrams(left, padded=True)
+    right_trigrams = _trigrams(right, padded=True)
+    if not left_trigrams or not right_trigrams:
+        return 0.0
+    return len(left_trigrams & right_trigrams) / len(left_trigrams | right_trigrams)
+
+
+def _fts5_string(term: str) -> str:
+    """Quote a term as an FTS5 string, so it is never parsed as syntax."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _search_sqlite(
+    query: str, session: orm.Session, limit: int
+) -> list[tuple[int, str, str]]:
+    """Search the FTS5 index: substring matches of all terms first, then recipes
+    sharing trigrams with the query.
+
+    The trigram index only matches terms of three or more characters; the
+    shorter terms filter the matches of the longer ones with LIKE, and a query
+    of shorter terms only is matched with LIKE alone, exact names first.
+    """
+    terms = query.split()
+    long_terms = [term for term in terms if len(term) >= 3]
+    short_terms = [term for term in terms if len(term) < 3]
+    parameters: dict[str, object] = {"query": query, "limit": limit}
+    parameters.update(
+        (f"short_{index}", f"%{_escape_like(term)}%")
+        for index, term in enumerate(short_terms)
+    )
+    short_filter = "".join(
+        f"AND (name LIKE :short_{index} ESCAPE '\\' "
+        f"OR category LIKE :short_{index} ESCAPE '\\' "
+        f"OR ingredients LIKE :short_{index} ESCAPE '\\') "
+        for index in range(len(short_terms))
+    )
+    if not long_terms:
+        statement = _SQLITE_SHORT_SEARCH.format(short_terms=short_filter)
+        rows = session.execute(sqlalchemy.text(statement), parameters).all()
+        return [tuple(row) for row in rows]  # type: ignore
+
+    full_text_match = " AND ".join(_fts5_string(term) for term in long_terms)
+    results = list(
+        session.execute(
+            sqlalchemy.text(_SQLITE_SEARCH.format(short_terms=short_filter)),
+            {**parameters, "match": full_text_match},
+        ).all()
+    )
+
+    trigrams = _trigrams(query)
+    if len(results) < limit and trigrams:
+        fuzzy_match = " OR ".join(_fts5_string(trigram) for trigram in trigrams)
+        found = {row[0] for row in results}
+        fuzzy_results = session.execute(
+            sqlalchemy.text(_SQLITE_SEARCH.format(short_terms="")),
+            {"match": fuzzy_match, "limit": limit},
+        ).all()
+        results += [row for row in fuzzy_results if row[0] not in found]
+
+    return [tuple(row) for row in results[:limit]]  # type: ignore
+
+
+@tracing.traced()
+def search_recipes(
+    query: str, session: orm.Session, limit: int
+) -> list[tuple[int, str, str]]:
+    """Search the recipes on their name, category and ingredient names.
+
+    Args:
+        query: The search terms.
+        session: The database session.
+        limit: The maximum number of results.
+
+    Returns:
+        The id, name and category of the matching recipes, most relevant first.
+
+    """
+    logger.info("Searching recipes for %r.", query)
+    if not query.strip():
+        return []
+    if session.get_bind().dialect.name == "sqlite":
+        return _search_sqlite(query, session, limit)
+
+    results = session.execute(
+        sqlalchemy.text(_POSTGRESQL_SEARCH), {"query": query, "limit": limit}
+    ).all()
+    return [(row[0], row[1], row[2]) for row in results]
+
+
+@tracing.traced()
+def resolve_recipe_name(name: str, session: orm.Session) -> Optional[int]:
+    """Find the recipe meant by a name, tolerating typos.
+
+    Args:
+        name: The name of the recipe.
+        session: The database session.
+
+    Returns:
+        The id of the recipe with exactly this name, otherwise the id of the recipe
+        whose name is most similar, provided the similarity reaches
+        SEARCH_FUZZY_THRESHOLD. None if no recipe matches.
+
+    Raises:
+        406: If multiple recipes have exactly this name.
+
+    """
+    exact_ids = (
+        session.execute(
+            sqlalchemy.select(models.Recipe.id)
+            .where(models.Recipe.name == name)
+            .limit(2)
+        )
+        .scalars()
+        .all()
+    )
+    if len(exact_ids) > 1:
+        logger.error("Found multiple recipes named %r.", name)
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Too many models match the query.",
+        )
+    if exact_ids:
+        return exact_ids[0]
+
+    candidates = [
+        (similarity(name, candidate_name), recipe_id, candidate_name)
+        for recipe_id, candidate_name, _ in search_recipes(name, session, limit=5)
+    ]
+    if not candidates:
+        return None
+    score, recipe_id, candidate_name = max(candidates)
+    if score < settings.SEARCH_FUZZY_THRESHOLD:
+        return None
+
+    logger.warning("Resolved recipe %r to %r (%.2f).", name, candidate_name, score)
+    return recipe_id
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+@tracing.traced()
+def search_catalog(query: str, session: orm.Session, limit: int) -> list[str]:
+    """Search the product catalog on the names of the products.
+
+    Args:
+        query: The search terms, which must all occur in the name.
+        session: The database session.
+        limit: The maximum number of results.
+
+    Returns:
+        The ids of the matching products, exact names first, then the most
+        relevant.
+
+    Notes:
+        The trigram index only matches terms of three or more characters; the
+        shorter terms filter the matches of the longer ones, and a query of
+        shorter terms only is matched on the name without the index.
+
+    """
+    terms = query.split()
+    if not terms:
+        return []
+    dialect = session.get_bind().dialect.name
+    long_terms = [term for term in terms if len(term) >= 3]
+    if dialect == "sqlite" and long_terms:
+        short_terms = [term for term in terms if len(term) < 3]
+        parameters = {
+            "match": " AND ".join(_fts5_string(term) for term in long_terms),
+            "query": query,
+            "limit": limit,
+        }
+        parameters.update(
+            (f"short_{index}", f"%{_escape_like(term)}%")
+            for index, term in enumerate(short_terms)
+        )
+        statement = _SQLITE_CATALOG_SEARCH.format(
+            short_terms="".join(
+                f"AND catalog_products.name LIKE :short_{index} ESCAPE '\\' "
+                for index in range(len(short_terms))
+            )
+        )
+        results = session.execute(sqlalchemy.text(statement), parameters).all()
+        return [row[0] for row in results]
+    if dialect == "postgresql":
+        results = session.execute(
+            sqlalchemy.text(_POSTGRESQL_CATALOG_SEARCH),
+            {
+                "patterns": [f"%{_escape_like(term)}%" for term in terms],
+                "query": query,
+                "limit": limit,
+            },
+        ).all()
+        return [row[0] for row in results]
+
+    name = models.CatalogProduct.name
+    return list(
+        session.scalars(
+            sqlalchemy.select(models.CatalogProduct.id)
+            .where(
+                *(name.ilike(f"%{_escape_like(term)}%", escape="\\") for term in terms)
+            )
+            .order_by((sqlalchemy.func.lower(name) == query.lower()).desc())
+            .limit(limit)
+        )
+    )
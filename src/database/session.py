@@ -1,12 +1,16 @@
 """Set up the database connection."""
 import logging
 import os
-from typing import Generator
+import time
+from typing import Any, Generator
 
+import fastapi
+from fastapi import status
 import sqlalchemy
-from sqlalchemy import engine, orm
+from sqlalchemy import event, orm
 
-from src.core import config
+from src.core import config, lifecycle, metrics
+from src.database import instrumentation
 
 settings = config.get_settings()
 SQLALCHEMY_DATABASE_TYPE = settings.SQLALCHEMY_DATABASE_TYPE
@@ -18,7 +22,103 @@ SQL_DATABASE = settings.SQL_DATABASE
 logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
 
 
-def get_engine(database_type: str) -> engine.Engine:
+def get_sqlite_pragmas() -> dict[str, Any]:
+    """Get the pragmas of the SQLite tuning profile.
+
+    Returns:
+        The pragmas to set on every new SQLite connection. Empty when tuning is
+        disabled, so the SQLite defaults are used.
+
+    Notes:
+        WAL lets readers and a writer work concurrently, and with
+        synchronous=NORMAL a commit no longer waits for a full fsync; only a
+        power loss can roll back the last transactions, never corrupt the file.
+
+    """
+    if not settings.SQLITE_TUNING:
+        return {}
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "mmap_size": settings.SQLITE_MMAP_SIZE,
+        "cache_size": settings.SQLITE_CACHE_SIZE,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+    }
+
+
+def _apply_sqlite_pragmas(
+    local_engine: sqlalchemy.Engine, pragmas: dict[str, Any]
+) -> None:
+    """Register a listener that sets the pragmas on every new SQLite connection.
+
+    Args:
+        local_engine: The SQLite engine.
+        pragmas: The pragmas to set, see get_sqlite_pragmas.
+
+    Returns:
+        None.
+
+    """
+    if not pragmas:
+        return
+
+    @event.listens_for(local_engine, "connect")
+    def set_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    logger.info("Applying SQLite pragmas: %s", pragmas)
+
+
+def _instrument_engine(local_engine: sqlalchemy.Engine) -> None:
+    """Register listeners that record the count and latency of every statement.
+
+    Args:
+        local_engine: The engine to instrument.
+
+    Returns:
+        None.
+
+    """
+
+    @event.listens_for(local_engine, "before_cursor_execute")
+    def start_timer(
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        connection.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+    @event.listens_for(local_engine, "after_cursor_execute")
+    def record_query(
+        connection: Any,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Any,
+        executemany: bool,
+    ) -> None:
+        duration = time.perf_counter() - connection.info["query_start_times"].pop()
+        operation, table = metrics.describe_statement(statement)
+        metrics.DB_QUERIES.inc(operation, table)
+        metrics.DB_QUERY_DURATION.observe(duration, operation, table)
+
+    @event.listens_for(local_engine, "handle_error")
+    def discard_timer(exception_context: Any) -> None:
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_times"):
+            connection.info["query_start_times"].pop()
+
+
+def get_engine(database_type: str) -> sqlalchemy.Engine:
     """Get the database engine.
 
     Args:
@@ -43,6 +143,7 @@ def get_engine(database_type: str) -> engine.Engine:
         local_engine = sqlalchemy.create_engine(
             url, future=True, echo=False, connect_args={"check_same_thread": False}
         )
+        _apply_sqlite_pragmas(local_engine, get_sqlite_pragmas())
     elif database_type == "postgresql":
         logger.info("Using PostgreSQL database.")
         url = (
@@ -54,10 +155,14 @@ def get_engine(database_type: str) -> engine.Engine:
     else:
         logger.error("Invalid database type.")
         raise ValueError("Invalid database type.")
+    if settings.METRICS_ENABLED:
+        _instrument_engine(local_engine)
+    if settings.QUERY_INSTRUMENTATION:
+        instrumentation.instrument_engine(local_engine)
     return local_engine
 
 
-engine = get_engine(SQLALCHEMY_DATABASE_TYPE)  # type: ignore
+engine = get_engine(SQLALCHEMY_DATABASE_TYPE)
 SessionLocal = orm.sessionmaker(  # type: ignore
     autocommit=False, autoflush=False, bind=engine, future=True
 )
@@ -70,7 +175,18 @@ def get_database() -> Generator[orm.Session, None, None]:
     Returns:
         Generator containing the database session.
 
+    Raises:
+        503: If the database is not set up within STARTUP_READY_TIMEOUT seconds,
+             e.g. because it is still starting.
+
     """
+    if not lifecycle.get_lifecycle().wait_until_ready(settings.STARTUP_READY_TIMEOUT):
+        logger.error("Database is not ready.")
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The database is not ready yet.",
+            headers={"Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)},
+        )
     db = SessionLocal()
     try:
         yield db
@@ -1,11 +1,20 @@
+import asyncio
+import contextlib
+import logging
+from typing import AsyncIterator
+
 import fastapi
 from fastapi.middleware import cors
+from starlette import concurrency
 
-from src.core import config, openapi, logging
+from src.core import config, jobs, lifecycle, middleware, openapi, recipe_index
+from src.core import logging as core_logging
 from src.database import crud as database_crud
+from src.picnic import journal
 from src.routers.dealicious import views as dealicious_views
 from src.routers.recipes import views as recipes_views
 from src.routers.orders import views as orders_views
+from src.routers.health import controller as health_controller
 from src.routers.health import views as health_views
 
 views = [
@@ -17,6 +26,7 @@ views = [
 
 settings = config.get_settings()
 ROOT_PATH = settings.ROOT_PATH
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
 
 # Set up the loggers.
 logger_settings = {
@@ -24,8 +34,112 @@ logger_settings = {
     "LOGGER_REQUESTS_NAME": settings.LOGGER_REQUESTS_NAME,
     "LOGGING_CONTROLLERS_FILE": settings.LOGGING_CONTROLLERS_FILE,
     "LOGGER_CONTROLLERS_NAME": settings.LOGGER_CONTROLLERS_NAME,
+    "LOGGER_REQUESTS_LEVEL": settings.LOGGER_REQUESTS_LEVEL,
+    "LOGGER_CONTROLLERS_LEVEL": settings.LOGGER_CONTROLLERS_LEVEL,
+    "LOGGING_FORMAT": settings.LOGGING_FORMAT,
+    "LOGGING_MAX_BYTES": settings.LOGGING_MAX_BYTES,
+    "LOGGING_BACKUP_COUNT": settings.LOGGING_BACKUP_COUNT,
+    "LOGGING_ROTATE_WHEN": settings.LOGGING_ROTATE_WHEN,
 }
-logging.setup_logging(logger_settings=logger_settings)
+
+
+def include_optional_routers(app: fastapi.FastAPI) -> None:
+    """Import and include the routers that are not needed to serve orders and
+    recipes: the jobs, the journal, the catalog, the accounts and the metrics.
+
+    Args:
+        app: The application.
+
+    Returns:
+        None.
+
+    """
+    # The lifespan runs again when the application is started again.
+    if getattr(app.state, "optional_routers_included", False):
+        return
+    from src.routers.accounts import views as accounts_views
+    from src.routers.catalog import views as catalog_views
+    from src.routers.jobs import views as jobs_views
+    from src.routers.journal import views as journal_views
+
+    for view in (jobs_views, journal_views, catalog_views, accounts_views):
+        app.include_router(view.router, prefix=ROOT_PATH)
+    if settings.METRICS_ENABLED:
+        from src.routers.metrics import views as metrics_views
+
+        # Served outside of ROOT_PATH, where scrapers look for it by default.
+        app.include_router(metrics_views.router)
+    app.state.optional_routers_included = True
+    # Built again on the next request, with the routes just included.
+    app.openapi_schema = None
+
+
+async def _start_up(app: fastapi.FastAPI, state: lifecycle.Lifecycle) -> None:
+    """Include the optional routers, create the database metadata and build the
+    recipe index in the threadpool, start the workers of the background jobs
+    and the flusher of the cart journal, and mark the application as ready once
+    done. The jobs of a previous run are picked up after.
+
+    Args:
+        app: The application.
+        state: The lifecycle of the application.
+
+    Returns:
+        None.
+
+    """
+    try:
+        await concurrency.run_in_threadpool(include_optional_routers, app)
+        await concurrency.run_in_threadpool(database_crud.create_metadata)
+    except Exception as error:
+        logger.exception("Could not set up the application.")
+        state.set_failed(str(error))
+    else:
+        try:
+            await concurrency.run_in_threadpool(recipe_index.get_recipe_index().build)
+        except Exception:
+            # It is built on the first search instead.
+            logger.exception("Could not build the recipe index.")
+        jobs.get_job_runner().start()
+        journal.get_flusher().start()
+        logger.info("Application is ready.")
+        state.set_ready()
+        try:
+            await concurrency.run_in_threadpool(jobs.get_job_runner().recover)
+        except Exception:
+            logger.exception("Could not pick up the jobs of a previous run.")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: fastapi.FastAPI) -> AsyncIterator[None]:
+    """Start up and shut down the application.
+
+    The application serves, and is live, as soon as the loggers are set up. The
+    optional routers are included and the database is set up in the
+    background, which can take up to SERVICE_TIMEOUT seconds when it is still
+    starting; the application is ready once it is done. The dependencies are
+    probed in the background for the health checks.
+
+    Args:
+        app: The application.
+
+    Yields:
+        Nothing, the application serves until the context exits.
+
+    """
+    core_logging.setup_logging(logger_settings=logger_settings)
+    state = lifecycle.get_lifecycle()
+    state.set_starting()
+    task = asyncio.create_task(_start_up(app, state))
+    health_controller.start_probing()
+    yield
+    state.set_stopping()
+    # Waits for the entry being applied, off the event loop.
+    await concurrency.run_in_threadpool(journal.get_flusher().stop)
+    jobs.get_job_runner().stop()
+    health_controller.stop_probing()
+    task.cancel()
+
 
 tag_metadata = openapi.get_openapi_tags_metadata()
 app = fastapi.FastAPI(
@@ -37,14 +151,13 @@ app = fastapi.FastAPI(
     docs_url=f"{ROOT_PATH}/docs",
     openapi_url=f"{ROOT_PATH}/openapi.json",
     debug=True,
+    lifespan=lifespan,
 )
-prefix_router = fastapi.APIRouter(prefix=ROOT_PATH)
+# Included straight into the app: FastAPI builds the routes again for every
+# router they are included in, which is a good part of the import time. The
+# optional routers are included once the application is live.
 for view in views:
-    prefix_router.include_router(view.router)
-app.include_router(prefix_router)
-
-# Set up the database
-database_crud.create_metadata()
+    app.include_router(view.router, prefix=ROOT_PATH)
 
 # CORS middleware.
 origins: list[str] = [
@@ -59,3 +172,20 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(
+    middleware.IdempotencyMiddleware,
+    prefixes=tuple(
+        f"{ROOT_PATH}{view.router.prefix}"
+        for view in (orders_views, recipes_views, dealicious_views)
+    ),
+)
+if settings.METRICS_ENABLED:
+    app.add_middleware(middleware.MetricsMiddleware)
+if settings.QUERY_INSTRUMENTATION:
+    app.add_middleware(middleware.QueryTrackingMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(middleware.ProfilingMiddleware)
+if settings.TRACING_ENABLED:
+    app.add_middleware(middleware.TracingMiddleware)
+# Added last so it runs first, and the request id is known to the others.
+app.add_middleware(middleware.RequestContextMiddleware)
@@ -0,0 +1,196 @@
+"""Serializes the changes to the shopping cart of a Picnic account, within and
+across processes, so concurrent orders and discounts do not interleave."""
+import contextlib
+import datetime
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from typing import Iterator, NoReturn, Optional
+
+import fastapi
+from fastapi import status
+import python_picnic_api
+import sqlalchemy
+from sqlalchemy import engine, exc
+
+from src.core import config, models, tracing
+from src.database import crud as database_crud
+from src.database import session as database_session
+from src.picnic import session as picnic_session
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+POLL_INTERVAL = 0.05
+
+_locks: dict[str, threading.Lock] = {}
+_locks_lock = threading.Lock()
+
+
+def _get_local_lock(account: str) -> threading.Lock:
+    with _locks_lock:
+        return _locks.setdefault(account, threading.Lock())
+
+
+def _get_advisory_key(account: str) -> int:
+    """Returns the key of the PostgreSQL advisory lock of an account, a signed
+    64-bit integer."""
+    digest = hashlib.blake2b(f"cart:{account}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _acquire_advisory_lock(
+    account: str, deadline: float
+) -> Optional[engine.Connection]:
+    """Acquire the PostgreSQL advisory lock of an account.
+
+    Returns:
+        The connection that holds the lock, or None on timeout. The lock is
+        released when the connection is closed, also when the process dies.
+
+    """
+    connection = database_session.engine.connect()
+    try:
+        while True:
+            acquired = connection.execute(
+                sqlalchemy.text("SELECT pg_try_advisory_lock(:key)"),
+                {"key": _get_advisory_key(account)},
+            ).scalar()
+            connection.commit()
+            if acquired:
+                return connection
+            if time.monotonic() >= deadline:
+                connection.close()
+                return None
+            time.sleep(POLL_INTERVAL)
+    except BaseException:
+        connection.close()
+        raise
+
+
+def _release_advisory_lock(account: str, connection: engine.Connection) -> None:
+    try:
+        connection.execute(
+            sqlalchemy.text("SELECT pg_advisory_unlock(:key)"),
+            {"key": _get_advisory_key(account)},
+        )
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def _acquire_lease(account: str, owner: str, deadline: float) -> bool:
+    """Acquire the lock of an account as a row in the cart_locks table.
+
+    Returns:
+        True if the lock is acquired, False on timeout. The lock is released
+        after CART_LOCK_LEASE seconds, in case the process dies holding it.
+
+    """
+    while True:
+        now = models.utcnow()
+        with database_session.SessionLocal() as db_session:
+            database_crud.bulk_delete(
+                models.CartLock,
+                db_session,
+                [
+                    models.CartLock.account == account,
+                    models.CartLock.expires_at < now,
+                ],
+            )
+            db_session.add(
+                models.CartLock(
+                    account=account,
+                    owner=owner,
+                    expires_at=now
+                    + datetime.timedelta(seconds=settings.CART_LOCK_LEASE),
+                )
+            )
+            try:
+                db_session.commit()
+            except exc.IntegrityError:
+                db_session.rollback()
+            else:
+                return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(POLL_INTERVAL)
+
+
+def _release_lease(account: str, owner: str) -> None:
+    with database_session.SessionLocal() as db_session:
+        database_crud.bulk_delete(
+            models.CartLock,
+            db_session,
+            [models.CartLock.account == account, models.CartLock.owner == owner],
+        )
+        db_session.commit()
+
+
+def _raise_timeout(account: str) -> NoReturn:
+    logger.error("Timed out waiting for the lock on the cart of %s.", account)
+    raise fastapi.HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="The shopping cart is being changed by another request.",
+        headers={"Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)},
+    )
+
+
+@contextlib.contextmanager
+def lock_cart(pc_session: python_picnic_api.PicnicAPI) -> Iterator[None]:
+    """Lock the shopping cart of the account of a client while changing it.
+
+    Args:
+        pc_session: The picnic session.
+
+    Yields:
+        Nothing, the cart is locked until the context exits.
+
+    Raises:
+        409: If the cart is not unlocked within CART_LOCK_TIMEOUT seconds.
+
+    Notes:
+        Only the changes to the cart are serialized: a thread lock per account
+        within the process, and a database lock across the workers. That is an
+        advisory lock on PostgreSQL, and a row in cart_locks with a lease on
+        SQLite. Reading the cart or searching products does not take the lock,
+        unless it is part of a change, like combining discounts.
+
+    """
+    account = picnic_session.get_account(pc_session)
+    deadline = time.monotonic() + settings.CART_LOCK_TIMEOUT
+    local_lock = _get_local_lock(account)
+    with tracing.span("picnic.lock_cart", account=account):
+        start = time.perf_counter()
+        if not local_lock.acquire(timeout=settings.CART_LOCK_TIMEOUT):
+            _raise_timeout(account)
+        try:
+            connection, owner = None, uuid.uuid4().hex
+            if database_session.engine.dialect.name == "postgresql":
+                connection = _acquire_advisory_lock(account, deadline)
+                acquired = connection is not None
+            else:
+                acquired = _acquire_lease(account, owner, deadline)
+            if not acquired:
+                _raise_timeout(account)
+        except BaseException:
+            local_lock.release()
+            raise
+        waited = time.perf_counter() - start
+        if waited > 1:
+            logger.info(
+                "Waited %.1f s for the lock on the cart of %s.", waited, account
+            )
+
+    try:
+        yield
+    finally:
+        try:
+            if connection is not None:
+                _release_advisory_lock(account, connection)
+            else:
+                _release_lease(account, owner)
+        finally:
+            local_lock.release()
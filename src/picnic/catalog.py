@@ -0,0 +1,238 @@
+"""A local mirror of the Picnic catalog: the products found by the search terms
+we use, so repeated searches are answered from the database rather than Picnic."""
+import datetime
+import json
+import logging
+from typing import Optional
+
+import sqlalchemy
+from sqlalchemy import orm
+import python_picnic_api
+
+from src.core import config, jobs, models, tracing
+from src.database import crud as database_crud
+from src.database import search as database_search
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+def _to_row(item: dict, now: datetime.datetime) -> dict:
+    """Convert an item of a Picnic search result to a row of catalog_products."""
+    return {
+        "id": item["id"],
+        "name": item["name"],
+        "type": item.get("type", "SINGLE_ARTICLE"),
+        "unit_quantity": item.get("unit_quantity", ""),
+        "display_price": item.get("display_price"),
+        "decorators": json.dumps(item.get("decorators", [])),
+        "image_id": item.get("image_id"),
+        "last_seen_at": now,
+    }
+
+
+def to_item(product: models.CatalogProduct) -> dict:
+    """Convert a product in the catalog to an item as Picnic returns it from a
+    search.
+
+    Args:
+        product: The product.
+
+    Returns:
+        The item, with at least its id, type, name, unit quantity and
+        decorators.
+
+    """
+    return {
+        "id": product.id,
+        "type": product.type,
+        "name": product.name,
+        "unit_quantity": product.unit_quantity,
+        "display_price": product.display_price,
+        "decorators": json.loads(product.decorators),
+        "image_id": product.image_id,
+    }
+
+
+def _is_fresh(term: str, db_session: orm.Session) -> bool:
+    cutoff = models.utcnow() - datetime.timedelta(seconds=settings.CATALOG_MAX_AGE)
+    return (
+        database_crud.read_scalar(
+            models.CatalogTerm.term,
+            db_session,
+            [models.CatalogTerm.term == term, models.CatalogTerm.synced_at >= cutoff],
+        )
+        is not None
+    )
+
+
+def search_local(query: str, db_session: orm.Session) -> list[models.CatalogProduct]:
+    """Search the products in the catalog on their names.
+
+    Args:
+        query: The search terms.
+        db_session: The database session.
+
+    Returns:
+        At most CATALOG_SEARCH_LIMIT products, exact names first.
+
+    """
+    ids = database_search.search_catalog(
+        query, db_session, settings.CATALOG_SEARCH_LIMIT
+    )
+    if not ids:
+        return []
+    products = {
+        product.id: product
+        for product in database_crud.read(
+            models.CatalogProduct,
+            db_session,
+            [models.CatalogProduct.id.in_(ids)],
+        )
+    }
+    return [products[product_id] for product_id in ids if product_id in products]
+
+
+@tracing.traced()
+def refresh(
+    term: str, pc_session: python_picnic_api.PicnicAPI, db_session: orm.Session
+) -> list[dict]:
+    """Search Picnic for a term, and store the products it finds.
+
+    Args:
+        term: The search term.
+        pc_session: The picnic session.
+        db_session: The database session, which is committed.
+
+    Returns:
+        The items Picnic found, in its order.
+
+    """
+    now = models.utcnow()
+    items = [
+        item
+        for group in pc_session.search(term)
+        for item in group.get("items", [])
+        if "id" in item and "name" in item
+    ]
+    rows = list({item["id"]: _to_row(item, now) for item in items}.values())
+    database_crud.bulk_upsert(models.CatalogProduct, rows, db_session, ["id"])
+    database_crud.bulk_upsert(
+        models.CatalogTerm,
+        [{"term": term, "synced_at": now}],
+        db_session,
+        ["term"],
+    )
+    db_session.commit()
+    logger.debug("Stored %s products for %r.", len(rows), term)
+    return items
+
+
+@tracing.traced()
+def search(
+    term: str, pc_session: python_picnic_api.PicnicAPI, db_session: orm.Session
+) -> list[dict]:
+    """Search for products, in the catalog if the term was synced within
+    CATALOG_MAX_AGE seconds and finds products there, otherwise in Picnic.
+
+    Args:
+        term: The search term.
+        pc_session: The picnic session.
+        db_session: The database session.
+
+    Returns:
+        The items found, as Picnic returns them from a search.
+
+    Notes:
+        The catalog answers with the products whose name contains every word
+        of the term, so a term that Picnic matched on something else than the
+        name finds less locally. The products of the shopping cart are searched
+        on their own names, which the catalog finds.
+
+    """
+    if _is_fresh(term, db_session):
+        products = search_local(term, db_session)
+        if products:
+            return [to_item(product) for product in products]
+    logger.debug("Searching Picnic for %r.", term)
+    return refresh(term, pc_session, db_session)
+
+
+def _get_stale_terms(db_session: orm.Session) -> list[str]:
+    """Get the terms to sync, the names of the products in recipes and the terms
+    searched before, that were not synced within CATALOG_MAX_AGE seconds. The
+    oldest come first, at most CATALOG_SYNC_BATCH."""
+    synced_at = {
+        row.term: row.synced_at
+        for row in database_crud.read_columns(
+            [models.CatalogTerm.term, models.CatalogTerm.synced_at], db_session, []
+        )
+    }
+    cutoff = (
+        models.utcnow() - datetime.timedelta(seconds=settings.CATALOG_MAX_AGE)
+    ).replace(tzinfo=None)
+    names = db_session.scalars(sqlalchemy.select(models.Product.name).distinct())
+    terms = set(names) | set(synced_at)
+    stale = [
+        term
+        for term in terms
+        if synced_at.get(term) is None or synced_at[term].replace(tzinfo=None) < cutoff
+    ]
+    stale.sort(key=lambda term: synced_at.get(term) or datetime.datetime.min)
+    return stale[: settings.CATALOG_SYNC_BATCH]
+
+
+@tracing.traced()
+def sync(
+    terms: Optional[list[str]],
+    pc_session: python_picnic_api.PicnicAPI,
+    db_session: orm.Session,
+    on_progress: Optional[jobs.ProgressCallback] = None,
+) -> dict[str, int]:
+    """Refresh the catalog from Picnic.
+
+    Args:
+        terms: The terms to refresh, or None for the stale terms.
+        pc_session: The picnic session.
+        db_session: The database session.
+        on_progress: Called with a "term" event after every term.
+
+    Returns:
+        The number of terms synced, failed, products stored and products
+        deleted.
+
+    Notes:
+        The sync is incremental: without terms only the terms that were not
+        synced within CATALOG_MAX_AGE seconds are refreshed, the oldest first.
+        Products that were not seen for CATALOG_RETENTION days are deleted.
+
+    """
+    if terms is None:
+        terms = _get_stale_terms(db_session)
+    logger.info("Syncing %s terms of the catalog.", len(terms))
+
+    summary = {"terms": 0, "failed": 0, "products": 0, "deleted": 0}
+    for done, term in enumerate(terms, start=1):
+        try:
+            summary["products"] += len(refresh(term, pc_session, db_session))
+            summary["terms"] += 1
+        except Exception as error:
+            db_session.rollback()
+            logger.warning("Could not sync %r: %s", term, error)
+            summary["failed"] += 1
+        if on_progress is not None:
+            on_progress(
+                {"event": "term", "term": term, "done": done, "total": len(terms)}
+            )
+
+    summary["deleted"] = database_crud.bulk_delete(
+        models.CatalogProduct,
+        db_session,
+        [
+            models.CatalogProduct.last_seen_at
+            < models.utcnow() - datetime.timedelta(days=settings.CATALOG_RETENTION)
+        ],
+    )
+    db_session.commit()
+    logger.info("Synced the catalog: %s", summary)
+    return summary
@@ -0,0 +1,324 @@
+"""A durable journal of changes to the shopping cart: the changes are written to
+the database first, and applied to Picnic by a background flusher, so a slow or
+failing Picnic does not leave a half-filled cart without a record of it."""
+import datetime
+import enum
+import functools
+import logging
+import threading
+import uuid
+from typing import NamedTuple, Optional
+
+import fastapi
+import sqlalchemy
+from sqlalchemy import orm
+import python_picnic_api
+
+from src.core import config, lifecycle, models, tracing
+from src.database import crud as database_crud
+from src.database import session as database_session
+from src.picnic import cart_lock
+from src.picnic import session as picnic_session
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+class Status(str, enum.Enum):
+    """The states of an entry in the journal.
+
+    PENDING: Waiting to be applied, or to be retried.
+    APPLIED: Applied to the cart in Picnic.
+    FAILED: Not applied after JOURNAL_MAX_ATTEMPTS attempts.
+
+    """
+
+    PENDING = "pending"
+    APPLIED = "applied"
+    FAILED = "failed"
+
+
+class Action(str, enum.Enum):
+    """The changes to the shopping cart."""
+
+    ADD = "add"
+    REMOVE = "remove"
+
+
+class Mutation(NamedTuple):
+    """A change to the shopping cart, before it is written to the journal."""
+
+    action: Action
+    product_id: str
+    quantity: int
+
+
+def append(mutations: list[Mutation], account: str, db_session: orm.Session) -> str:
+    """Write changes to the shopping cart to the journal, and wake up the flusher.
+
+    Args:
+        mutations: The changes, in the order they are applied.
+        account: The name of the Picnic account of the cart.
+        db_session: The database session, which is committed.
+
+    Returns:
+        The id of the batch of the entries, see read_batch.
+
+    """
+    batch = uuid.uuid4().hex
+    entries = [
+        models.CartMutation(
+            batch=batch,
+            account=account,
+            action=mutation.action,
+            product_id=mutation.product_id,
+            quantity=mutation.quantity,
+            status=Status.PENDING,
+            attempts=0,
+        )
+        for mutation in mutations
+    ]
+    db_session.add_all(entries)
+    db_session.commit()
+    logger.info("Journaled %s changes to the cart of %s.", len(entries), account)
+    get_flusher().wake()
+    return batch
+
+
+def read_batch(batch: str, db_session: orm.Session) -> list[models.CartMutation]:
+    """Read the entries of a batch.
+
+    Args:
+        batch: The id of the batch.
+        db_session: The database session.
+
+    Returns:
+        The entries, in the order they are applied.
+
+    """
+    return sorted(
+        database_crud.read(
+            models.CartMutation, db_session, [models.CartMutation.batch == batch]
+        ),
+        key=lambda entry: entry.id,
+    )
+
+
+def get_batch_status(entries: list[models.CartMutation]) -> Status:
+    """Returns the status of a batch: pending while any entry is, failed if any
+    entry failed, applied otherwise."""
+    statuses = {entry.status for entry in entries}
+    if Status.PENDING in statuses:
+        return Status.PENDING
+    if Status.FAILED in statuses:
+        return Status.FAILED
+    return Status.APPLIED
+
+
+def _apply(entry: models.CartMutation, pc_session: python_picnic_api.PicnicAPI) -> None:
+    if entry.action == Action.ADD:
+        pc_session.add_product(entry.product_id, count=entry.quantity)
+    else:
+        pc_session.remove_product(entry.product_id, count=entry.quantity)
+
+
+class Flusher:
+    """Applies the journal to Picnic from a background thread.
+
+    Notes:
+        The entries of an account are applied in the order they were written,
+        with the cart locked, so the flushers of several workers never apply
+        the same entry twice. Every entry is marked applied as soon as Picnic
+        accepted it. A crash between the two applies that entry again after the
+        restart; no entry is ever lost.
+
+        A failed entry is retried after JOURNAL_RETRY_DELAY seconds, doubled on
+        every attempt, and blocks the entries after it until then, so a remove
+        is never applied before the add it follows. After JOURNAL_MAX_ATTEMPTS
+        attempts it is marked failed, and the entries after it go ahead.
+
+    """
+
+    def __init__(self) -> None:
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        """Start flushing. Entries left pending by a previous run are applied
+        first."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="journal-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop flushing after the current entry. Pending entries stay in the
+        journal and are applied after the next start."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=settings.SERVICE_CONNECTION_TIMEOUT)
+            self._thread = None
+
+    def wake(self) -> None:
+        """Flush right away, rather than after JOURNAL_FLUSH_INTERVAL seconds."""
+        self._wake.set()
+
+    def _run(self) -> None:
+        expired_deleted = False
+        while not self._stop.is_set():
+            if lifecycle.get_lifecycle().is_ready:
+                try:
+                    if not expired_deleted:
+                        self._delete_expired()
+                        expired_deleted = True
+                    self.flush()
+                except Exception:
+                    logger.exception("Could not flush the journal.")
+            self._wake.wait(settings.JOURNAL_FLUSH_INTERVAL)
+            self._wake.clear()
+
+    def _delete_expired(self) -> None:
+        """Delete the applied and failed entries older than JOURNAL_RETENTION
+        days, once per run."""
+        with database_session.SessionLocal() as db_session:
+            deleted = database_crud.bulk_delete(
+                models.CartMutation,
+                db_session,
+                [
+                    models.CartMutation.status.in_([Status.APPLIED, Status.FAILED]),
+                    models.CartMutation.updated_at
+                    < models.utcnow()
+                    - datetime.timedelta(days=settings.JOURNAL_RETENTION),
+                ],
+            )
+            db_session.commit()
+        logger.info("Deleted %s expired journal entries.", deleted)
+
+    def flush(self) -> None:
+        """Apply the pending entries of every account.
+
+        Returns:
+            None.
+
+        """
+        with database_session.SessionLocal() as db_session:
+            accounts = list(
+                db_session.scalars(
+                    sqlalchemy.select(models.CartMutation.account)
+                    .where(models.CartMutation.status == Status.PENDING)
+                    .distinct()
+                )
+            )
+
+        for account in accounts:
+            if self._stop.is_set():
+                return
+            self._flush_account(account)
+
+    def _read_pending(
+        self, account: str, db_session: orm.Session
+    ) -> list[models.CartMutation]:
+        return list(
+            db_session.scalars(
+                sqlalchemy.select(models.CartMutation)
+                .where(
+                    models.CartMutation.account == account,
+                    models.CartMutation.status == Status.PENDING,
+                )
+                .order_by(models.CartMutation.id)
+                .limit(settings.JOURNAL_BATCH_SIZE)
+            )
+        )
+
+    def _flush_account(self, account: str) -> None:
+        with database_session.SessionLocal() as db_session:
+            entries = self._read_pending(account, db_session)
+            if not entries or not self._is_due(entries[0]):
+                return
+            try:
+                with tracing.span("journal.flush", account=account):
+                    self._apply_entries(account, db_session)
+            except Exception as error:
+                # E.g. the account can not log in, or its cart stays locked. The
+                # first entry is retried later, like when Picnic rejects it.
+                db_session.rollback()
+                entries = self._read_pending(account, db_session)
+                if entries:
+                    self._record_failure(entries[0], error, db_session)
+
+    def _apply_entries(self, account: str, db_session: orm.Session) -> None:
+        with picnic_session.get_client_pool().client(account) as pc_session:
+            with cart_lock.lock_cart(pc_session):
+                # Read again with the cart locked, as the flusher of another
+                # worker may have applied them in the meantime.
+                db_session.expire_all()
+                for entry in self._read_pending(account, db_session):
+                    if self._stop.is_set() or not self._is_due(entry):
+                        return
+                    try:
+                        _apply(entry, pc_session)
+                    except Exception as error:
+                        if not isinstance(error, fastapi.HTTPException):
+                            # The session of the client may have expired.
+                            picnic_session.get_client_pool().drop(account)
+                        if not self._record_failure(entry, error, db_session):
+                            return
+                        continue
+                    entry.status = Status.APPLIED
+                    entry.applied_at = models.utcnow()
+                    db_session.commit()
+
+    def _is_due(self, entry: models.CartMutation) -> bool:
+        next_attempt_at = entry.next_attempt_at
+        if next_attempt_at is None:
+            return True
+        if next_attempt_at.tzinfo is None:
+            # The database returns the time without its timezone, which is UTC.
+            next_attempt_at = next_attempt_at.replace(tzinfo=datetime.timezone.utc)
+        return next_attempt_at <= models.utcnow()
+
+    def _record_failure(
+        self, entry: models.CartMutation, error: Exception, db_session: orm.Session
+    ) -> bool:
+        """Record a failed attempt at an entry, and when to retry it.
+
+        Returns:
+            Whether the entry failed for good, so the entries after it can be
+            applied.
+
+        """
+        entry.attempts += 1
+        entry.error = (
+            str(error.detail)
+            if isinstance(error, fastapi.HTTPException)
+            else f"{type(error).__name__}: {error}"
+        )
+        if entry.attempts >= settings.JOURNAL_MAX_ATTEMPTS:
+            logger.error("Journal entry %s failed: %s", entry.id, entry.error)
+            entry.status = Status.FAILED
+        else:
+            logger.warning(
+                "Journal entry %s failed, attempt %s: %s",
+                entry.id,
+                entry.attempts,
+                entry.error,
+            )
+            entry.next_attempt_at = models.utcnow() + datetime.timedelta(
+                seconds=settings.JOURNAL_RETRY_DELAY * 2 ** (entry.attempts - 1)
+            )
+        db_session.commit()
+        return entry.status == Status.FAILED
+
+
+@functools.lru_cache()
+def get_flusher() -> Flusher:
+    """Cached call to the journal flusher of the service.
+
+    Returns:
+        The flusher.
+
+    """
+    return Flusher()
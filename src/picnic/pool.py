@@ -0,0 +1,186 @@
+"""A bounded pool of logged-in Picnic clients, one per account."""
+import collections
+import contextlib
+import logging
+import threading
+import time
+from typing import Callable, Iterator
+
+import fastapi
+from fastapi import status
+import python_picnic_api
+
+from src.core import config
+
+settings = config.get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+class _Entry:
+    """A logged-in client of an account, and how it is used."""
+
+    __slots__ = ("client", "semaphore", "users", "last_used")
+
+    def __init__(self, client: python_picnic_api.PicnicAPI, concurrency: int) -> None:
+        self.client = client
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.users = 0
+        self.last_used = time.monotonic()
+
+
+class ClientPool:
+    """Keeps the logged-in clients of the most recently used accounts, so a
+    request does not log in to Picnic again.
+
+    Attributes:
+        factory: Logs in to an account, and returns its client.
+        size: The maximum number of clients that are kept.
+        idle_timeout: The number of seconds after which an unused client is
+                      dropped, so its session does not expire in the pool.
+        concurrency: The maximum number of requests that use the client of an
+                     account at the same time.
+        wait_timeout: The number of seconds a request waits for the client of
+                      its account when it is at the maximum.
+
+    Notes:
+        When the pool is full, the least recently used client that is not in use
+        is dropped. Clients in use are never dropped, so the limit per account
+        holds; the pool only grows beyond its size when more accounts than that
+        are in use at the same time.
+
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], python_picnic_api.PicnicAPI],
+        size: int,
+        idle_timeout: float,
+        concurrency: int,
+        wait_timeout: float,
+    ) -> None:
+        self.factory = factory
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.concurrency = concurrency
+        self.wait_timeout = wait_timeout
+        self._entries: collections.OrderedDict[str, _Entry] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._logins: dict[str, threading.Lock] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        """Drop the idle clients, and the least recently used ones beyond the
+        size of the pool. Must be called with the lock held."""
+        now = time.monotonic()
+        for account, entry in list(self._entries.items()):
+            if entry.users == 0 and now - entry.last_used > self.idle_timeout:
+                logger.debug("Dropping the idle Picnic client of %s.", account)
+                del self._entries[account]
+        for account, entry in list(self._entries.items()):
+            if len(self._entries) <= self.size:
+                break
+            if entry.users == 0:
+                logger.debug("Dropping the Picnic client of %s.", account)
+                del self._entries[account]
+
+    def _get_entry(self, account: str) -> _Entry:
+        """Get the entry of an account, logging in if it is not in the pool. The
+        entry is counted as used, so it is not dropped while it is waited for."""
+        while True:
+            with self._lock:
+                self._evict()
+                entry = self._entries.get(account)
+                if entry is not None:
+                    self._entries.move_to_end(account)
+                    entry.users += 1
+                    return entry
+                login = self._logins.setdefault(account, threading.Lock())
+
+            # Log in outside of the lock of the pool, but only once per account;
+            # the others waiting for the login get the entry in the next round.
+            with login:
+                with self._lock:
+                    if account in self._entries:
+                        continue
+                try:
+                    entry = _Entry(self.factory(account), self.concurrency)
+                except BaseException:
+                    with self._lock:
+                        self._logins.pop(account, None)
+                    raise
+                # Stored before the login lock is dropped, so a caller that
+                # comes in between finds the entry rather than logging in again.
+                with self._lock:
+                    entry.users += 1
+                    self._entries[account] = entry
+                    self._logins.pop(account, None)
+                    self._evict()
+                return entry
+
+    @contextlib.contextmanager
+    def client(self, account: str) -> Iterator[python_picnic_api.PicnicAPI]:
+        """Use the client of an account, logging in if it is not in the pool.
+
+        Args:
+            account: The name of the account.
+
+        Yields:
+            The logged-in client.
+
+        Raises:
+            429: If the client of the account is used by too many requests for
+                 longer than the wait timeout.
+
+        Notes:
+            A client whose use raises an error other than an HTTPException is
+            dropped from the pool.
+
+        """
+        entry = self._get_entry(account)
+        try:
+            if not entry.semaphore.acquire(timeout=self.wait_timeout):
+                logger.error("Too many concurrent requests for account %s.", account)
+                raise fastapi.HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail=f"Too many concurrent requests for account {account}.",
+                    headers={
+                        "Retry-After": str(settings.SERVICE_CONNECTION_RETRY_DELAY)
+                    },
+                )
+            try:
+                yield entry.client
+            except fastapi.HTTPException:
+                raise
+            except Exception:
+                # The session of the client may have expired; log in again on
+                # the next request rather than failing every request until the
+                # client is idle.
+                self._discard(account, entry)
+                raise
+            finally:
+                entry.semaphore.release()
+        finally:
+            with self._lock:
+                entry.users -= 1
+                entry.last_used = time.monotonic()
+
+    def _discard(self, account: str, entry: _Entry) -> None:
+        with self._lock:
+            if self._entries.get(account) is entry:
+                logger.info("Dropping the failed Picnic client of %s.", account)
+                del self._entries[account]
+
+    def drop(self, account: str) -> None:
+        """Drop the client of an account, e.g. when its credentials changed.
+
+        Args:
+            account: The name of the account.
+
+        Returns:
+            None.
+
+        """
+        with self._lock:
+            self._entries.pop(account, None)
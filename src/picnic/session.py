@@ -1,36 +1,224 @@
 """Set up the Picnic connection."""
+import functools
 import logging
-from typing import Iterator
+from typing import Iterator, Optional
 
+import fastapi
+from fastapi import status
 import python_picnic_api
 
+from src.core import credentials, metrics, models, openapi, tracing
 from src.core.config import get_settings
+from src.database import crud as database_crud
+from src.database import session as database_session
+from src.picnic import pool
 
 logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
 
 
-def get_picnic_client() -> Iterator[python_picnic_api.PicnicAPI]:
-    """Get the Picnic client.
+# The attribute of a client that holds its account, see get_account.
+ACCOUNT_ATTRIBUTE = "fastnic_account"
+# The name of the account of the PICNIC_USERNAME and PICNIC_PASSWORD settings.
+DEFAULT_ACCOUNT = "default"
+PICNIC_METHODS = tuple(
+    name
+    for name, attribute in vars(python_picnic_api.PicnicAPI).items()
+    if callable(attribute) and not name.startswith("_")
+)
+
+
+def _instrument_client(client: python_picnic_api.PicnicAPI) -> None:
+    """Record the calls, errors and latency of the public methods of a client, and
+    trace them as spans.
+
+    Args:
+        client: The Picnic client.
 
     Returns:
-        The Picnic client.
+        None.
 
-    #TODO: Add a retry mechanism.
+    """
+    for name in PICNIC_METHODS:
+        method = getattr(client, name)
+        if get_settings().METRICS_ENABLED:
+            method = metrics.timed_picnic_call(name, method)
+        setattr(client, name, tracing.traced(f"picnic.{name}")(method))
+
+
+def get_account(client: python_picnic_api.PicnicAPI) -> str:
+    """Get the Picnic account a client is logged in to.
+
+    Args:
+        client: The Picnic client.
+
+    Returns:
+        The username of the account.
 
     """
+    return getattr(client, ACCOUNT_ATTRIBUTE, get_settings().PICNIC_USERNAME)
+
+
+def create_picnic_client(
+    username: Optional[str] = None,
+    password: Optional[str] = None,
+    country_code: str = "NL",
+) -> python_picnic_api.PicnicAPI:
+    """Create a Picnic client, which logs in to Picnic.
+
+    Args:
+        username: The username to log in with, PICNIC_USERNAME if None.
+        password: The password to log in with, PICNIC_PASSWORD if None.
+        country_code: The country of the account.
+
+    Returns:
+        The Picnic client.
+
+    """
+    if username is None:
+        username = get_settings().PICNIC_USERNAME
+        password = get_settings().PICNIC_PASSWORD
+    log_in = python_picnic_api.PicnicAPI
+    if get_settings().METRICS_ENABLED:
+        # Creating the client logs in to Picnic.
+        log_in = metrics.timed_picnic_call("login", log_in)
     try:
-        client = python_picnic_api.PicnicAPI(
-            username=get_settings().PICNIC_USERNAME,
-            password=get_settings().PICNIC_PASSWORD,
-            country_code="NL",
-        )
+        with tracing.span("picnic.login"):
+            client = log_in(
+                username=username,
+                password=password,
+                country_code=country_code,
+            )
     except Exception as e:
         logger.error("Error while connecting to Picnic API: %s", e)
         raise
 
+    setattr(client, ACCOUNT_ATTRIBUTE, username)
+    if get_settings().METRICS_ENABLED or get_settings().TRACING_ENABLED:
+        _instrument_client(client)
+    return client
+
+
+def _log_in(account: str) -> python_picnic_api.PicnicAPI:
+    """Log in to an account, with the credentials in the picnic_accounts table.
+
+    Args:
+        account: The name of the account.
+
+    Returns:
+        The Picnic client.
+
+    Raises:
+        404: If the account does not exist.
+        503: If the database is not ready.
+
+    """
+    if account == DEFAULT_ACCOUNT:
+        return create_picnic_client()
+
+    database = database_session.get_database()
+    db_session = next(database)
     try:
-        logger.debug("Opening Picnic API connection")
-        yield client
-    except Exception as e:
-        logger.error("Error while using Picnic API: %s", e)
-        raise
+        found = database_crud.read(
+            models.PicnicAccount,
+            db_session,
+            [models.PicnicAccount.name == account],
+        )
+        if not found:
+            logger.error("Picnic account %s not found.", account)
+            raise fastapi.HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Picnic account {account} not found.",
+            )
+        username, password, country_code = (
+            found[0].username,
+            credentials.decrypt(found[0].password),
+            found[0].country_code,
+        )
+    finally:
+        database.close()
+    return create_picnic_client(username, password, country_code)
+
+
+@functools.lru_cache()
+def get_client_pool() -> pool.ClientPool:
+    """Cached call to the pool of logged-in Picnic clients.
+
+    Returns:
+        The client pool.
+
+    """
+    settings = get_settings()
+    return pool.ClientPool(
+        factory=_log_in,
+        size=settings.PICNIC_POOL_SIZE,
+        idle_timeout=settings.PICNIC_POOL_IDLE_TIMEOUT,
+        concurrency=settings.PICNIC_ACCOUNT_CONCURRENCY,
+        wait_timeout=settings.PICNIC_ACCOUNT_WAIT_TIMEOUT,
+    )
+
+
+def get_account_name(
+    x_picnic_account: Optional[str] = fastapi.Header(
+        None, alias="X-Picnic-Account", description=openapi.Descriptions.picnic_account
+    ),
+) -> str:
+    """Get the name of the Picnic account a request selects.
+
+    Args:
+        x_picnic_account: The value of the X-Picnic-Account header.
+
+    Returns:
+        The name of the account, DEFAULT_ACCOUNT if none is selected.
+
+    """
+    return x_picnic_account or DEFAULT_ACCOUNT
+
+
+def get_picnic_client(
+    account: str = fastapi.Depends(get_account_name),
+) -> Iterator[python_picnic_api.PicnicAPI]:
+    """Get the Picnic client of the account of the request, from the pool.
+
+    Args:
+        account: The name of the account.
+
+    Returns:
+        The Picnic client.
+
+    Raises:
+        404: If the account does not exist.
+        429: If too many requests use the account at the same time.
+
+    #TODO: Add a retry mechanism.
+
+    """
+    with get_client_pool().client(account) as client:
+        try:
+            logger.debug("Opening Picnic API connection")
+            yield client
+        except Exception as e:
+            logger.error("Error while using Picnic API: %s", e)
+            raise
+
+
+def get_picnic_client_unless_background(
+    background: bool = fastapi.Query(
+        False, description=openapi.Descriptions.background
+    ),
+    account: str = fastapi.Depends(get_account_name),
+) -> Iterator[Optional[python_picnic_api.PicnicAPI]]:
+    """Get the Picnic client, unless the work is queued as a job, which gets a
+    client of its own.
+
+    Args:
+        background: Whether the work is queued as a job.
+        account: The name of the account.
+
+    Returns:
+        The Picnic client, or None if the work is queued.
+
+    """
+    if background:
+        yield None
+        return
+    yield from get_picnic_client(account)
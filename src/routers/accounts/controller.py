@@ -0,0 +1,100 @@
+""" Business logic for the accounts router. """
+import logging
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import credentials, models, schemas, tracing
+from src.core.config import get_settings
+from src.database import crud as database_crud
+from src.picnic import session as picnic_session
+
+settings = get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+@tracing.traced()
+def get_accounts(db_session: orm.Session) -> list[models.PicnicAccount]:
+    """Gets the Picnic accounts.
+
+    Args:
+        db_session: The database session.
+
+    Returns:
+        The accounts, without their passwords.
+
+    """
+    return database_crud.read(models.PicnicAccount, db_session, [])
+
+
+@tracing.traced()
+def post_account(
+    account: schemas.AccountInputSchema, db_session: orm.Session
+) -> models.PicnicAccount:
+    """Adds a Picnic account.
+
+    Args:
+        account: The account to add.
+        db_session: The database session.
+
+    Returns:
+        The added account.
+
+    Raises:
+        400: If the name is the name of the default account.
+        409: If an account with the name exists.
+        503: If PICNIC_ACCOUNTS_KEY is not set, so the password can not be
+             encrypted.
+
+    """
+    if account.name == picnic_session.DEFAULT_ACCOUNT:
+        logger.error("Picnic account %s is reserved.", account.name)
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"The name {account.name} is reserved for the default account.",
+        )
+    if database_crud.read(
+        models.PicnicAccount,
+        db_session,
+        [models.PicnicAccount.name == account.name],
+    ):
+        logger.error("Picnic account %s already exists.", account.name)
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Picnic account {account.name} already exists.",
+        )
+
+    logger.info("Adding Picnic account %s.", account.name)
+    new_account = database_crud.create(
+        models.PicnicAccount(
+            **account.model_dump(exclude={"password"}),
+            password=credentials.encrypt(account.password),
+        ),
+        db_session,
+    )
+    db_session.commit()
+    return new_account
+
+
+@tracing.traced()
+def delete_account(name: str, db_session: orm.Session) -> None:
+    """Deletes a Picnic account, and drops its client from the pool.
+
+    Args:
+        name: The name of the account.
+        db_session: The database session.
+
+    Returns:
+        None.
+
+    Raises:
+        404: If the account does not exist.
+
+    """
+    logger.info("Deleting Picnic account %s.", name)
+    database_crud.delete(
+        models.PicnicAccount, db_session, [models.PicnicAccount.name == name]
+    )
+    db_session.commit()
+    picnic_session.get_client_pool().drop(name)
@@ -0,0 +1,107 @@
+""" Contains endpoints for managing the Picnic accounts requests can select."""
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import credentials, models, openapi, schemas
+from src.database import session as database_session
+from src.routers.accounts import controller
+
+
+# The accounts hold credentials, so every route requires the admin key.
+router = fastapi.APIRouter(
+    prefix="/accounts",
+    dependencies=[fastapi.Depends(credentials.require_admin_key)],
+    responses={
+        401: {"description": "The X-Admin-Key header is missing or wrong."},
+        403: {"description": "Managing the accounts is disabled."},
+    },
+)
+
+
+@router.get(
+    "",
+    summary="Get a list of all Picnic accounts.",
+    description="This endpoint requires no input; it returns a list of the Picnic "
+    "accounts that requests can select with the X-Picnic-Account header, without "
+    "their passwords.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "A list of all Picnic accounts."},
+    },
+    response_model=list[schemas.AccountOutputSchema],
+    tags=["Accounts"],
+)
+def get_accounts(
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> list[models.PicnicAccount]:
+    """Gets the Picnic accounts.
+
+    Attributes:
+        db_session: The database session.
+
+    Returns:
+        The list of accounts.
+
+    """
+    return controller.get_accounts(db_session=db_session)
+
+
+@router.post(
+    "",
+    summary="Add a Picnic account.",
+    description="This endpoint requires a payload with the name and credentials of "
+    "a Picnic account; requests select it by passing its name in the "
+    "X-Picnic-Account header.",
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        201: {"description": "The added account."},
+        400: {"description": "The name is reserved for the default account."},
+        409: {"description": "An account with the name exists."},
+    },
+    response_model=schemas.AccountOutputSchema,
+    tags=["Accounts"],
+)
+def post_account(
+    account: schemas.AccountInputSchema = fastapi.Body(
+        ..., description=openapi.Descriptions.account_payload
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> schemas.AccountOutputSchema:
+    """Adds a Picnic account.
+
+    Attributes:
+        account: The account to add.
+        db_session: The database session.
+
+    Returns:
+        The added account.
+
+    """
+    return controller.post_account(account=account, db_session=db_session)
+
+
+@router.delete(
+    "/{name}",
+    summary="Delete a Picnic account.",
+    description="This endpoint requires the name of a Picnic account; it deletes "
+    "the account and drops its logged-in client.",
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        204: {"description": "The account was deleted."},
+        404: {"description": "The account does not exist."},
+    },
+    tags=["Accounts"],
+)
+def delete_account(
+    name: str = fastapi.Path(..., description=openapi.Descriptions.account_name),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> None:
+    """Deletes a Picnic account.
+
+    Args:
+        name: The name of the account.
+        db_session: The database session.
+    """
+    return controller.delete_account(name=name, db_session=db_session)
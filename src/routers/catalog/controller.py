@@ -0,0 +1,58 @@
+""" Business logic for the catalog router. """
+import logging
+
+from sqlalchemy import orm
+import python_picnic_api
+
+from src.core import jobs, models, serialization, tracing
+from src.core.config import get_settings
+from src.picnic import catalog
+
+logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
+
+
+@tracing.traced()
+def get_products(query: str, db_session: orm.Session) -> list[models.CatalogProduct]:
+    """Searches the local catalog, without calling Picnic.
+
+    Args:
+        query: The words that must all occur in the name of the product.
+        db_session: The database session.
+
+    Returns:
+        The matching products, exact names first.
+
+    """
+    logger.info("Searching the catalog for %r.", query)
+    return catalog.search_local(query, db_session)
+
+
+@jobs.register("catalog")
+def run_catalog_job(
+    payload: dict,
+    db_session: orm.Session,
+    pc_session: python_picnic_api.PicnicAPI,
+    on_progress: jobs.ProgressCallback,
+) -> bytes:
+    """Refreshes the catalog as a background job.
+
+    Args:
+        payload: The terms to refresh under "terms", None for the stale terms.
+        db_session: The database session.
+        pc_session: The picnic session.
+        on_progress: Called after every term.
+
+    Returns:
+        The number of terms synced and failed, and products stored and deleted,
+        as JSON.
+
+    """
+    return serialization.dump_json(
+        dict[str, int],
+        catalog.sync(
+            terms=payload.get("terms"),
+            pc_session=pc_session,
+            db_session=db_session,
+            on_progress=on_progress,
+        ),
+    )
@@ -0,0 +1,88 @@
+""" Contains endpoints for the local mirror of the Picnic catalog."""
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import models, openapi, schemas
+from src.database import session as database_session
+from src.picnic import session as picnic_session
+from src.routers.catalog import controller
+from src.routers.jobs import controller as jobs_controller
+
+
+router = fastapi.APIRouter(
+    prefix="/catalog",
+)
+
+
+@router.get(
+    "/products",
+    summary="Search the local catalog.",
+    description="This endpoint requires a query; it returns the products in the "
+    "local mirror of the Picnic catalog whose name contains every word of the "
+    "query, without calling Picnic.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "The matching products."},
+    },
+    response_model=list[schemas.CatalogProductOutputSchema],
+    tags=["Catalog"],
+)
+def get_products(
+    query: str = fastapi.Query(
+        ..., min_length=1, description=openapi.Descriptions.catalog_query
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> list[models.CatalogProduct]:
+    """Searches the local catalog.
+
+    Attributes:
+        query: The words that must all occur in the name of the product.
+        db_session: The database session.
+
+    Returns:
+        The matching products.
+
+    """
+    return controller.get_products(query=query, db_session=db_session)
+
+
+@router.post(
+    "/sync",
+    summary="Refresh the local catalog.",
+    description="This endpoint takes an optional payload with search terms; it "
+    "queues a job that searches Picnic for the terms and stores the products found. "
+    "Without terms, the terms that were not refreshed within CATALOG_MAX_AGE "
+    "seconds are refreshed: the names of the products in the recipes and the "
+    "terms searched before. The job can be followed at /jobs/{job_id}.",
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {"description": "The queued job."},
+        503: {"description": "Too many jobs are pending."},
+    },
+    response_model=schemas.JobOutputSchema,
+    tags=["Catalog"],
+)
+def post_sync(
+    sync_input: schemas.CatalogSyncInputSchema = fastapi.Body(
+        schemas.CatalogSyncInputSchema(),
+        description=openapi.Descriptions.catalog_sync_payload,
+    ),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> fastapi.Response:
+    """Queues a job that refreshes the local catalog.
+
+    Attributes:
+        sync_input: The search terms to refresh, if not the stale terms.
+        account: The name of the Picnic account to search with.
+        db_session: The database session.
+
+    Returns:
+        The queued job.
+
+    """
+    return jobs_controller.enqueue_job(
+        "catalog", sync_input.model_dump(), db_session, account
+    )
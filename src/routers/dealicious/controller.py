@@ -1,12 +1,16 @@
 """ Business logic for the dealicious router."""
 import logging
 import re
+from typing import Optional
 
 import fastapi
 from fastapi import status
+from sqlalchemy import orm
 import python_picnic_api
 
+from src.core import jobs, tracing
 from src.core.config import get_settings
+from src.picnic import cart_lock, catalog
 
 logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
 
@@ -89,13 +93,16 @@ def _return_info_discount_product(
         search_results: The search results.
 
     Returns:
-        A list with indexes and info of the products that can be combined.
+        A list with indexes and info of the products that can be combined. Both
+        are empty when the product itself is not in the search results.
     """
-    num_list = []
-    use_ful_list = []
-    equal_product_info = [
-        result for result in search_results if result["id"] == product["id"]
-    ][0]
+    num_list: list[int] = []
+    use_ful_list: list[dict] = []
+    equal_product_info = next(
+        (result for result in search_results if result["id"] == product["id"]), None
+    )
+    if equal_product_info is None:
+        return num_list, use_ful_list
     for result in search_results:
         if (
             result["type"] == "SINGLE_ARTICLE"
@@ -153,51 +160,118 @@ def _extract_integers(promo_text: str) -> int:
     return sum(int(num) for num in positive_integers_list)
 
 
-def post_combine(
-    pc_session: python_picnic_api.PicnicAPI,
-) -> None:
-    """Combines products in the shopping cart to achieve discount.
+def _search_catalog(
+    pc_session: python_picnic_api.PicnicAPI, db_session: orm.Session, product: dict
+) -> list[dict]:
+    """Searches the catalog for a product in the shopping cart by its name.
 
     Args:
         pc_session: The picnic session.
+        db_session: The database session, for the catalog.
+        product: The product in the shopping cart.
 
     Returns:
-        None
+        The search results, which include the product itself unless Picnic does
+        not find it either.
 
     """
-    logger.info("Combining discounts.")
-    shopping_cart = _get_shopping_cart_if_available(pc_session)
+    name = product["name"]
+    search_results = catalog.search(name, pc_session, db_session)
+    if not any(result["id"] == product["id"] for result in search_results):
+        # The catalog found other products by the name, but not this one yet.
+        logger.debug("%s is not in the catalog, searching Picnic.", name)
+        search_results = catalog.refresh(name, pc_session, db_session)
+    return search_results
 
-    for product in shopping_cart:
-        name = product["name"]
-        original_quantity = product["decorators"][0]["quantity"]
-        if original_quantity == 1:
-            logger.debug(f"Skipping {name} because it has a quantity of 1.")
-            continue
 
-        logger.debug(f"Combining discounts for {name}.")
-        search_results = pc_session.search(name)[0]["items"]
-        num_list, use_ful_list = _return_info_discount_product(product, search_results)
-        if not num_list:
-            logger.debug(f"No discounts found for {name}.")
-            continue
+def _combine_product(
+    pc_session: python_picnic_api.PicnicAPI, db_session: orm.Session, product: dict
+) -> str:
+    """Combines a product in the shopping cart to achieve discount.
 
-        _add_to_cart(
-            pc_session=pc_session,
-            product=product,
-            original_quantity=original_quantity,
-            num_list=num_list,
-            use_ful_list=use_ful_list,
-        )
+    Args:
+        pc_session: The picnic session.
+        db_session: The database session, for the catalog.
+        product: The product in the shopping cart.
 
+    Returns:
+        What was done: "skipped" for a single product, "unchanged" if there is no
+        discount to combine, "combined" otherwise.
 
+    """
+    name = product["name"]
+    original_quantity = product["decorators"][0]["quantity"]
+    if original_quantity == 1:
+        logger.debug("Skipping %s because it has a quantity of 1.", name)
+        return "skipped"
+
+    logger.debug("Combining discounts for %s.", name)
+    search_results = _search_catalog(pc_session, db_session, product)
+    num_list, use_ful_list = _return_info_discount_product(product, search_results)
+    if not num_list:
+        logger.debug("No discounts found for %s.", name)
+        return "unchanged"
+
+    _add_to_cart(
+        pc_session=pc_session,
+        product=product,
+        original_quantity=original_quantity,
+        num_list=num_list,
+        use_ful_list=use_ful_list,
+    )
+    return "combined"
+
+
+@tracing.traced()
+def post_combine(
+    pc_session: python_picnic_api.PicnicAPI,
+    db_session: orm.Session,
+    on_progress: Optional[jobs.ProgressCallback] = None,
+) -> None:
+    """Combines products in the shopping cart to achieve discount. The cart is
+    locked from reading it until the last change.
+
+    Args:
+        pc_session: The picnic session.
+        db_session: The database session, for the catalog.
+        on_progress: Called with a "line" event after every product in the
+                     shopping cart, with the running totals.
+
+    Returns:
+        None
+
+    """
+    logger.info("Combining discounts.")
+    with cart_lock.lock_cart(pc_session):
+        shopping_cart = _get_shopping_cart_if_available(pc_session)
+
+        combined = 0
+        for done, product in enumerate(shopping_cart, start=1):
+            action = _combine_product(pc_session, db_session, product)
+            combined += action == "combined"
+            if on_progress is not None:
+                on_progress(
+                    {
+                        "event": "line",
+                        "product": product["name"],
+                        "action": action,
+                        "combined": combined,
+                        "done": done,
+                        "total": len(shopping_cart),
+                    }
+                )
+
+
+@tracing.traced()
 def get_promo(
     pc_session: python_picnic_api.PicnicAPI,
+    db_session: orm.Session,
 ) -> list[dict]:
     """Searches for promo discount possibilities.
 
     Args:
         pc_session: The picnic session.
+        db_session: The database session, for the catalog.
 
     Returns:
         A list with all the promo possibilities.
@@ -208,9 +282,16 @@ def get_promo(
 
     promo_products = []
     for product in shopping_cart:
-        original_product = pc_session.search(product["name"])[0]["items"][0]
+        search_results = _search_catalog(pc_session, db_session, product)
+        original_product = next(
+            (result for result in search_results if result["id"] == product["id"]),
+            None,
+        )
+        if original_product is None:
+            logger.debug("%s is not found in Picnic, skipping.", product["name"])
+            continue
         if "PROMO" in str(original_product["decorators"]):
-            logger.debug(f"Found promo discount for {original_product['name']}.")
+            logger.debug("Found promo discount for %s.", original_product["name"])
             product_info = {
                 "name": product["name"],
                 "id": product["id"],
@@ -224,25 +305,84 @@ def get_promo(
     return promo_products
 
 
+@tracing.traced()
 def post_promo(
     promo_input: list[dict],
     pc_session: python_picnic_api.PicnicAPI,
+    on_progress: Optional[jobs.ProgressCallback] = None,
 ) -> None:
-    """Applies promo discount.
+    """Applies promo discount, with the cart locked.
 
     Args:
         promo_input: The promo input.
         pc_session: The picnic session.
+        on_progress: Called after every product the discount is applied to.
 
     Returns:
         None
 
     """
     logger.info("Applying promo discount.")
-    for product in promo_input:
-        logger.debug(f"Applying promo discount for {product['name']}.")
-        total_quantity = _extract_integers(product["promo_text"])
-        pc_session.add_product(
-            product["id"],
-            count=(total_quantity - product["quantity"]),
-        )
+    with cart_lock.lock_cart(pc_session):
+        for done, product in enumerate(promo_input, start=1):
+            logger.debug("Applying promo discount for %s.", product["name"])
+            total_quantity = _extract_integers(product["promo_text"])
+            pc_session.add_product(
+                product["id"],
+                count=(total_quantity - product["quantity"]),
+            )
+            if on_progress is not None:
+                on_progress(
+                    {
+                        "event": "line",
+                        "product": product["name"],
+                        "done": done,
+                        "total": len(promo_input),
+                    }
+                )
+
+
+@jobs.register("combine")
+def run_combine_job(
+    payload: dict,
+    db_session: orm.Session,
+    pc_session: python_picnic_api.PicnicAPI,
+    on_progress: jobs.ProgressCallback,
+) -> None:
+    """Combines discounts as a background job.
+
+    Args:
+        payload: Nothing, the job works on the shopping cart.
+        db_session: The database session, for the catalog.
+        pc_session: The picnic session.
+        on_progress: Called after every product in the shopping cart.
+
+    Returns:
+        None
+
+    """
+    post_combine(pc_session=pc_session, db_session=db_session, on_progress=on_progress)
+
+
+@jobs.register("promo")
+def run_promo_job(
+    payload: dict,
+    db_session: orm.Session,
+    pc_session: python_picnic_api.PicnicAPI,
+    on_progress: jobs.ProgressCallback,
+) -> None:
+    """Applies promo discounts as a background job.
+
+    Args:
+        payload: The promo input, under "products".
+        db_session: The database session, unused.
+        pc_session: The picnic session.
+        on_progress: Called after every product the discount is applied to.
+
+    Returns:
+        None
+
+    """
+    post_promo(
+        promo_input=payload["products"], pc_session=pc_session, on_progress=on_progress
+    )
@@ -1,12 +1,18 @@
 """ Contains endpoints for interacting with the dealicious controller."""
 
+import functools
+from typing import Optional
+
 import fastapi
-from fastapi import status
+from fastapi import responses, status
+from sqlalchemy import orm
 import python_picnic_api
 
-from src.core import openapi
+from src.core import jobs, openapi, schemas, streaming
+from src.database import session as database_session
 from src.picnic import session as picnic_session
 from src.routers.dealicious import controller
+from src.routers.jobs import controller as jobs_controller
 
 
 router = fastapi.APIRouter(
@@ -17,29 +23,78 @@ router = fastapi.APIRouter(
 @router.post(
     "/combine",
     summary="It will look into the shopping cart to combine discounts.",
-    description="This endpoint requires no payload; it will look into the shopping cart to combine discounts.",
+    description="This endpoint requires no payload; it will look into the shopping cart to combine discounts. "
+    "With background, the discounts are combined by a job instead, which can be followed at /jobs/{job_id}.",
     status_code=status.HTTP_204_NO_CONTENT,
     responses={
         204: {"description": "Discounts combined."},
+        202: {"description": "The queued job.", "model": schemas.JobOutputSchema},
         400: {"description": "Unavailable products in cart."},
+        503: {"description": "Too many jobs are pending."},
     },
+    response_model=None,
     tags=["Dealicious"],
 )
 def post_combine(
-    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
-        picnic_session.get_picnic_client
+    background: bool = fastapi.Query(
+        False, description=openapi.Descriptions.background
     ),
-) -> None:
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+    pc_session: Optional[python_picnic_api.PicnicAPI] = fastapi.Depends(
+        picnic_session.get_picnic_client_unless_background
+    ),
+) -> Optional[fastapi.Response]:
     """Looks into the shopping cart to combine discounts.
 
     Attributes:
-        pc_session: The Picnic API session.
+        background: Whether to combine the discounts in a job.
+        account: The name of the Picnic account.
+        db_session: The database session, to queue the job and for the catalog.
+        pc_session: The Picnic API session, None if the work is queued.
 
     Returns:
         204: Discounts combined.
+        202: The queued job.
+
+    """
+    if background:
+        return jobs_controller.enqueue_job("combine", {}, db_session, account)
+    return controller.post_combine(pc_session=pc_session, db_session=db_session)
+
+
+@router.post(
+    "/combine/stream",
+    summary="It will look into the shopping cart to combine discounts, streaming its progress.",
+    description="This endpoint requires no payload; it will look into the shopping cart to combine discounts, "
+    "and streams its progress as server-sent events: a line event for every product in the cart, with running "
+    "totals, then a done or error event.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "The progress of combining the discounts.",
+            "content": {"text/event-stream": {}},
+        },
+        400: {"description": "Unavailable products in cart."},
+    },
+    response_class=responses.StreamingResponse,
+    tags=["Dealicious"],
+)
+async def post_combine_stream(
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+) -> responses.StreamingResponse:
+    """Looks into the shopping cart to combine discounts, streaming the progress.
+
+    Attributes:
+        account: The name of the Picnic account.
+
+    Returns:
+        The stream of server-sent events.
 
     """
-    return controller.post_combine(pc_session=pc_session)
+    return await streaming.stream_progress(
+        functools.partial(jobs.run, "combine", {}, account)
+    )
 
 
 @router.get(
@@ -55,6 +110,7 @@ def post_combine(
     tags=["Dealicious"],
 )
 def get_promo(
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
     pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
         picnic_session.get_picnic_client
     ),
@@ -62,40 +118,59 @@ def get_promo(
     """Looks into the shopping cart for promo discounts.
 
     Attributes:
+        db_session: The database session, for the catalog.
         pc_session: The Picnic API session.
 
     Returns:
         A list with possibile promo discounts.
 
     """
-    return controller.get_promo(pc_session=pc_session)
+    return controller.get_promo(pc_session=pc_session, db_session=db_session)
 
 
 @router.post(
     "/promo",
     summary="It will look into the shopping cart to apply all promo discount.",
-    description="This endpoint requires no payload; it will look into the shopping cart to apply all promo discounts.",
+    description="This endpoint requires no payload; it will look into the shopping cart to apply all promo discounts. "
+    "With background, the discounts are applied by a job instead, which can be followed at /jobs/{job_id}.",
     status_code=status.HTTP_200_OK,
     responses={
         200: {"description": "Promo applied."},
+        202: {"description": "The queued job.", "model": schemas.JobOutputSchema},
+        503: {"description": "Too many jobs are pending."},
     },
+    response_model=None,
     tags=["Dealicious"],
 )
 def post_promo(
     promo_input: list[dict] = fastapi.Body(
         ..., description=openapi.Descriptions.promo_payload
     ),
-    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
-        picnic_session.get_picnic_client
+    background: bool = fastapi.Query(
+        False, description=openapi.Descriptions.background
+    ),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+    pc_session: Optional[python_picnic_api.PicnicAPI] = fastapi.Depends(
+        picnic_session.get_picnic_client_unless_background
     ),
-) -> None:
+) -> Optional[fastapi.Response]:
     """Looks into the shopping cart to combine discounts.
 
     Attributes:
-        pc_session: The Picnic API session.
+        promo_input: The promo discounts to apply.
+        background: Whether to apply the discounts in a job.
+        account: The name of the Picnic account.
+        db_session: The database session, to queue the job.
+        pc_session: The Picnic API session, None if the work is queued.
 
     Returns:
         200: Promo applied.
+        202: The queued job.
 
     """
+    if background:
+        return jobs_controller.enqueue_job(
+            "promo", {"products": promo_input}, db_session, account
+        )
     return controller.post_promo(promo_input=promo_input, pc_session=pc_session)
@@ -1,20 +1,126 @@
 """ Business logic for the health router. """
 import logging
+from typing import Optional
 
 import python_picnic_api
+import sqlalchemy
 
+from src.core import health, lifecycle, schemas, tracing
 from src.core.config import get_settings
+from src.database import session as database_session
+from src.picnic import session as picnic_session
 
 logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
 
+DATABASE = "database"
+PICNIC = "picnic"
 
-def check_picnic_connection(
-    pc_session: python_picnic_api.PicnicAPI,
-) -> bool:
-    """Check the connection to ElasticSearch.
+# The client of the Picnic probe, kept between probes so it logs in only once.
+_probe_client: Optional[python_picnic_api.PicnicAPI] = None
+
+
+def check_database() -> None:
+    """Probe the database with a cheap query through the connection pool.
+
+    Raises:
+        An SQLAlchemy error if the database does not answer.
+
+    """
+    with database_session.engine.connect() as connection:
+        connection.execute(sqlalchemy.text("SELECT 1"))
+
+
+@tracing.traced()
+def check_picnic() -> None:
+    """Probe Picnic by fetching the user with an authenticated client.
+
+    Raises:
+        An error of the Picnic client or requests if Picnic does not answer.
+
+    Notes:
+        The client is created, and so logs in, only on the first probe or after
+        a failed one.
+
+    """
+    global _probe_client
+    logger.debug("Pinging Picnic API.")
+    try:
+        if _probe_client is None:
+            _probe_client = picnic_session.create_picnic_client()
+        _probe_client.get_user()
+    except Exception:
+        _probe_client = None
+        raise
+
+
+def start_probing() -> None:
+    """Start probing the dependencies in the background, from the event loop."""
+    settings = get_settings()
+    health.get_health_prober().start(
+        {
+            DATABASE: (check_database, settings.HEALTH_DATABASE_INTERVAL),
+            PICNIC: (check_picnic, settings.HEALTH_PICNIC_INTERVAL),
+        }
+    )
+
+
+def stop_probing() -> None:
+    health.get_health_prober().stop()
+
+
+def _get_dependencies() -> dict[str, schemas.DependencyHealthSchema]:
+    return {
+        name: schemas.DependencyHealthSchema(
+            healthy=result.healthy,
+            latency_ms=None if result.latency is None else result.latency * 1000,
+            checked_at=result.checked_at,
+            detail=result.detail,
+        )
+        for name, result in health.get_health_prober().get_results().items()
+    }
+
+
+def check_picnic_connection() -> bool:
+    """Check the connection to Picnic, as of the last background probe.
+
+    Returns:
+        True if the last probe was successful, False otherwise.
+    """
+    return health.get_health_prober().get_result(PICNIC).healthy is True
+
+
+def get_liveness() -> tuple[bool, schemas.HealthStatusSchema]:
+    """Check whether the service is live, i.e. serving requests.
 
     Returns:
-        True if the connection is successful, False otherwise.
+        Whether the service is live, and its state.
+
+    """
+    state = lifecycle.get_lifecycle()
+    return state.is_live, schemas.HealthStatusSchema(status=state.state)
+
+
+def get_readiness() -> tuple[bool, schemas.HealthStatusSchema]:
+    """Check whether the service is ready, i.e. its database is set up and the last
+    probe of the database succeeded.
+
+    Returns:
+        Whether the service is ready, and its state with the result of the last
+        probe of every dependency.
+
+    Notes:
+        Picnic is reported, but does not affect the readiness. An outage at
+        Picnic would otherwise take every instance out of service, including
+        the routes that do not need Picnic.
+
     """
-    logger.info("Pinging Picnic API.")
-    return pc_session.logged_in()
+    state = lifecycle.get_lifecycle()
+    dependencies = _get_dependencies()
+    database = dependencies.get(DATABASE)
+    is_ready = state.is_ready and database is not None and database.healthy is True
+    detail = state.error
+    if state.is_ready and not is_ready:
+        detail = database.detail if database is not None else None
+    return is_ready, schemas.HealthStatusSchema(
+        status=state.state, detail=detail, dependencies=dependencies
+    )
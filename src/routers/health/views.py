@@ -1,10 +1,9 @@
 """ Contains endpoints for performing health checks of the service."""
 import fastapi
 from fastapi import status
-import python_picnic_api
 
+from src.core import schemas
 from src.routers.health import controller
-from src.picnic import session as picnic_session
 
 router = fastapi.APIRouter(prefix="/health", tags=["Health"])
 
@@ -14,11 +13,21 @@ router = fastapi.APIRouter(prefix="/health", tags=["Health"])
     status_code=status.HTTP_200_OK,
     summary="Endpoint for health checks of the service.",
     description="This endpoint can be used to check whether the service is up. "
-    "It returns an empty response.",
+    "It returns an empty response, with 503 when the service is not ready, as of "
+    "the last background probes; see /health/ready for the details.",
+    responses={
+        503: {"description": "The service is not ready."},
+    },
 )
-def health_check() -> None:
-    """Performs a service health check. Takes in nothing, returns None."""
-    pass
+async def health_check(response: fastapi.Response) -> None:
+    """Performs a service health check.
+
+    Returns:
+        None.
+    """
+    is_ready, _ = controller.get_readiness()
+    if not is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
 
 
 @router.get(
@@ -26,17 +35,60 @@ def health_check() -> None:
     status_code=status.HTTP_200_OK,
     summary="Endpoint for health checks of the connection to Picnic.",
     description="This endpoint can be used to check whether the service is connected "
-    "to Picnic. It returns a boolean.",
+    "to Picnic, as of the last background probe. It returns a boolean.",
     response_model=bool,
 )
-def picnic_check(
-    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
-        picnic_session.get_picnic_client
-    ),
-) -> bool:
+async def picnic_check() -> bool:
     """Performs a health check of the connections to Picnic.
 
     Returns:
         True if the connection is successful, False otherwise.
     """
-    return controller.check_picnic_connection(pc_session=pc_session)
+    return controller.check_picnic_connection()
+
+
+@router.get(
+    "/live",
+    status_code=status.HTTP_200_OK,
+    summary="Endpoint for liveness probes of the service.",
+    description="This endpoint can be used to check whether the service is serving "
+    "requests. It does not check the database or Picnic.",
+    responses={
+        503: {"description": "The service is shutting down."},
+    },
+    response_model=schemas.HealthStatusSchema,
+)
+async def liveness_check(response: fastapi.Response) -> schemas.HealthStatusSchema:
+    """Performs a liveness check of the service.
+
+    Returns:
+        The state of the service.
+    """
+    is_live, health = controller.get_liveness()
+    if not is_live:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return health
+
+
+@router.get(
+    "/ready",
+    status_code=status.HTTP_200_OK,
+    summary="Endpoint for readiness probes of the service.",
+    description="This endpoint can be used to check whether the service is ready to "
+    "handle requests, i.e. its database is set up and answers. It is answered from "
+    "the results of the background probes, with a detail per dependency.",
+    responses={
+        503: {"description": "The service is starting, failed to start or stopping."},
+    },
+    response_model=schemas.HealthStatusSchema,
+)
+async def readiness_check(response: fastapi.Response) -> schemas.HealthStatusSchema:
+    """Performs a readiness check of the service.
+
+    Returns:
+        The state of the service.
+    """
+    is_ready, health = controller.get_readiness()
+    if not is_ready:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    return health
@@ -0,0 +1,64 @@
+""" Business logic for the jobs router. """
+import logging
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import jobs, models, schemas, serialization, tracing
+from src.core.config import get_settings
+from src.database import crud as database_crud
+
+settings = get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+def enqueue_job(
+    kind: str, payload: dict, db_session: orm.Session, account: str
+) -> fastapi.Response:
+    """Queues a job and answers with its state.
+
+    Args:
+        kind: The kind of job.
+        payload: The input of the job.
+        db_session: The database session.
+        account: The name of the Picnic account the job uses.
+
+    Returns:
+        A 202 response with the queued job, and its URL in the Location header.
+
+    Raises:
+        503: If too many jobs are pending.
+
+    """
+    job = jobs.get_job_runner().enqueue(kind, payload, db_session, account)
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(schemas.JobOutputSchema, job),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"{settings.ROOT_PATH}/jobs/{job.id}"},
+    )
+
+
+@tracing.traced()
+def get_job(job_id: str, db_session: orm.Session) -> models.Job:
+    """Gets a job.
+
+    Args:
+        job_id: The identifier of the job.
+        db_session: The database session.
+
+    Returns:
+        The job.
+
+    Raises:
+        404: If the job does not exist.
+
+    """
+    found = database_crud.read(models.Job, db_session, [models.Job.id == job_id])
+    if not found:
+        logger.error("Job %s not found.", job_id)
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Job {job_id} not found.",
+        )
+    return found[0]
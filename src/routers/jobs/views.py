@@ -0,0 +1,44 @@
+""" Contains endpoints for following the jobs running in the background."""
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import openapi, schemas
+from src.database import session as database_session
+from src.routers.jobs import controller
+
+
+router = fastapi.APIRouter(
+    prefix="/jobs",
+)
+
+
+@router.get(
+    "/{job_id}",
+    summary="Get a job.",
+    description="This endpoint requires the id of a job; it returns the state and "
+    "progress of the job, and its result once it succeeded.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "The job."},
+        404: {"description": "The job does not exist."},
+    },
+    response_model=schemas.JobOutputSchema,
+    tags=["Jobs"],
+)
+def get_job(
+    job_id: str = fastapi.Path(..., description=openapi.Descriptions.job_id),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> schemas.JobOutputSchema:
+    """Gets a job.
+
+    Attributes:
+        job_id: The identifier of the job.
+        db_session: The database session.
+
+    Returns:
+        The job.
+
+    """
+    return controller.get_job(job_id=job_id, db_session=db_session)
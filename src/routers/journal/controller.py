@@ -0,0 +1,74 @@
+""" Business logic for the journal router. """
+import logging
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import models, schemas, serialization, tracing
+from src.core.config import get_settings
+from src.picnic import journal
+
+settings = get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+
+def _get_batch_output(
+    batch_id: str, entries: list[models.CartMutation]
+) -> schemas.JournalBatchOutputSchema:
+    return schemas.JournalBatchOutputSchema(
+        id=batch_id,
+        account=entries[0].account if entries else "",
+        status=journal.get_batch_status(entries),
+        entries=[
+            schemas.CartMutationOutputSchema.model_validate(entry, from_attributes=True)
+            for entry in entries
+        ],
+    )
+
+
+def accept_batch(batch_id: str, entries: list[models.CartMutation]) -> fastapi.Response:
+    """Answers with a batch of changes that is written to the journal.
+
+    Args:
+        batch_id: The identifier of the batch.
+        entries: The entries of the batch.
+
+    Returns:
+        A 202 response with the batch, and its URL in the Location header.
+
+    """
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(
+            schemas.JournalBatchOutputSchema, _get_batch_output(batch_id, entries)
+        ),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"{settings.ROOT_PATH}/journal/{batch_id}"},
+    )
+
+
+@tracing.traced()
+def get_batch(
+    batch_id: str, db_session: orm.Session
+) -> schemas.JournalBatchOutputSchema:
+    """Gets a batch of changes to the cart, with the state of every change.
+
+    Args:
+        batch_id: The identifier of the batch.
+        db_session: The database session.
+
+    Returns:
+        The batch.
+
+    Raises:
+        404: If the batch does not exist, or has expired.
+
+    """
+    entries = journal.read_batch(batch_id, db_session)
+    if not entries:
+        logger.error("Journal batch %s not found.", batch_id)
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Journal batch {batch_id} not found.",
+        )
+    return _get_batch_output(batch_id, entries)
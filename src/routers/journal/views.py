@@ -0,0 +1,44 @@
+""" Contains endpoints for following the changes to the cart in the journal."""
+
+import fastapi
+from fastapi import status
+from sqlalchemy import orm
+
+from src.core import openapi, schemas
+from src.database import session as database_session
+from src.routers.journal import controller
+
+
+router = fastapi.APIRouter(
+    prefix="/journal",
+)
+
+
+@router.get(
+    "/{batch_id}",
+    summary="Get a batch of changes to the cart.",
+    description="This endpoint requires the id of a batch of changes to the cart; "
+    "it returns whether every change is pending, applied to Picnic or failed.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "The batch of changes."},
+        404: {"description": "The batch does not exist."},
+    },
+    response_model=schemas.JournalBatchOutputSchema,
+    tags=["Journal"],
+)
+def get_batch(
+    batch_id: str = fastapi.Path(..., description=openapi.Descriptions.batch_id),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> schemas.JournalBatchOutputSchema:
+    """Gets a batch of changes to the cart.
+
+    Attributes:
+        batch_id: The identifier of the batch.
+        db_session: The database session.
+
+    Returns:
+        The batch, with the state of every change.
+
+    """
+    return controller.get_batch(batch_id=batch_id, db_session=db_session)
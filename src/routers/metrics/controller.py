@@ -0,0 +1,16 @@
+""" Business logic for the metrics router. """
+from src.core import metrics
+
+
+def get_metrics() -> str:
+    """Render the metrics of the application.
+
+    Returns:
+        The metrics in the Prometheus text exposition format.
+
+    Notes:
+        Must be called from the event loop, the threadpool statistics are only
+        available there.
+
+    """
+    return metrics.REGISTRY.render()
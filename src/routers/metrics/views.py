@@ -0,0 +1,27 @@
+""" Contains the endpoint that exposes the metrics of the service."""
+import fastapi
+from fastapi import responses, status
+
+from src.routers.metrics import controller
+
+router = fastapi.APIRouter(prefix="/metrics", tags=["Health"])
+
+
+@router.get(
+    "",
+    status_code=status.HTTP_200_OK,
+    summary="Endpoint for the metrics of the service.",
+    description="This endpoint exposes the request, database, Picnic, cache and "
+    "threadpool metrics in the Prometheus text format.",
+    response_class=responses.PlainTextResponse,
+)
+async def get_metrics() -> responses.PlainTextResponse:
+    """Returns the metrics of the service.
+
+    Returns:
+        The metrics, as plain text.
+
+    """
+    return responses.PlainTextResponse(
+        controller.get_metrics(), media_type="text/plain; version=0.0.4"
+    )
@@ -1,47 +1,355 @@
 """ Business logic for the orders router. """
+import collections
+import json
 import logging
+import re
+from typing import Optional
 
+import fastapi
+from fastapi import status
+import sqlalchemy
 from sqlalchemy import orm
 import python_picnic_api
 
-from src.core import models, schemas
+from src.core import jobs, models, schemas, serialization, tracing
 from src.core.config import get_settings
 from src.database import crud as database_crud
+from src.database import search as database_search
+from src.picnic import cart_lock, journal
 
 logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
 
 
+@tracing.traced()
+def _get_recipes_by_name(
+    recipe_names: list[str], db_session: orm.Session
+) -> list[models.Recipe]:
+    """Gets recipes by their names through the search index, tolerating typos.
+
+    Args:
+        recipe_names: The names of the recipes.
+        db_session: The database session.
+
+    Returns:
+        The recipes in the order of the names, with their ingredients loaded.
+
+    Raises:
+        404: If no recipe matches one of the names.
+
+    Notes:
+        The names are resolved one by one, but the recipes and their ingredients
+        are loaded in two queries in total rather than two per recipe.
+
+    """
+    recipe_ids = []
+    for recipe_name in recipe_names:
+        recipe_id = database_search.resolve_recipe_name(recipe_name, db_session)
+        if recipe_id is None:
+            logger.error("Recipe %s not found.", recipe_name)
+            raise fastapi.HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Recipe {recipe_name} not found.",
+            )
+        recipe_ids.append(recipe_id)
+
+    unique_ids = set(recipe_ids)
+    recipes = database_crud.read(
+        models.Recipe,
+        db_session,
+        [
+            models.Recipe.id.in_(unique_ids),
+        ],
+        expected_count=len(unique_ids),
+        options=[orm.selectinload(models.Recipe.ingredients)],
+    )
+    recipes_by_id = {recipe.id: recipe for recipe in recipes}
+    return [recipes_by_id[recipe_id] for recipe_id in recipe_ids]
+
+
+@tracing.traced()
 def post_order(
     order: schemas.OrderInputSchema,
     db_session: orm.Session,
     pc_session: python_picnic_api.PicnicAPI,
-) -> list[schemas.IngredientOutputSchema]:
-    """Creates an order.
+    on_progress: Optional[jobs.ProgressCallback] = None,
+) -> list[models.Ingredient]:
+    """Creates an order. The cart is locked while the products are added.
 
     Args:
         order: The order to create.
         db_session: The database session.
         pc_session: The picnic session.
+        on_progress: Called with an "ingredient" event after every ingredient that
+                     is added to the cart, and a "recipe" event after every
+                     recipe, with the running totals.
 
     Returns:
         The list of ingredients in the order.
 
     """
     logger.debug("Creating order.")
-    shopping_cart = []
-    for recipe_name in order.recipes:
-        recipe = database_crud.read(
-            models.Recipe,
-            db_session,
-            [
-                models.Recipe.name == recipe_name,
-            ],
-            expected_count=1,
-        )[0]
-        logger.debug(f"Adding recipe {recipe.name} to order.")
-        for ingredient in recipe.ingredients:
-            shopping_cart.append(ingredient)
-            pc_session.add_product(ingredient.product.id, count=ingredient.quantity)
+    shopping_cart: list[models.Ingredient] = []
+    recipes = _get_recipes_by_name(order.recipes, db_session)
+    total = sum(len(recipe.ingredients) for recipe in recipes)
+    products_added = 0
+    with cart_lock.lock_cart(pc_session):
+        for recipes_done, recipe in enumerate(recipes, start=1):
+            logger.debug("Adding recipe %s to order.", recipe.name)
+            for ingredient in recipe.ingredients:
+                shopping_cart.append(ingredient)
+                pc_session.add_product(ingredient.product_id, count=ingredient.quantity)
+                products_added += ingredient.quantity
+                if on_progress is not None:
+                    on_progress(
+                        {
+                            "event": "ingredient",
+                            "recipe": recipe.name,
+                            "product_id": ingredient.product_id,
+                            "quantity": ingredient.quantity,
+                            "products_added": products_added,
+                            "done": len(shopping_cart),
+                            "total": total,
+                        }
+                    )
+            if on_progress is not None:
+                on_progress(
+                    {
+                        "event": "recipe",
+                        "recipe": recipe.name,
+                        "recipes_done": recipes_done,
+                        "recipes_total": len(recipes),
+                        "products_added": products_added,
+                        "done": len(shopping_cart),
+                        "total": total,
+                    }
+                )
 
     logger.info("Order created.")
     return shopping_cart
+
+
+@tracing.traced()
+def post_order_deferred(
+    order: schemas.OrderInputSchema, db_session: orm.Session, account: str
+) -> tuple[str, list[models.CartMutation]]:
+    """Writes the products of an order to the journal, from which they are added
+    to the cart in the background.
+
+    Args:
+        order: The order to create.
+        db_session: The database session.
+        account: The name of the Picnic account of the cart.
+
+    Returns:
+        The id of the batch in the journal, and its entries.
+
+    Notes:
+        Picnic is not called: the order is accepted once the journal is
+        written, so a slow or failing Picnic delays the cart rather than
+        leaving it half-filled.
+
+    """
+    recipes = _get_recipes_by_name(order.recipes, db_session)
+    mutations = []
+    for recipe in recipes:
+        for ingredient in recipe.ingredients:
+            if ingredient.product_id is None:
+                logger.warning(
+                    "Ingredient %s of recipe %s has no product.",
+                    ingredient.name,
+                    recipe.name,
+                )
+                continue
+            mutations.append(
+                journal.Mutation(
+                    journal.Action.ADD, ingredient.product_id, ingredient.quantity
+                )
+            )
+
+    batch_id = journal.append(mutations, account, db_session)
+    logger.info("Order journaled as batch %s.", batch_id)
+    return batch_id, journal.read_batch(batch_id, db_session)
+
+
+def _get_promo_text(decorators: Optional[str]) -> Optional[str]:
+    """Returns the text of the PROMO decorator of a product, if any."""
+    for decorator in json.loads(decorators or "[]"):
+        if decorator.get("type") == "PROMO":
+            return decorator.get("text")
+    return None
+
+
+def _get_discount(quantity: int, unit_price: int, promo_text: Optional[str]) -> int:
+    """Estimate the discount of a promo on a quantity of a product.
+
+    Args:
+        quantity: The number of products.
+        unit_price: The price of one product in cents.
+        promo_text: The text of the promo, e.g. "1 + 1 gratis", "2e halve prijs",
+                    "25% korting" or "2 voor 3,50".
+
+    Returns:
+        The discount in cents; 0 for promos that are not recognised.
+
+    """
+    if not promo_text:
+        return 0
+    text = promo_text.lower()
+    if match := re.search(r"(\d+)\s*\+\s*(\d+)\s*gratis", text):
+        paid, free = int(match[1]), int(match[2])
+        return quantity // (paid + free) * free * unit_price
+    if match := re.search(r"(\d+)e\s+halve\s+prijs", text):
+        return quantity // int(match[1]) * unit_price // 2
+    if match := re.search(r"(\d+)\s*%\s*korting", text):
+        return quantity * unit_price * int(match[1]) // 100
+    if match := re.search(r"(\d+)\s+voor\s+€?\s*(\d+(?:[.,]\d{1,2})?)", text):
+        count = int(match[1])
+        price = round(float(match[2].replace(",", ".")) * 100)
+        return max(quantity // count * (count * unit_price - price), 0)
+    return 0
+
+
+@tracing.traced()
+def post_estimate(
+    order: schemas.OrderInputSchema, db_session: orm.Session
+) -> schemas.OrderEstimateOutputSchema:
+    """Estimates the cost of an order from the cached prices, without calling
+    Picnic.
+
+    Args:
+        order: The order to estimate.
+        db_session: The database session.
+
+    Returns:
+        The totals, the cost per product and the cost per recipe.
+
+    Notes:
+        The quantities are summed per recipe and product in a single grouped
+        query, joined with the prices and promos in the catalog; only the
+        multiplication by the number of times a recipe is ordered is done here.
+        Promos apply to the quantity of a product across all recipes, so the
+        cost per recipe is without promos. Products that are not in the catalog
+        have no price, and are left out of the totals.
+
+    """
+    recipe_ids = [
+        recipe.id for recipe in _get_recipes_by_name(order.recipes, db_session)
+    ]
+    counts = collections.Counter(recipe_ids)
+    rows = db_session.execute(
+        sqlalchemy.select(
+            models.Ingredient.recipe_id,
+            models.Ingredient.product_id,
+            sqlalchemy.func.sum(models.Ingredient.quantity).label("quantity"),
+            sqlalchemy.func.coalesce(
+                models.CatalogProduct.name, models.Product.name
+            ).label("name"),
+            models.CatalogProduct.display_price,
+            models.CatalogProduct.decorators,
+        )
+        .outerjoin(
+            models.CatalogProduct,
+            models.CatalogProduct.id == models.Ingredient.product_id,
+        )
+        .outerjoin(models.Product, models.Product.id == models.Ingredient.product_id)
+        .where(
+            models.Ingredient.recipe_id.in_(counts),
+            models.Ingredient.product_id.is_not(None),
+        )
+        .group_by(
+            models.Ingredient.recipe_id,
+            models.Ingredient.product_id,
+            models.CatalogProduct.name,
+            models.Product.name,
+            models.CatalogProduct.display_price,
+            models.CatalogProduct.decorators,
+        )
+    ).all()
+
+    recipe_names = dict(
+        database_crud.read_columns(
+            [models.Recipe.id, models.Recipe.name],
+            db_session,
+            [models.Recipe.id.in_(counts)],
+        )
+    )
+    recipes = {
+        recipe_id: schemas.RecipeEstimateSchema(
+            recipe_id=recipe_id,
+            name=recipe_names[recipe_id],
+            count=count,
+            cost=0,
+            missing=0,
+        )
+        for recipe_id, count in counts.items()
+    }
+    products: dict[str, schemas.EstimateLineSchema] = {}
+    for row in rows:
+        quantity = row.quantity * counts[row.recipe_id]
+        line = products.setdefault(
+            row.product_id,
+            schemas.EstimateLineSchema(
+                product_id=row.product_id,
+                name=row.name,
+                quantity=0,
+                unit_price=row.display_price,
+                promo_text=_get_promo_text(row.decorators),
+            ),
+        )
+        line.quantity += quantity
+        recipe = recipes[row.recipe_id]
+        if row.display_price is None:
+            recipe.missing += quantity
+        else:
+            recipe.cost += quantity * row.display_price
+
+    for line in products.values():
+        if line.unit_price is not None:
+            line.cost = line.quantity * line.unit_price
+            line.discount = _get_discount(
+                line.quantity, line.unit_price, line.promo_text
+            )
+
+    subtotal = sum(line.cost or 0 for line in products.values())
+    discount = sum(line.discount for line in products.values())
+    logger.info(
+        "Estimated %s recipes at %s cents.", len(order.recipes), subtotal - discount
+    )
+    return schemas.OrderEstimateOutputSchema(
+        subtotal=subtotal,
+        discount=discount,
+        total=subtotal - discount,
+        complete=all(line.unit_price is not None for line in products.values()),
+        products=list(products.values()),
+        recipes=[recipes[recipe_id] for recipe_id in counts],
+    )
+
+
+@jobs.register("order")
+def run_order_job(
+    payload: dict,
+    db_session: orm.Session,
+    pc_session: python_picnic_api.PicnicAPI,
+    on_progress: jobs.ProgressCallback,
+) -> bytes:
+    """Creates an order as a background job.
+
+    Args:
+        payload: The order to create, as a dict.
+        db_session: The database session.
+        pc_session: The picnic session.
+        on_progress: Called after every ingredient and recipe, see post_order.
+
+    Returns:
+        The list of ingredients in the order, as JSON.
+
+    """
+    return serialization.dump_json(
+        list[schemas.IngredientOutputSchema],
+        post_order(
+            order=schemas.OrderInputSchema(**payload),
+            db_session=db_session,
+            pc_session=pc_session,
+            on_progress=on_progress,
+        ),
+    )
@@ -1,13 +1,18 @@
 """ Contains endpoints for interacting with the orders table."""
 
+import functools
+from typing import Optional
+
 import fastapi
-from fastapi import status
+from fastapi import responses, status
 from sqlalchemy import orm
 import python_picnic_api
 
-from src.core import openapi, schemas
+from src.core import jobs, openapi, schemas, serialization, streaming
 from src.database import session as database_session
 from src.picnic import session as picnic_session
+from src.routers.jobs import controller as jobs_controller
+from src.routers.journal import controller as journal_controller
 from src.routers.orders import controller
 
 
@@ -20,10 +25,13 @@ router = fastapi.APIRouter(
     "",
     summary="Create an order.",
     description="This endpoint requires a payload with the details of an "
-    "order; it creates a order in Picnic.",
+    "order; it creates a order in Picnic. With background, the order is created by a "
+    "job instead, which can be followed at /jobs/{job_id}.",
     status_code=status.HTTP_201_CREATED,
     responses={
         201: {"description": "The created order."},
+        202: {"description": "The queued job.", "model": schemas.JobOutputSchema},
+        503: {"description": "Too many jobs are pending."},
     },
     response_model=list[schemas.IngredientOutputSchema],
     tags=["Orders"],
@@ -32,22 +40,152 @@ def post_order(
     order: schemas.OrderInputSchema = fastapi.Body(
         ..., description=openapi.Descriptions.order_payload
     ),
+    background: bool = fastapi.Query(
+        False, description=openapi.Descriptions.background
+    ),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
     db_session: orm.Session = fastapi.Depends(database_session.get_database),
-    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
-        picnic_session.get_picnic_client
+    pc_session: Optional[python_picnic_api.PicnicAPI] = fastapi.Depends(
+        picnic_session.get_picnic_client_unless_background
     ),
-) -> list[schemas.IngredientOutputSchema]:
+) -> fastapi.Response:
     """Creates an order for Picnic.
 
     Attributes:
         order: The order to create.
+        background: Whether to create the order in a job.
+        account: The name of the Picnic account.
         db_session: The database session.
-        pc_session: The Picnic API session.
+        pc_session: The Picnic API session, None if the order is created in a job.
+
+    Returns:
+        The list of ingredients in the order, or the queued job.
+
+    """
+    if background:
+        return jobs_controller.enqueue_job(
+            "order", order.model_dump(), db_session, account
+        )
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(
+            list[schemas.IngredientOutputSchema],
+            controller.post_order(
+                order=order, db_session=db_session, pc_session=pc_session
+            ),
+        ),
+        status_code=status.HTTP_201_CREATED,
+    )
+
+
+@router.post(
+    "/estimate",
+    summary="Estimate the cost of an order.",
+    description="This endpoint requires a payload with the details of an "
+    "order; it estimates its cost from the prices and promos in the local catalog, "
+    "without calling Picnic or changing the cart. The cost is returned in cents, in "
+    "total, per product and per recipe; products that are not in the catalog have "
+    "no price.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "The estimated cost of the order."},
+        404: {"description": "One of the recipes does not exist."},
+    },
+    response_model=schemas.OrderEstimateOutputSchema,
+    tags=["Orders"],
+)
+def post_estimate(
+    order: schemas.OrderInputSchema = fastapi.Body(
+        ..., description=openapi.Descriptions.order_payload
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> schemas.OrderEstimateOutputSchema:
+    """Estimates the cost of an order.
+
+    Attributes:
+        order: The order to estimate.
+        db_session: The database session.
+
+    Returns:
+        The estimated cost.
+
+    """
+    return controller.post_estimate(order=order, db_session=db_session)
+
+
+@router.post(
+    "/deferred",
+    summary="Create an order, applying it to the cart in the background.",
+    description="This endpoint requires a payload with the details of an "
+    "order; it writes the products of the order to the journal and returns once "
+    "written. They are added to the cart in Picnic in the background, with retries; "
+    "follow them at /journal/{batch_id}.",
+    status_code=status.HTTP_202_ACCEPTED,
+    responses={
+        202: {"description": "The batch of changes to the cart."},
+        404: {"description": "One of the recipes does not exist."},
+    },
+    response_model=schemas.JournalBatchOutputSchema,
+    tags=["Orders"],
+)
+def post_order_deferred(
+    order: schemas.OrderInputSchema = fastapi.Body(
+        ..., description=openapi.Descriptions.order_payload
+    ),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> fastapi.Response:
+    """Creates an order for Picnic through the journal.
+
+    Attributes:
+        order: The order to create.
+        account: The name of the Picnic account.
+        db_session: The database session.
+
+    Returns:
+        The batch of changes to the cart.
+
+    """
+    batch_id, entries = controller.post_order_deferred(
+        order=order, db_session=db_session, account=account
+    )
+    return journal_controller.accept_batch(batch_id, entries)
+
+
+@router.post(
+    "/stream",
+    summary="Create an order, streaming its progress.",
+    description="This endpoint requires a payload with the details of an "
+    "order; it creates a order in Picnic and streams its progress as server-sent "
+    "events: an ingredient event for every ingredient added to the cart and a recipe "
+    "event for every recipe, with running totals, then a done event with the list of "
+    "ingredients or an error event.",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {
+            "description": "The progress of the order.",
+            "content": {"text/event-stream": {}},
+        },
+        404: {"description": "One of the recipes does not exist."},
+    },
+    response_class=responses.StreamingResponse,
+    tags=["Orders"],
+)
+async def post_order_stream(
+    order: schemas.OrderInputSchema = fastapi.Body(
+        ..., description=openapi.Descriptions.order_payload
+    ),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+) -> responses.StreamingResponse:
+    """Creates an order for Picnic, streaming its progress.
+
+    Attributes:
+        order: The order to create.
+        account: The name of the Picnic account.
 
     Returns:
-        The list of ingredients in the order.
+        The stream of server-sent events.
 
     """
-    return controller.post_order(
-        order=order, db_session=db_session, pc_session=pc_session
+    return await streaming.stream_progress(
+        functools.partial(jobs.run, "order", order.model_dump(), account)
     )
@@ -1,16 +1,68 @@
 """ Business logic for the recipes router. """
 import logging
-
-from sqlalchemy import orm
+from typing import AsyncIterator, Iterator, Optional
+
+import fastapi
+from fastapi import status
+import pydantic
+import sqlalchemy
+from sqlalchemy import exc, orm
+from starlette import concurrency
 import python_picnic_api
 
-from src.core import models, schemas
+from src.core import cache, models, recipe_index, schemas, serialization, tracing
 from src.core.config import get_settings
 from src.database import crud as database_crud
+from src.database import search as database_search
+from src.database import session as database_session
+
+settings = get_settings()
+logger = logging.getLogger(settings.LOGGER_CONTROLLERS_NAME)
+
+RECIPES_TAG = "recipes"
+MAX_IMPORT_ERRORS = 100
+RECIPE_FIELDS = tuple(schemas.RecipeOutputSchema.model_fields)
+_transfer_adapter = pydantic.TypeAdapter(schemas.RecipeTransferSchema)
+
+
+def _recipe_tag(recipe_id: int) -> str:
+    """Returns the cache tag of a single recipe.
+
+    Args:
+        recipe_id: The identifier of the recipe.
+
+    Returns:
+        The cache tag.
+
+    """
+    return f"recipe:{recipe_id}"
+
+
+def _commit_recipe_changes(db_session: orm.Session, *recipe_ids: int) -> None:
+    """Commits a write to the recipes and invalidates everything derived from them.
 
-logger = logging.getLogger(get_settings().LOGGER_CONTROLLERS_NAME)
+    Args:
+        db_session: The database session.
+        recipe_ids: The identifiers of the recipes that were changed.
 
+    Returns:
+        None
+
+    """
+    database_crud.bump_collection_version(RECIPES_TAG, db_session)
+    db_session.commit()
+    cache.get_response_cache().invalidate(
+        RECIPES_TAG, *[_recipe_tag(recipe_id) for recipe_id in recipe_ids]
+    )
+    try:
+        recipe_index.get_recipe_index().update(recipe_ids)
+    except Exception:
+        # The index is behind the version of the recipes now, and is rebuilt
+        # on the next search.
+        logger.exception("Could not update the recipe index.")
 
+
+@tracing.traced()
 def _get_ingredients_from_picnic(
     pc_session: python_picnic_api.PicnicAPI,
 ) -> list[dict[str, str]]:
@@ -22,89 +74,326 @@ def _get_ingredients_from_picnic(
     Returns:
         The ingredients.
     """
-    logger.debug(f"Getting recipe ingredients from picnic.")
+    logger.debug("Getting recipe ingredients from picnic.")
     ingredients_list = pc_session.get_cart()["items"]
     return [ingredient["items"][0] for ingredient in ingredients_list]
 
 
-def _add_ingredients_to_recipe(
+@tracing.traced()
+def _sync_recipe_ingredients(
     db_session: orm.Session,
-    recipe: models.Recipe,
-    ingredients: list[dict[str, str]],
-) -> None:
-    """Adds ingredients to a recipe.
+    recipe_id: int,
+    ingredients: list[dict],
+) -> bool:
+    """Makes the ingredients of a recipe match the given ingredients.
 
     Args:
         db_session: The database session.
-        recipe: The recipe to add ingredients to.
-        ingredients: The ingredients to add.
+        recipe_id: The id of the recipe.
+        ingredients: The ingredients the recipe should have, as cart lines.
 
     Returns:
-        None
+        True if any ingredient was inserted, updated or deleted.
+
+    Notes:
+        The existing ingredients are loaded once and compared by product id. Only
+        the differences are written, with one bulk statement per kind of change.
+        Duplicate ingredients of the same product are removed.
 
     """
+    existing: dict[str, models.Ingredient] = {}
+    deletes = []
+    for ingredient in database_crud.read(
+        models.Ingredient, db_session, [models.Ingredient.recipe_id == recipe_id]
+    ):
+        if ingredient.product_id in existing:
+            deletes.append(ingredient.id)
+        else:
+            existing[ingredient.product_id] = ingredient
+
+    desired: dict[str, dict] = {}
     for ingredient in ingredients:
-        product = _get_product_from_db(db_session=db_session, ingredient=ingredient)
-        new_ingredient = models.Ingredient(
-            name=ingredient["name"],
-            quantity=ingredient["decorators"][0]["quantity"],
-            product=product,
-            recipe=recipe,
+        quantity = ingredient["decorators"][0]["quantity"]
+        if ingredient["id"] in desired:
+            desired[ingredient["id"]]["quantity"] += quantity
+            continue
+        desired[ingredient["id"]] = {
+            "name": ingredient["name"],
+            "quantity": quantity,
+            "image_uri": ingredient["image_ids"][0],
+        }
+
+    inserts = {
+        product_id: line
+        for product_id, line in desired.items()
+        if product_id not in existing
+    }
+    updates = [
+        {
+            "id": ingredient.id,
+            "name": desired[product_id]["name"],
+            "quantity": desired[product_id]["quantity"],
+        }
+        for product_id, ingredient in existing.items()
+        if product_id in desired
+        and (ingredient.quantity, ingredient.name)
+        != (desired[product_id]["quantity"], desired[product_id]["name"])
+    ]
+    deletes += [
+        ingredient.id
+        for product_id, ingredient in existing.items()
+        if product_id not in desired
+    ]
+    logger.debug(
+        f"Syncing ingredients of recipe {recipe_id}: {len(inserts)} inserts, "
+        f"{len(updates)} updates, {len(deletes)} deletes."
+    )
+
+    database_crud.bulk_upsert(
+        models.Product,
+        [
+            {"id": product_id, "name": line["name"], "image_uri": line["image_uri"]}
+            for product_id, line in inserts.items()
+        ],
+        db_session,
+        index_elements=["id"],
+        keep_existing=["image_uri"],
+    )
+    database_crud.bulk_create(
+        models.Ingredient,
+        [
+            {
+                "name": line["name"],
+                "quantity": line["quantity"],
+                "product_id": product_id,
+                "recipe_id": recipe_id,
+            }
+            for product_id, line in inserts.items()
+        ],
+        db_session,
+    )
+    database_crud.bulk_update(models.Ingredient, updates, db_session)
+    if deletes:
+        database_crud.bulk_delete(
+            models.Ingredient, db_session, [models.Ingredient.id.in_(deletes)]
+        )
+
+    return bool(inserts or updates or deletes)
+
+
+@tracing.traced()
+def get_recipes_etag(db_session: orm.Session) -> str:
+    """Returns the ETag of the list of recipes.
+
+    Args:
+        db_session: The database session.
+
+    Returns:
+        The ETag, derived from the version of the recipes collection.
+
+    """
+    version = database_crud.read_collection_version(RECIPES_TAG, db_session)
+    return f'"recipes-{version}"'
+
+
+@tracing.traced()
+def get_recipe_etag(recipe_id: int, db_session: orm.Session) -> Optional[str]:
+    """Returns the ETag of a recipe without loading it.
+
+    Args:
+        recipe_id: The identifier of the recipe.
+        db_session: The database session.
+
+    Returns:
+        The ETag, derived from the last update of the recipe. None if the recipe
+        does not exist.
+
+    """
+    updated_at = database_crud.read_scalar(
+        models.Recipe.updated_at, db_session, [models.Recipe.id == recipe_id]
+    )
+    if updated_at is None:
+        return None
+    return f'"recipe-{recipe_id}-{updated_at:%Y%m%d%H%M%S%f}"'
+
+
+def _get_recipe_fields(fields: Optional[list[str]]) -> Optional[tuple[str, ...]]:
+    """Validates a selection of recipe fields.
+
+    Args:
+        fields: The names of the selected fields, None for all fields.
+
+    Returns:
+        The selected fields in the order of RecipeOutputSchema, or None if all
+        fields are selected.
+
+    Raises:
+        400: If a field does not exist.
+
+    """
+    if fields is None:
+        return None
+    unknown = set(fields) - set(RECIPE_FIELDS)
+    if unknown:
+        logger.error("Unknown recipe fields: %s.", sorted(unknown))
+        raise fastapi.HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown recipe fields: {sorted(unknown)}.",
         )
-        db_session.add(new_ingredient)
+    selected = tuple(field for field in RECIPE_FIELDS if field in fields)
+    return None if selected == RECIPE_FIELDS else selected
 
 
-def _get_product_from_db(
+@tracing.traced()
+def get_all_recipes(
     db_session: orm.Session,
-    ingredient: dict[str, str],
-) -> models.Product:
-    """Gets a product from the database or creates it if it doesn't exist.
+    ids: Optional[list[int]] = None,
+    fields: Optional[list[str]] = None,
+) -> bytes:
+    """Returns a list of all recipes, or of the recipes with the given ids.
 
     Args:
         db_session: The database session.
-        ingredient: The ingredient to get the product for.
+        ids: The identifiers of the recipes to return. Unknown identifiers are
+             skipped. If None, all recipes are returned.
+        fields: The fields of RecipeOutputSchema to return. If None, all fields
+                are returned.
 
     Returns:
-        The product.
+        A list of recipes, serialized as JSON. Selected recipes are returned in
+        the order of the given ids.
+
+    Notes:
+        The recipes and their ingredients are loaded with two queries, however
+        many recipes are returned. Without the ingredients field only the
+        selected columns of the recipes are queried and the ingredients are not
+        loaded at all.
 
     """
-    logger.debug(f"Getting product {ingredient['name']} from database or create it.")
-    product = database_crud.read_or_create(
-        models.Product(
-            id=ingredient["id"],
-            name=ingredient["name"],
-            image_uri=ingredient["image_ids"][0],
-        ),
-        db_session,
-        [
-            models.Product.id == ingredient["id"],
-        ],
+    logger.info("Getting all recipes" if ids is None else f"Getting recipes {ids}")
+    ids = list(dict.fromkeys(ids)) if ids is not None else None
+    selected = _get_recipe_fields(fields)
+    query = [] if ids is None else [models.Recipe.id.in_(ids)]
+
+    def load() -> bytes:
+        if selected is None or "ingredients" in selected:
+            recipes = database_crud.read(
+                models.Recipe,
+                db_session,
+                query,
+                options=[orm.selectinload(models.Recipe.ingredients)],
+            )
+        else:
+            columns = {"id", *selected}
+            recipes = database_crud.read_columns(
+                [getattr(models.Recipe, column) for column in columns],
+                db_session,
+                query,
+            )
+        if ids is not None:
+            position = {recipe_id: index for index, recipe_id in enumerate(ids)}
+            recipes.sort(key=lambda recipe: position[recipe.id])
+        if selected is None:
+            return serialization.dump_json(list[schemas.RecipeOutputSchema], recipes)
+        return serialization.dump_json(
+            list[schemas.get_recipe_projection_schema(selected)], recipes  # type: ignore
+        )
+
+    params = {
+        "ids": ",".join(map(str, ids)) if ids is not None else None,
+        "fields": ",".join(selected) if selected is not None else None,
+    }
+    if ids is None:
+        tags = [RECIPES_TAG]
+    else:
+        tags = [_recipe_tag(recipe_id) for recipe_id in ids]
+    return cache.get_response_cache().get_or_set(
+        cache.make_key("recipes", **params), tags, load
     )
 
-    return product
 
+@tracing.traced()
+def search_recipes(
+    query: str, limit: int, db_session: orm.Session
+) -> list[schemas.RecipeSummaryOutputSchema]:
+    """Searches recipes by name, category and ingredient names, tolerating typos.
 
-def get_all_recipes(db_session: orm.Session) -> list[schemas.RecipeOutputSchema]:
-    """Returns a list of all recipes.
+    Args:
+        query: The search terms.
+        limit: The maximum number of results.
+        db_session: The database session.
+
+    Returns:
+        The matching recipes, most relevant first.
+
+    """
+    logger.info("Searching recipes for %r.", query)
+    return [
+        schemas.RecipeSummaryOutputSchema(id=recipe_id, name=name, category=category)
+        for recipe_id, name, category in database_search.search_recipes(
+            query, db_session, limit=limit
+        )
+    ]
+
+
+@tracing.traced()
+def get_matching_recipes(
+    min_coverage: float,
+    limit: int,
+    db_session: orm.Session,
+    pc_session: python_picnic_api.PicnicAPI,
+) -> list[schemas.RecipeMatchOutputSchema]:
+    """Finds the recipes whose ingredients are in the shopping cart.
 
     Args:
+        min_coverage: The minimum fraction of the ingredients of a recipe that
+                      are in the shopping cart.
+        limit: The maximum number of results.
         db_session: The database session.
+        pc_session: The picnic session.
 
     Returns:
-        A list of all recipes.
+        The matching recipes, the best covered first.
+
+    Notes:
+        The recipes are matched on the products of their ingredients through
+        the recipe index, not on their quantities; only the names of the
+        results are read from the database.
 
     """
-    logger.info("Getting all recipes")
-    return database_crud.read(
-        models.Recipe,
-        db_session,
-        [],
+    product_ids = [
+        ingredient["id"]
+        for ingredient in _get_ingredients_from_picnic(pc_session=pc_session)
+    ]
+    logger.info("Matching recipes with %s products in the cart.", len(product_ids))
+    matches = recipe_index.get_recipe_index().match(
+        product_ids, min_coverage, limit, db_session
     )
+    recipes = {
+        row.id: row
+        for row in database_crud.read_columns(
+            [models.Recipe.id, models.Recipe.name, models.Recipe.category],
+            db_session,
+            [models.Recipe.id.in_([match.recipe_id for match in matches])],
+        )
+    }
+    return [
+        schemas.RecipeMatchOutputSchema(
+            id=match.recipe_id,
+            name=recipes[match.recipe_id].name,
+            category=recipes[match.recipe_id].category,
+            coverage=match.coverage,
+            matched=match.matched,
+            total=match.total,
+            missing=match.missing,
+        )
+        for match in matches
+        if match.recipe_id in recipes
+    ]
 
 
-def get_recipe_by_id(
-    recipe_id: int, db_session: orm.Session
-) -> schemas.RecipeOutputSchema:
+@tracing.traced()
+def get_recipe_by_id(recipe_id: int, db_session: orm.Session) -> bytes:
     """Returns a recipe selected with its id.
 
     Args:
@@ -112,20 +401,253 @@ def get_recipe_by_id(
         db_session: The database session.
 
     Returns:
-        The recipe selected.
+        The recipe selected, serialized as JSON.
+
+    """
+    logger.info("Getting recipe %s.", recipe_id)
+
+    def load() -> bytes:
+        recipe = database_crud.read(
+            models.Recipe,
+            db_session,
+            [
+                models.Recipe.id == recipe_id,
+            ],
+            expected_count=1,
+        )[0]
+        return serialization.dump_json(schemas.RecipeOutputSchema, recipe)
+
+    return cache.get_response_cache().get_or_set(
+        cache.make_key("recipe", recipe_id=recipe_id), [_recipe_tag(recipe_id)], load
+    )
+
+
+def export_recipes() -> Iterator[bytes]:
+    """Streams all recipes as NDJSON, one recipe with its ingredients per line.
+
+    Returns:
+        An iterator over the lines.
+
+    Notes:
+        The recipes and ingredients are read with a single query through a
+        server-side cursor, in batches of RECIPES_TRANSFER_BATCH_SIZE rows, so
+        memory use does not grow with the number of recipes. The iterator opens
+        its own database session, because it is consumed while the response is
+        being sent.
 
     """
-    logger.info(f"Getting recipe {recipe_id}.")
-    return database_crud.read(
+    logger.info("Exporting recipes.")
+    statement = (
+        sqlalchemy.select(
+            models.Recipe.id,
+            models.Recipe.name,
+            models.Recipe.category,
+            models.Ingredient.name,
+            models.Ingredient.quantity,
+            models.Ingredient.product_id,
+            models.Product.image_uri,
+        )
+        .outerjoin(models.Ingredient, models.Ingredient.recipe_id == models.Recipe.id)
+        .outerjoin(models.Product, models.Product.id == models.Ingredient.product_id)
+        .order_by(models.Recipe.id, models.Ingredient.id)
+        .execution_options(yield_per=settings.RECIPES_TRANSFER_BATCH_SIZE)
+    )
+
+    with database_session.SessionLocal() as db_session:
+        recipe_id, recipe = None, None
+        for row in db_session.execute(statement):
+            if row[0] != recipe_id:
+                if recipe is not None:
+                    yield recipe.model_dump_json().encode() + b"\n"
+                recipe_id = row[0]
+                recipe = schemas.RecipeTransferSchema(name=row[1], category=row[2])
+            if recipe is not None and row[5] is not None:
+                recipe.ingredients.append(
+                    schemas.IngredientTransferSchema(
+                        name=row[3],
+                        quantity=row[4],
+                        product_id=row[5],
+                        image_uri=row[6],
+                    )
+                )
+        if recipe is not None:
+            yield recipe.model_dump_json().encode() + b"\n"
+
+
+def _format_validation_error(error: pydantic.ValidationError) -> str:
+    """Formats a validation error as a single line.
+
+    Args:
+        error: The validation error.
+
+    Returns:
+        The location and message of every error.
+
+    """
+    return "; ".join(
+        f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}"
+        for detail in error.errors()
+    )
+
+
+def _reject_import_line(
+    report: schemas.ImportReportSchema, line_number: int, detail: str
+) -> None:
+    """Records a rejected line in the import report.
+
+    Args:
+        report: The import report.
+        line_number: The number of the rejected line.
+        detail: Why the line was rejected.
+
+    Returns:
+        None
+
+    """
+    logger.debug("Rejecting import line %s: %s", line_number, detail)
+    report.failed += 1
+    if len(report.errors) < MAX_IMPORT_ERRORS:
+        report.errors.append(schemas.ImportErrorSchema(line=line_number, detail=detail))
+
+
+def _create_recipes(
+    recipes: list[schemas.RecipeTransferSchema], db_session: orm.Session
+) -> list[int]:
+    """Creates recipes with their ingredients using bulk statements. The products
+    of the ingredients are upserted. Does not commit.
+
+    Args:
+        recipes: The recipes to create.
+        db_session: The database session.
+
+    Returns:
+        The identifiers of the created recipes, in the order of the recipes.
+
+    """
+    products = {
+        ingredient.product_id: {
+            "id": ingredient.product_id,
+            "name": ingredient.name,
+            "image_uri": ingredient.image_uri,
+        }
+        for recipe in recipes
+        for ingredient in recipe.ingredients
+    }
+    database_crud.bulk_upsert(
+        models.Product,
+        list(products.values()),
+        db_session,
+        index_elements=["id"],
+        keep_existing=["image_uri"],
+    )
+    recipe_ids = database_crud.bulk_create(
         models.Recipe,
+        [{"name": recipe.name, "category": recipe.category} for recipe in recipes],
         db_session,
+    )
+    database_crud.bulk_create(
+        models.Ingredient,
         [
-            models.Recipe.id == recipe_id,
+            {
+                "name": ingredient.name,
+                "quantity": ingredient.quantity,
+                "product_id": ingredient.product_id,
+                "recipe_id": recipe_id,
+            }
+            for recipe_id, recipe in zip(recipe_ids, recipes)
+            for ingredient in recipe.ingredients
         ],
-        expected_count=1,
-    )[0]
+        db_session,
+    )
+    return recipe_ids
+
+
+def _import_batch(
+    batch: list[tuple[int, schemas.RecipeTransferSchema]],
+    db_session: orm.Session,
+    report: schemas.ImportReportSchema,
+) -> None:
+    """Writes a batch of recipes in a single transaction.
+
+    Args:
+        batch: The line numbers and the recipes to import.
+        db_session: The database session.
+        report: The import report.
+
+    Returns:
+        None
+
+    """
+    try:
+        recipe_ids = _create_recipes([recipe for _, recipe in batch], db_session)
+        _commit_recipe_changes(db_session, *recipe_ids)
+    except exc.SQLAlchemyError as error:
+        logger.error("Could not import batch: %s", error)
+        db_session.rollback()
+        for line_number, _ in batch:
+            _reject_import_line(report, line_number, "The batch could not be saved.")
+        return
+
+    report.imported += len(batch)
+    logger.info("Imported %s recipes, rejected %s.", report.imported, report.failed)
+
+
+@tracing.traced()
+async def import_recipes(
+    chunks: AsyncIterator[bytes], db_session: orm.Session
+) -> schemas.ImportReportSchema:
+    """Imports recipes from an NDJSON stream, as produced by export_recipes.
+
+    Args:
+        chunks: The chunks of the request body.
+        db_session: The database session.
 
+    Returns:
+        The number of imported and rejected lines, with the first errors.
+
+    Notes:
+        The stream is parsed line by line while it is received, and the recipes
+        are written in transactions of RECIPES_TRANSFER_BATCH_SIZE recipes, so
+        memory use does not grow with the size of the import. Products are
+        upserted, so importing into an environment that already knows a product
+        does not fail.
 
+    """
+    logger.info("Importing recipes.")
+    report = schemas.ImportReportSchema()
+    batch: list[tuple[int, schemas.RecipeTransferSchema]] = []
+    line_number = 0
+    buffer = b""
+
+    async def add_line(line: bytes) -> None:
+        nonlocal batch
+        if not line.strip():
+            return
+        try:
+            batch.append((line_number, _transfer_adapter.validate_json(line)))
+        except pydantic.ValidationError as error:
+            _reject_import_line(report, line_number, _format_validation_error(error))
+            return
+        if len(batch) >= settings.RECIPES_TRANSFER_BATCH_SIZE:
+            await concurrency.run_in_threadpool(
+                _import_batch, batch, db_session, report
+            )
+            batch = []
+
+    async for chunk in chunks:
+        *lines, buffer = (buffer + chunk).split(b"\n")
+        for line in lines:
+            line_number += 1
+            await add_line(line)
+    line_number += 1
+    await add_line(buffer)
+    if batch:
+        await concurrency.run_in_threadpool(_import_batch, batch, db_session, report)
+
+    return report
+
+
+@tracing.traced()
 def post_recipe(
     recipe: schemas.RecipeInputSchema,
     db_session: orm.Session,
@@ -142,7 +664,7 @@ def post_recipe(
         The created recipe.
 
     """
-    logger.debug(f"Creating recipe {recipe.name}.")
+    logger.debug("Creating recipe %s.", recipe.name)
     new_recipe = database_crud.create(
         models.Recipe(
             name=recipe.name,
@@ -153,38 +675,78 @@ def post_recipe(
 
     ingredients_list = _get_ingredients_from_picnic(pc_session=pc_session)
 
-    logger.debug(f"Adding ingredients to recipe {recipe.name}.")
-    _add_ingredients_to_recipe(
+    logger.debug("Adding ingredients to recipe %s.", recipe.name)
+    _sync_recipe_ingredients(
         db_session=db_session,
-        recipe=new_recipe,
+        recipe_id=new_recipe.id,
         ingredients=ingredients_list,
     )
 
-    logger.info(f"Saving recipe {recipe.name}.")
-    db_session.commit()
+    logger.info("Saving recipe %s.", recipe.name)
+    _commit_recipe_changes(db_session, new_recipe.id)
 
     return new_recipe
 
 
+@tracing.traced()
+def post_recipes_batch(
+    recipes: list[dict], db_session: orm.Session
+) -> list[schemas.RecipeBatchResultSchema]:
+    """Creates many recipes with their ingredients in a single transaction.
+
+    Args:
+        recipes: The recipes to create, with their ingredients.
+        db_session: The database session.
+
+    Returns:
+        A result per recipe, with either the id of the created recipe or why it
+        was not created.
+
+    Notes:
+        Recipes that fail validation are reported and skipped; the valid recipes
+        are still created. The shopping cart is not used.
+
+    """
+    logger.info("Creating a batch of %s recipes.", len(recipes))
+    results = [
+        schemas.RecipeBatchResultSchema(index=index) for index in range(len(recipes))
+    ]
+    valid: list[tuple[int, schemas.RecipeTransferSchema]] = []
+    for index, recipe in enumerate(recipes):
+        try:
+            valid.append((index, _transfer_adapter.validate_python(recipe)))
+        except pydantic.ValidationError as error:
+            results[index].detail = _format_validation_error(error)
+
+    recipe_ids = _create_recipes([recipe for _, recipe in valid], db_session)
+    _commit_recipe_changes(db_session, *recipe_ids)
+    for (index, _), recipe_id in zip(valid, recipe_ids):
+        results[index].id = recipe_id
+
+    return results
+
+
+@tracing.traced()
 def patch_recipe(
     recipe_update: schemas.RecipeUpdateSchema,
     recipe_id: int,
     db_session: orm.Session,
-    pc_session: python_picnic_api.PicnicAPI,
+    pc_session: Optional[python_picnic_api.PicnicAPI],
 ) -> schemas.RecipeOutputSchema:
-    """Updates a recipe.
+    """Updates a recipe. When the shopping cart is not empty, the ingredients of
+    the recipe are replaced by the contents of the shopping cart.
 
     Args:
         recipe_update: The recipe details to update.
         recipe_id: The id of the recipe to update.
         db_session: The database session.
-        pc_session: The picnic session.
+        pc_session: The picnic session, None to only update the recipe details.
 
     Returns:
         The updated recipe.
 
     """
-    logger.info(f"Updating recipe {recipe_id}.")
+    logger.info("Updating recipe %s.", recipe_id)
     recipe = database_crud.update(
         recipe_update.dict(exclude_unset=True),
         models.Recipe,
@@ -192,20 +754,25 @@ def patch_recipe(
         [models.Recipe.id == recipe_id],
     )
 
-    ingredients_list = _get_ingredients_from_picnic(pc_session=pc_session)
-
-    logger.debug(f"Updating ingredients for recipe {recipe.name}.")
-    _add_ingredients_to_recipe(
-        db_session=db_session,
-        recipe=recipe,
-        ingredients=ingredients_list,
+    ingredients_list = (
+        _get_ingredients_from_picnic(pc_session=pc_session) if pc_session else []
     )
-
-    logger.info(f"Saving recipe {recipe.name}.")
-    db_session.commit()
+    if ingredients_list:
+        logger.debug("Updating ingredients for recipe %s.", recipe.name)
+        if _sync_recipe_ingredients(
+            db_session=db_session,
+            recipe_id=recipe_id,
+            ingredients=ingredients_list,
+        ):
+            # Ingredient changes do not update the recipe row itself.
+            recipe.updated_at = models.utcnow()
+
+    logger.info("Saving recipe %s.", recipe.name)
+    _commit_recipe_changes(db_session, recipe_id)
     return recipe
 
 
+@tracing.traced()
 def delete_recipe(
     recipe_id: int,
     db_session: orm.Session,
@@ -220,11 +787,11 @@ def delete_recipe(
         None
 
     """
-    logger.info(f"Deleting recipe {recipe_id} and its ingredients from database.")
+    logger.info("Deleting recipe %s and its ingredients from database.", recipe_id)
     database_crud.delete(
         models.Recipe,
         db_session,
         [models.Recipe.id == recipe_id],
     )
 
-    db_session.commit()
+    _commit_recipe_changes(db_session, recipe_id)
@@ -1,11 +1,13 @@
 """ Contains endpoints for interacting with the recipes table."""
 
+from typing import Iterator, Literal, Optional, Union
+
 import fastapi
-from fastapi import status
+from fastapi import responses, status
 from sqlalchemy import orm
 import python_picnic_api
 
-from src.core import openapi, schemas
+from src.core import cache, openapi, schemas, serialization
 from src.database import session as database_session
 from src.picnic import session as picnic_session
 from src.routers.recipes import controller
@@ -16,27 +18,239 @@ router = fastapi.APIRouter(
 )
 
 
+def _get_picnic_client_unless_skipped(
+    skip_cart: bool = fastapi.Query(False, description=openapi.Descriptions.skip_cart),
+    account: str = fastapi.Depends(picnic_session.get_account_name),
+) -> Iterator[Optional[python_picnic_api.PicnicAPI]]:
+    """Get the Picnic client, unless the shopping cart is not needed.
+
+    Args:
+        skip_cart: Whether the shopping cart is not needed.
+        account: The name of the Picnic account.
+
+    Returns:
+        The Picnic client, or None if the shopping cart is skipped.
+
+    """
+    if skip_cart:
+        yield None
+        return
+    yield from picnic_session.get_picnic_client(account)
+
+
 @router.get(
     "",
     summary="Get a list of all recipes.",
-    description="This endpoint requires no input; it returns a list of all recipes.",
-    responses={200: {"description": "A list of all recipes"}},
-    response_model=list[schemas.RecipeOutputSchema],
+    description="This endpoint requires no input; it returns a list of all recipes. "
+    "When ids are given, only the recipes with those ids are returned, in that order. "
+    "The summary view only returns the id, name and category of every recipe; fields "
+    "selects any other subset of the fields.",
+    responses={
+        200: {"description": "A list of all recipes"},
+        304: {"description": "The list of recipes has not changed."},
+    },
+    response_model=Union[
+        list[schemas.RecipeOutputSchema], list[schemas.RecipeSummaryOutputSchema]
+    ],
     tags=["Recipes"],
 )
 def get_all_recipes(
+    ids: Optional[str] = fastapi.Query(
+        None, pattern=r"^\d+(,\d+)*$", description=openapi.Descriptions.recipe_ids
+    ),
+    view: Literal["summary", "full"] = fastapi.Query(
+        "full", description=openapi.Descriptions.recipe_view
+    ),
+    fields: Optional[str] = fastapi.Query(
+        None, pattern=r"^\w+(,\w+)*$", description=openapi.Descriptions.recipe_fields
+    ),
+    if_none_match: Optional[str] = fastapi.Header(
+        None, description=openapi.Descriptions.if_none_match
+    ),
     db_session: orm.Session = fastapi.Depends(database_session.get_database),
-) -> list[schemas.RecipeOutputSchema]:
+) -> fastapi.Response:
     """Get a list of all recipes.
 
     Args:
+        ids: Comma-separated identifiers of the recipes to return, if not all.
+        view: Whether to return all fields or only a summary of every recipe.
+        fields: Comma-separated fields to return, overrides view.
+        if_none_match: The ETag of the list the client already has.
+        db_session: The database session.
+
+    Returns:
+        A list of recipes, or 304 if the list has not changed.
+
+    """
+    etag = controller.get_recipes_etag(db_session=db_session)
+    if cache.etag_matches(if_none_match, etag):
+        return fastapi.Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+        )
+    return serialization.JSONBytesResponse(
+        content=controller.get_all_recipes(
+            db_session=db_session,
+            ids=[int(recipe_id) for recipe_id in ids.split(",")] if ids else None,
+            fields=(
+                fields.split(",")
+                if fields
+                else list(schemas.RecipeSummaryOutputSchema.model_fields)
+                if view == "summary"
+                else None
+            ),
+        ),
+        headers={"ETag": etag},
+    )
+
+
+@router.get(
+    "/search",
+    summary="Search recipes.",
+    description="This endpoint requires search terms; it returns the recipes whose "
+    "name, category or ingredients match them, most relevant first. Misspelled "
+    "terms still match similar words.",
+    responses={200: {"description": "The matching recipes."}},
+    response_model=list[schemas.RecipeSummaryOutputSchema],
+    tags=["Recipes"],
+)
+def search_recipes(
+    q: str = fastapi.Query(
+        ..., min_length=1, description=openapi.Descriptions.search_query
+    ),
+    limit: int = fastapi.Query(
+        20, gt=0, le=100, description=openapi.Descriptions.search_limit
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> fastapi.Response:
+    """Search recipes.
+
+    Args:
+        q: The search terms.
+        limit: The maximum number of results.
+        db_session: The database session.
+
+    Returns:
+        The matching recipes, most relevant first.
+
+    """
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(
+            list[schemas.RecipeSummaryOutputSchema],
+            controller.search_recipes(query=q, limit=limit, db_session=db_session),
+        )
+    )
+
+
+@router.get(
+    "/matching-cart",
+    summary="Find the recipes that can be cooked from the shopping cart.",
+    description="This endpoint requires no input; it returns the recipes whose "
+    "products are in the shopping cart, the best covered first. The coverage is the "
+    "fraction of the products of a recipe in the cart, regardless of quantities.",
+    responses={200: {"description": "The matching recipes."}},
+    response_model=list[schemas.RecipeMatchOutputSchema],
+    tags=["Recipes"],
+)
+def get_matching_recipes(
+    min_coverage: float = fastapi.Query(
+        0.5, ge=0, le=1, description=openapi.Descriptions.min_coverage
+    ),
+    limit: int = fastapi.Query(
+        20, gt=0, le=100, description=openapi.Descriptions.search_limit
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
+        picnic_session.get_picnic_client
+    ),
+) -> fastapi.Response:
+    """Find the recipes that can be cooked from the shopping cart.
+
+    Args:
+        min_coverage: The minimum fraction of the products of a recipe in the cart.
+        limit: The maximum number of results.
+        db_session: The database session.
+        pc_session: The picnic session.
+
+    Returns:
+        The matching recipes, the best covered first.
+
+    """
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(
+            list[schemas.RecipeMatchOutputSchema],
+            controller.get_matching_recipes(
+                min_coverage=min_coverage,
+                limit=limit,
+                db_session=db_session,
+                pc_session=pc_session,
+            ),
+        )
+    )
+
+
+@router.get(
+    "/export",
+    summary="Export all recipes.",
+    description="This endpoint requires no input; it streams all recipes with their "
+    "ingredients as newline-delimited JSON, one recipe per line.",
+    responses={
+        200: {
+            "description": "The recipes as newline-delimited JSON.",
+            "content": {"application/x-ndjson": {}},
+        }
+    },
+    response_class=responses.StreamingResponse,
+    tags=["Recipes"],
+)
+def export_recipes() -> responses.StreamingResponse:
+    """Export all recipes.
+
+    Returns:
+        A stream with one recipe per line.
+
+    """
+    return responses.StreamingResponse(
+        controller.export_recipes(), media_type="application/x-ndjson"
+    )
+
+
+@router.post(
+    "/import",
+    summary="Import recipes.",
+    description="This endpoint requires newline-delimited JSON with one recipe per "
+    "line, as returned by the export; it creates the recipes in batches. The "
+    "shopping cart is not used.",
+    responses={200: {"description": "The number of imported and rejected recipes."}},
+    response_model=schemas.ImportReportSchema,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/x-ndjson": {
+                    "schema": schemas.RecipeTransferSchema.model_json_schema()
+                }
+            },
+        }
+    },
+    tags=["Recipes"],
+)
+async def import_recipes(
+    request: fastapi.Request,
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> schemas.ImportReportSchema:
+    """Import recipes.
+
+    Args:
+        request: The request, whose body is read as a stream.
         db_session: The database session.
 
     Returns:
-        A list of all recipes.
+        The number of imported and rejected recipes.
 
     """
-    return controller.get_all_recipes(db_session=db_session)
+    return await controller.import_recipes(
+        chunks=request.stream(), db_session=db_session
+    )
 
 
 @router.get(
@@ -46,6 +260,7 @@ def get_all_recipes(
     "recipe with that ID.",
     responses={
         200: {"description": "The recipe with the given ID."},
+        304: {"description": "The recipe has not changed."},
         404: {"description": "Recipe not found."},
     },
     response_model=schemas.RecipeOutputSchema,
@@ -55,19 +270,32 @@ def get_recipe_by_id(
     recipe_id: int = fastapi.Path(
         ..., gt=0, description=openapi.Descriptions.recipe_id
     ),
+    if_none_match: Optional[str] = fastapi.Header(
+        None, description=openapi.Descriptions.if_none_match
+    ),
     db_session: orm.Session = fastapi.Depends(database_session.get_database),
-) -> schemas.RecipeOutputSchema:
+) -> fastapi.Response:
     """Get a recipe by its ID.
 
     Args:
         recipe_id: The ID of the recipe.
+        if_none_match: The ETag of the recipe the client already has.
         db_session: The database session.
 
     Returns:
-        The recipe with the given ID.
+        The recipe with the given ID, or 304 if the recipe has not changed.
 
     """
-    return controller.get_recipe_by_id(recipe_id=recipe_id, db_session=db_session)
+    etag = controller.get_recipe_etag(recipe_id=recipe_id, db_session=db_session)
+    headers = {"ETag": etag} if etag else None
+    if etag and cache.etag_matches(if_none_match, etag):
+        return fastapi.Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=headers
+        )
+    return serialization.JSONBytesResponse(
+        content=controller.get_recipe_by_id(recipe_id=recipe_id, db_session=db_session),
+        headers=headers,
+    )
 
 
 @router.post(
@@ -107,12 +335,61 @@ def post_recipe(
     )
 
 
+@router.post(
+    "/batch",
+    summary="Create many recipes.",
+    description="This endpoint requires a list of recipes with their ingredients; it "
+    "creates all valid recipes in one transaction. The shopping cart is not used.",
+    responses={
+        200: {"description": "The created recipe or the error, per recipe."},
+    },
+    response_model=list[schemas.RecipeBatchResultSchema],
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {
+                    "schema": {
+                        "type": "array",
+                        "items": schemas.RecipeTransferSchema.model_json_schema(),
+                    }
+                }
+            },
+        }
+    },
+    tags=["Recipes"],
+)
+def post_recipes_batch(
+    recipes: list[dict] = fastapi.Body(
+        ..., description=openapi.Descriptions.recipes_payload
+    ),
+    db_session: orm.Session = fastapi.Depends(database_session.get_database),
+) -> fastapi.Response:
+    """Creates many recipes.
+
+    Args:
+        recipes: The recipes to create, with their ingredients.
+        db_session: The database session.
+
+    Returns:
+        The created recipe or the error, per recipe.
+
+    """
+    return serialization.JSONBytesResponse(
+        content=serialization.dump_json(
+            list[schemas.RecipeBatchResultSchema],
+            controller.post_recipes_batch(recipes=recipes, db_session=db_session),
+        )
+    )
+
+
 @router.patch(
     "/{recipe_id}",
     summary="Update a recipe.",
     description="This endpoint requires a payload with the details of a "
-    "recipe; it updates a recipe. When the shopping cart contains ingredients,"
-    "the recipe will be updated with the ingredients from the shopping cart.",
+    "recipe; it updates a recipe. When the shopping cart contains ingredients, "
+    "the ingredients of the recipe are replaced by the ingredients in the shopping "
+    "cart. With skip_cart, only the recipe details are updated and Picnic is not "
+    "contacted.",
     responses={
         200: {"description": "The updated recipe."},
         404: {"description": "The recipe does not exist."},
@@ -126,8 +403,8 @@ def patch_recipe(
         ..., gt=0, description=openapi.Descriptions.recipe_id
     ),
     db_session: orm.Session = fastapi.Depends(database_session.get_database),
-    pc_session: python_picnic_api.PicnicAPI = fastapi.Depends(
-        picnic_session.get_picnic_client
+    pc_session: Optional[python_picnic_api.PicnicAPI] = fastapi.Depends(
+        _get_picnic_client_unless_skipped
     ),
 ) -> schemas.RecipeOutputSchema:
     """Updates a recipe.
@@ -136,7 +413,7 @@ def patch_recipe(
         recipe_update: The updated recipe data.
         recipe_id: The identifier of the recipe to update.
         db_session: The database session.
-        pc_session: The Picnic API session.
+        pc_session: The Picnic API session, None if the shopping cart is skipped.
 
     Returns:
         The updated recipe.